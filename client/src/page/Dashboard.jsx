@@ -5,6 +5,39 @@ import { FiYoutube } from "react-icons/fi";
 import { Button } from "@material-tailwind/react";
 import { useNavigate } from 'react-router-dom';
 
+const parseEvent = (raw) => {
+  let type = 'message';
+  let data = '';
+  for (const line of raw.split('\n')) {
+    if (line.startsWith('event:')) type = line.slice(6).trim();
+    else if (line.startsWith('data:')) data += line.slice(5).trim();
+  }
+  return data ? { type, data: JSON.parse(data) } : null;
+};
+
+const applyEvent = (prev, event) => {
+  switch (event.type) {
+    case 'cuisine':
+      return { ...prev, cuisine: event.data.cuisine };
+    case 'explanation':
+      return { ...prev, explanation: event.data.explanation };
+    case 'song': {
+      const songs = [...prev.songs];
+      const { index, ...song } = event.data;
+      songs[index] = song;
+      return { ...prev, songs };
+    }
+    default:
+      return prev;
+  }
+};
+
+// Sessions from before tokens were issued have none; send no header rather than "Bearer null"
+const authHeaders = () => {
+  const token = localStorage.getItem('token');
+  return token ? { 'Authorization': `Bearer ${token}` } : {};
+};
+
 const Dashboard = () => {
   const [mood, setMood] = useState('');
   const [recommendations, setRecommendations] = useState(null);
@@ -29,26 +62,47 @@ const Dashboard = () => {
     const currentHour = new Date().getHours();
 
     try {
-      const response = await fetch(`${import.meta.env.VITE_SERVER_API}/api/recommendations`, {
+      const response = await fetch(`${import.meta.env.VITE_SERVER_API}/api/recommendations/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...authHeaders(),
         },
         body: JSON.stringify({ mood: mood, hour: currentHour, user_id: user_id}),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to get recommendations');
       }
 
-      const data = await response.json();
-      console.log('API Response:', data);
-
-      // Ensure the data is in the correct format
-      if (!data.songs || !Array.isArray(data.songs)) {
-        throw new Error('Invalid response format');
+      // Render each server-sent event as soon as it arrives
+      setRecommendations({ cuisine: '', explanation: '', songs: [] });
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = parseEvent(raw);
+          if (!event) continue;
+
+          if (event.type === 'error') {
+            throw new Error(event.data.error);
+          }
+          if (event.type === 'done') {
+            finished = true;
+            break;
+          }
+          setRecommendations((prev) => applyEvent(prev, event));
+        }
       }
-      setRecommendations(data);
     } catch (err) {
       setError('Failed to get recommendations. Please try again.');
       console.error('Error:', err);
@@ -58,7 +112,11 @@ const Dashboard = () => {
   };
 
   const handlelogout = ()=>{
-    
+    // Revoke the session token on the server; the local copy is cleared either way
+    fetch(`${import.meta.env.VITE_SERVER_API}/api/logout`, {
+      method: 'POST',
+      headers: authHeaders(),
+    }).catch(() => {});
     localStorage.clear();
     navigate('/');
       
@@ -127,7 +185,7 @@ const Dashboard = () => {
               <div className="space-y-4">
                 {recommendations.songs && recommendations.songs.length > 0 ? (
                   <ul className="space-y-3">
-                    {recommendations.songs.map((song, index) => (
+                    {recommendations.songs.map((song, index) => song && (
                       <li key={index} className="bg-gray-50 p-3 rounded-lg flex justify-between items-center">
                         <span className="text-gray-800">{song.title}</span>
                         <div className="flex space-x-2">
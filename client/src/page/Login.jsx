@@ -21,6 +21,7 @@ const Login = () => {
         if (response.ok) {
           // Store user ID in localStorage or context
           localStorage.setItem('userId', data.user_id);
+          localStorage.setItem('token', data.token);
           navigate('/dashboard');
         } else {
           // Handle login error
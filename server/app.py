@@ -1,11 +1,37 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-from models import db, User, MoodRecord, Song
+from models import db, User, MoodRecord, Song, TokenRevocation
 from config import Config
-import google.generativeai as genai
+from engine_config import engine_options, pool_monitor
+from enrichment import PendingLinks, enrich_songs, split_title
+from response_parser import RecommendationStreamParser, parse_recommendations
+from link_cache import link_cache, normalize_key
+from youtube_utils import get_youtube_link
+from spotify_utils import get_spotify_link
+from response_cache import SingleFlight, recommendation_cache
+from moods import canonical_mood, prompt_mood
+from prompt_batcher import create_prompt_batcher
+from warm_pool import create_warm_pool
+from prompts import create_prompt, get_time_of_day
+import gemini_client
+import metrics
+from metrics import span
+from gemini_client import CircuitOpenError, ResilientModel, get_model
+from auth import AuthError, authenticate, bearer_token, generation_query, issue_token, user_status_cache
+from passwords import password_hasher
+from persistence import create_history_writer, history_rows, insert_history
+from export import MIMETYPES, export_history, parse_timestamp
+from history import fetch_history_page, serialize_record
+from rollups import apply_rollups, backfill_rollups, rollup_buckets, rollup_rows, user_stats
+from tracks import migrate_songs, resolve_tracks, song_identities
+import click
+import contextvars
+import copy
+import hmac
+import sys
 import json
-import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
@@ -17,175 +43,379 @@ load_dotenv()
 app = Flask(__name__)
 
 app.config.from_object(Config)
+# Must be set before init_app, which creates the engine
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(Config.SQLALCHEMY_DATABASE_URI)
 CORS(app)
 db.init_app(app)
-bcrypt = Bcrypt(app)
 
-import requests
 from urllib.parse import quote
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-
-
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,
-    'pool_recycle': 300,
-    'connect_args': {
-        'keepalives': 1,
-        'keepalives_idle': 30,
-        'keepalives_interval': 10,
-        'keepalives_count': 5,
-        'connect_timeout': 10
-    }
-}
 
-def setup_spotify_client():
-    client_id = os.getenv('SPOTIFY_CLIENT_ID')
-    client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
-    
-    if not client_id or not client_secret:
-        raise ValueError("Spotify credentials not found in environment variables.")
-    
-    client_credentials_manager = SpotifyClientCredentials(
-        client_id=client_id, 
-        client_secret=client_secret
-    )
-    return spotipy.Spotify(client_credentials_manager=client_credentials_manager)
 
+def history_engine():
+    with app.app_context():
+        return db.engine
 
-spotify_client = setup_spotify_client()
+# None in strict synchronous mode (HISTORY_WRITE_BEHIND=false)
+history_writer = create_history_writer(history_engine)
 
-def setup_gemini():
-    GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-    if not GOOGLE_API_KEY:
-        raise ValueError("API key not found in environment variables.")
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel('gemini-1.5-pro')
-    return model
+generation_flight = SingleFlight()
 
-model = setup_gemini()
+# Generates the distinct answers of a /api/recommendations/batch call concurrently
+batch_executor = ThreadPoolExecutor(
+    max_workers=Config.RECOMMENDATION_BATCH_WORKERS, thread_name_prefix='recommendation-batch'
+)
 
-def get_youtube_link(song_title):
-   
-    YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
-    
-    if not YOUTUBE_API_KEY:
-        raise ValueError("YouTube API key not found in environment variables.")
-    
-    base_url = "https://www.googleapis.com/youtube/v3/search"
-    search_query = f"{song_title} official music video"
-    
-    params = {
-        'part': 'snippet',
-        'q': search_query,
-        'key': YOUTUBE_API_KEY,
-        'maxResults': 1,
-        'type': 'video',
-        'videoEmbeddable': 'true'
-    }
-    
+# None unless GEMINI_BATCH_ENABLED
+prompt_batcher = create_prompt_batcher()
+
+local_recommender = None
+if Config.RECOMMENDATION_ENGINE == 'local':
+    # Imported only when enabled: NumPy adds ~100ms to a cold start
+    from local_engine import LocalRecommender
+    local_recommender = LocalRecommender(history_engine)
+
+def build_warm_recommendations(mood, hour):
+    """A fresh, fully link-enriched answer for the warm pool."""
+    # Runs on the pool's thread; the link cache's DB tier needs an app context
+    with app.app_context():
+        recommendations = generate_recommendations(get_model(), mood, hour)
+        recommendations['songs'] = enrich_songs(
+            recommendations['songs'], get_youtube_link, get_spotify_link, cache=link_cache
+        )
+    return recommendations
+
+# None unless WARM_POOL_ENABLED
+warm_pool = create_warm_pool(build_warm_recommendations)
+
+@app.before_request
+def start_request_trace():
+    if metrics.tracing_enabled:
+        g.trace, g.trace_token = metrics.start_trace()
+
+@app.after_request
+def finish_request_trace(response):
+    trace = g.pop('trace', None)
+    if trace is None:
+        return response
+    metrics.end_trace(g.pop('trace_token'))
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.registry.histogram(
+        metrics.REQUEST_SECONDS, endpoint=endpoint, status=str(response.status_code)
+    ).observe(time.perf_counter() - trace.start)
+    # Streamed bodies are still being generated here, so their header covers setup only
+    if Config.SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+def generate_recommendations(model, mood, hour):
+    if prompt_batcher is not None:
+        return prompt_batcher.generate(model, mood, hour)
+    with span('prompt'):
+        prompt = create_prompt(prompt_mood(mood), hour)
+    with span('llm'):
+        response = model.generate_content(prompt)
+    with span('parse'):
+        return parse_recommendations(response.text)
+
+def fetch_recommendations(model, mood, hour):
+    """Recommendations before link enrichment, from the cache or Gemini.
+
+    Returns (recommendations, enriched): answers from the local engine
+    already carry their stored links.
+    """
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        if 'items' in data and len(data['items']) > 0:
-            video_id = data['items'][0]['id']['videoId']
-            return f"https://www.youtube.com/watch?v={video_id}"
-        else:
-            return None
-    except Exception as e:
-        print(f"Error fetching YouTube link: {e}")
-        return None
+        if recommendation_cache is not None:
+            return recommendation_cache.get_or_generate(
+                mood, get_time_of_day(hour), lambda: generate_recommendations(model, mood, hour)
+            ), False
+        # Concurrent requests for the same canonical mood share one Gemini call
+        recommendations, _ = generation_flight.do(
+            (canonical_mood(mood), get_time_of_day(hour)),
+            lambda: generate_recommendations(model, mood, hour)
+        )
+        return copy.deepcopy(recommendations), False
+    except CircuitOpenError:
+        # Gemini is failing: serve any cached answer, then the closest local match
+        recommendations = None
+        if recommendation_cache is not None:
+            recommendations = recommendation_cache.peek(mood, get_time_of_day(hour))
+        if recommendations is not None:
+            return recommendations, False
+        if local_recommender is not None:
+            local = local_recommender.recommend(mood, min_confidence=0.0, min_support=1)
+            if local is not None:
+                return local, True
+        raise
 
-def get_spotify_link(song_title, artist):
-   
+def get_recommendations(model, mood, hour):
     try:
-        # Search for the track
-        results = spotify_client.search(q=f'track:{song_title} artist:{artist}', type='track', limit=1)
-        
-        # Extract track information
-        tracks = results.get('tracks', {}).get('items', [])
-        
-        if tracks:
-            track = tracks[0]
-            return {
-                'spotifyLink': track['external_urls']['spotify'],
-                'previewUrl': track.get('preview_url'),
-                'fullTrackName': f"{track['name']} - {track['artists'][0]['name']}"
-            }
+        recommendations, enriched = fetch_recommendations(model, mood, hour)
+        if enriched:
+            return recommendations
+
+        # Add YouTube and Spotify links to songs
+        with span('enrichment'):
+            songs_with_links = enrich_songs(
+                recommendations['songs'], get_youtube_link, get_spotify_link, cache=link_cache
+            )
+
+        recommendations['songs'] = songs_with_links
+        return recommendations
+    except Exception as e:
+        return {"error": str(e), "details": str(e)}
+
+def local_recommendation(mood):
+    """The local engine's answer when it is enabled and confident, else None."""
+    if local_recommender is None:
         return None
+    try:
+        return local_recommender.recommend(mood)
     except Exception as e:
-        print(f"Error fetching Spotify link: {e}")
+        print(f"Local recommendation failed: {e!r}")
         return None
 
-def get_time_of_day(hour):
-    hour = int(hour)
-    if 5 <= hour < 12:
-        return "morning"
-    elif 12 <= hour < 17:
-        return "afternoon"
-    elif 17 <= hour < 22:
-        return "evening"
-    else:
-        return "night"
+def pooled_recommendation(mood, hour):
+    if warm_pool is None:
+        return None
+    with span('warm_pool'):
+        try:
+            return warm_pool.take(mood, hour)
+        except (TypeError, ValueError):
+            # A malformed hour is a miss; the regular path reports the error
+            return None
 
-def create_prompt(mood, hour):
-    time_of_day = get_time_of_day(hour)
-    return f"""As an expert in viral songs, provide personalized recommendations for someone feeling {mood} during the {time_of_day} (current hour: {hour}:00).
-Please suggest:
-1. A specific type of cuisine or dish that complements their emotional state.
-2. 5 specific songs with their full titles including artist names that match the mood.
-3. A brief explanation in about 150 to 200 characters of why these recommendations are beneficial.
-
-Format the response as a JSON object with the following structure:
-{{
-  "cuisine": "Recommended cuisine or dish",
-  "songs": [
-    {{"title": "Song Title 1 - Artist Name"}},
-    {{"title": "Song Title 2 - Artist Name"}},
-    {{"title": "Song Title 3 - Artist Name"}},
-    {{"title": "Song Title 4 - Artist Name"}},
-    {{"title": "Song Title 5 - Artist Name"}}
-  ],
-  "explanation": "Brief explanation of why these recommendations are beneficial"
-}}"""
+def recommend(mood, hour):
+    """Answer from the warm pool, then local history when confident, otherwise ask Gemini."""
+    pooled = pooled_recommendation(mood, hour)
+    if pooled is not None:
+        return pooled
+    if local_recommender is None:
+        return get_recommendations(get_model(), mood, hour)
 
-def get_recommendations(model, mood, hour):
-   
+    recommendations = local_recommendation(mood)
+    if recommendations is not None:
+        return recommendations
+
+    start = time.perf_counter()
+    recommendations = get_recommendations(get_model(), mood, hour)
+    local_recommender.record_fallback(time.perf_counter() - start)
+    return recommendations
+
+def recommend_batch(requests):
+    """Recommendations for [(mood, hour), ...], sharing work between entries.
+
+    Entries with the same canonical mood and time of day share one answer,
+    distinct answers are generated concurrently, and the songs of all of
+    them are link-enriched together so a song that appears twice is looked
+    up once. Returns one recommendations dict or exception per entry.
+    """
+    groups = {}
+    for mood, hour in requests:
+        groups.setdefault((canonical_mood(mood), get_time_of_day(hour)), (mood, hour))
+
+    def fetch(mood, hour):
+        ready = pooled_recommendation(mood, hour) or local_recommendation(mood)
+        if ready is not None:
+            return ready, True
+        return fetch_recommendations(get_model(), mood, hour)
+
+    # Each task gets its own copy of the request context so spans land in this trace
+    futures = {
+        key: batch_executor.submit(contextvars.copy_context().run, fetch, mood, hour)
+        for key, (mood, hour) in groups.items()
+    }
+    results = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            results[key] = e
+
+    unique_songs = {}
+    for result in results.values():
+        if not isinstance(result, Exception) and not result[1]:
+            for song in result[0]['songs']:
+                unique_songs.setdefault(normalize_key(*split_title(song['title'])), song)
+    with span('enrichment'):
+        links = dict(zip(unique_songs, enrich_songs(
+            list(unique_songs.values()), get_youtube_link, get_spotify_link, cache=link_cache
+        )))
+
+    answers = {}
+    for key, result in results.items():
+        if isinstance(result, Exception):
+            answers[key] = result
+            continue
+        recommendations, enriched = result
+        if not enriched:
+            recommendations['songs'] = [
+                dict(links[normalize_key(*split_title(song['title']))], title=song['title'])
+                for song in recommendations['songs']
+            ]
+        answers[key] = recommendations
+    results = []
+    for mood, hour in requests:
+        answer = answers[(canonical_mood(mood), get_time_of_day(hour))]
+        results.append(answer if isinstance(answer, Exception) else copy.deepcopy(answer))
+    return results
+
+def save_recommendations(user_id, mood, recommendations, hour=None):
+    mood_record = MoodRecord(
+        user_id=user_id, 
+        mood=mood, 
+        cuisine=recommendations.get('cuisine', ''),
+        explanation=recommendations.get('explanation', '')
+    )
+    db.session.add(mood_record)
+    with span('db_flush'):
+        db.session.flush()
 
-    prompt = create_prompt(mood, hour)
-    response = model.generate_content(prompt)
+    track_ids = resolve_tracks(db.session.connection(), song_identities(recommendations.get('songs', [])))
+    songs_to_add = [Song(mood_record_id=mood_record.id, track_id=track_id) for track_id in track_ids]
+    db.session.add_all(songs_to_add)
+    with span('db_rollup'):
+        apply_rollups(db.session.connection(), rollup_rows(
+            [(user_id, rollup_buckets(mood, hour, mood_record.created_at))]
+        ))
     
-    try:
-        content = response.text
-        cleaned_content = content.strip().strip("```json").strip("```")
-        recommendations = json.loads(cleaned_content)
-        
-        # Add YouTube and Spotify links to songs
-        songs_with_links = []
-        for song in recommendations['songs']:
-            # Split title into song and artist
-            title_parts = song['title'].split(' - ')
-            song_title = title_parts[0]
-            artist = title_parts[1] if len(title_parts) > 1 else ''
-            
-            # Get links
-            youtube_link = get_youtube_link(song_title)
-            spotify_data = get_spotify_link(song_title, artist)
-            
-            song_info = {
-                'title': song['title'],
-                'youtubeLink': youtube_link or '',
-                'spotifyLink': spotify_data['spotifyLink'] if spotify_data else '',
-                'previewUrl': spotify_data.get('previewUrl', '')
-            }
-            songs_with_links.append(song_info)
-        
-        recommendations['songs'] = songs_with_links
-        return recommendations
-    except Exception as e:
-        return {"error": str(e), "details": str(e)}
+    with span('db_commit'):
+        db.session.commit()
+    return mood_record
+
+def record_history(user_id, mood, recommendations, hour):
+    """Persist a recommendation, write-behind unless strict sync mode is on."""
+    if history_writer is not None:
+        with span('history_enqueue'):
+            history_writer.submit(user_id, mood, recommendations, hour)
+    else:
+        save_recommendations(user_id, mood, recommendations, hour)
+
+def record_history_batch(entries):
+    """Persist [(user_id, mood, recommendations, hour), ...] together.
+
+    Either way all of them are inserted in one transaction: write-behind
+    queues them as a single item, strict sync mode writes them directly.
+    """
+    if not entries:
+        return
+    if history_writer is not None:
+        with span('history_enqueue'):
+            history_writer.submit_many(entries)
+        return
+    with span('db_batch_write'):
+        with db.engine.begin() as conn:
+            insert_history(conn, [history_rows(*entry) for entry in entries])
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def ready_events(recommendations):
+    """SSE events for an answer that already carries its links, sent all at once."""
+    yield sse_event('cuisine', {'cuisine': recommendations.get('cuisine', '')})
+    for index, song in enumerate(recommendations.get('songs', [])):
+        yield sse_event('song', dict(song, index=index))
+    yield sse_event('explanation', {'explanation': recommendations.get('explanation', '')})
+
+def model_chunks(model, mood, hour):
+    with span('llm'):
+        response = model.generate_content(create_prompt(prompt_mood(mood), hour), stream=True)
+    for chunk in response:
+        yield chunk.text
+
+def stream_recommendations(model, mood, hour):
+    """Yield SSE events for a recommendation as it is generated.
+
+    Answers from the warm pool or the local engine already have links and
+    go out at once. Otherwise cuisine and explanation are sent as soon as
+    they appear in the model output, and each song once its links resolve.
+    If the stream fails before its first event (including an open circuit
+    breaker), the answer comes from fetch_recommendations instead, with its
+    retries and fallbacks. Returns the full recommendation (via
+    StopIteration.value) for persistence.
+    """
+    time_of_day = get_time_of_day(hour)
+    ready = pooled_recommendation(mood, hour) or local_recommendation(mood)
+    if ready is not None:
+        yield from ready_events(ready)
+        return ready
+
+    start = time.perf_counter()
+    from_model = False
+    cached = recommendation_cache.lookup(mood, time_of_day) if recommendation_cache is not None else None
+    if cached is not None:
+        chunks = iter([json.dumps(cached)])
+    else:
+        chunks = model_chunks(model, mood, hour)
+        from_model = True
+
+    parser = RecommendationStreamParser()
+    pending = []
+    songs = []
+    deadline = None
+    started = False
+
+    def ready_songs():
+        finished = [(index, links) for index, links in pending if links.done()]
+        for index, links in finished:
+            pending.remove((index, links))
+            songs[index] = links.song_info(0)
+            links.finish()
+            yield sse_event('song', dict(songs[index], index=index))
+
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            break
+        except Exception as e:
+            if started or not from_model:
+                raise
+            print(f"Streaming failed before the first event, falling back: {e!r}")
+            recommendations, enriched = fetch_recommendations(model, mood, hour)
+            if enriched:
+                yield from ready_events(recommendations)
+                return recommendations
+            # fetch_recommendations has already cached it
+            chunks = iter([json.dumps(recommendations)])
+            from_model = False
+            parser = RecommendationStreamParser()
+            continue
+
+        for kind, value in parser.feed(chunk):
+            started = True
+            if kind == 'song':
+                if deadline is None:
+                    deadline = time.monotonic() + Config.ENRICHMENT_DEADLINE
+                songs.append(None)
+                pending.append((len(songs) - 1, PendingLinks(
+                    [value], get_youtube_link, get_spotify_link, cache=link_cache, deadline=deadline
+                )))
+            else:
+                yield sse_event(kind, {kind: value})
+        yield from ready_songs()
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        wait([future for _, links in pending for future in links.futures],
+             timeout=remaining, return_when=FIRST_COMPLETED)
+        yield from ready_songs()
+
+    # Songs whose lookups missed the deadline go out with empty links
+    for index, links in list(pending):
+        links.cancel()
+        songs[index] = links.song_info(0)
+        links.finish()
+        yield sse_event('song', dict(songs[index], index=index))
+
+    recommendations = parser.result()
+    if from_model and recommendation_cache is not None and recommendations['songs']:
+        recommendation_cache.add(mood, time_of_day, recommendations)
+    recommendations['songs'] = songs
+    if local_recommender is not None:
+        local_recommender.record_fallback(time.perf_counter() - start)
+    return recommendations
 
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -200,13 +430,20 @@ def register():
     if existing_user:
         return jsonify({"error": "Email already exists"}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    with span('password_hash'):
+        hashed_password = password_hasher.hash(password)
     new_user = User(email=email, password=hashed_password)
     
     db.session.add(new_user)
     db.session.commit()
+    # Drop any "not found" cached for this id before it existed
+    user_status_cache.invalidate(new_user.id)
 
-    return jsonify({"message": "User registered successfully","user_id": new_user.id}), 201
+    return jsonify({
+        "message": "User registered successfully",
+        "user_id": new_user.id,
+        "token": issue_token(new_user.id)
+    }), 201
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -215,60 +452,329 @@ def login():
     password = data.get('password')
 
     user = User.query.filter_by(email=email).first()
-    if user and bcrypt.check_password_hash(user.password, password):
-        return jsonify({"message": "Login successful", "user_id": user.id}), 200
-    
+    if user and password:
+        with span('password_verify'):
+            matches, needs_rehash = password_hasher.verify(user.password, password)
+        if matches:
+            if needs_rehash:
+                upgrade_password_hash(user, password)
+            generation = db.session.execute(generation_query(user.id)).scalar() or 0
+            return jsonify({
+                "message": "Login successful", "user_id": user.id, "token": issue_token(user.id, generation)
+            }), 200
+
     return jsonify({"error": "Invalid credentials"}), 401
+
+@app.route('/api/logout', methods=['POST'])
+def logout():
+    """Revoke every session token issued to the user so far."""
+    try:
+        user_id = request_user_id(None)
+        revocation = db.session.get(TokenRevocation, user_id)
+        if revocation is None:
+            db.session.add(TokenRevocation(user_id=user_id, generation=1))
+        else:
+            revocation.generation += 1
+        db.session.commit()
+    except AuthError as e:
+        return jsonify({"error": str(e)}), e.status
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+    user_status_cache.invalidate(user_id)
+    return jsonify({"message": "Logged out"}), 200
+
+def request_user_id(claimed_user_id, token=None, require_token=False):
+    """The caller's user id: from the bearer token, else ``claimed_user_id`` while tokens are optional.
+
+    Reads of stored history pass ``require_token`` so a bare user_id never
+    exposes another user's data.
+    """
+    with span('auth'):
+        return authenticate(
+            token or bearer_token(request.headers.get('Authorization')), claimed_user_id, db.engine, require_token
+        )
+
+def upgrade_password_hash(user, password):
+    """Re-hash with the current scheme and cost; a failure leaves the old hash working."""
+    try:
+        with span('password_hash'):
+            user.password = password_hasher.hash(password)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"Error upgrading password hash: {e}")
+
 @app.route('/api/recommendations', methods=['POST'])
 def recommendations():
     data = request.json
     mood = data.get('mood')
     client_hour = data.get('hour')
-    user_id = data.get('user_id')
 
-    if not mood or client_hour is None or not user_id:
-        return jsonify({"error": "Mood, hour, and user_id are required"}), 400
- 
-    
+    if not mood or client_hour is None:
+        return jsonify({"error": "Mood and hour are required"}), 400
+    if not isinstance(mood, str) or not mood.strip():
+        return jsonify({"error": "Mood must be a non-empty string"}), 400
+
     try:
-        # Verify user exists
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({"error": "User not found"}), 404
-
-        recommendations = get_recommendations(model, mood, client_hour)
-        
-        mood_record = MoodRecord(
-            user_id=user_id, 
-            mood=mood, 
-            cuisine=recommendations.get('cuisine', ''),
-            explanation=recommendations.get('explanation', '')
-        )
-        db.session.add(mood_record)
-        db.session.flush()
+        user_id = request_user_id(data.get('user_id'))
 
-        songs_to_add = [
-            Song(
-                mood_record_id=mood_record.id, 
-                title=song.get('title', ''),
-                youtube_link=song.get('youtubeLink', ''),
-                spotify_link=song.get('spotifyLink', '')
-            ) for song in recommendations.get('songs', [])
-        ]
-        db.session.add_all(songs_to_add)
-        
-        db.session.commit()
+        recommendations = recommend(mood, client_hour)
+        record_history(user_id, mood, recommendations, client_hour)
 
         return jsonify(recommendations)
 
+    except AuthError as e:
+        return jsonify({"error": str(e)}), e.status
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(f"Database error: {str(e)}")
         return jsonify({"error": "Database error occurred"}), 500
 
-with app.app_context():
-    db.create_all()
+@app.route('/api/recommendations/stream', methods=['POST'])
+def recommendations_stream():
+    data = request.json
+    mood = data.get('mood')
+    client_hour = data.get('hour')
+
+    if not mood or client_hour is None:
+        return jsonify({"error": "Mood and hour are required"}), 400
+    if not isinstance(mood, str) or not mood.strip():
+        return jsonify({"error": "Mood must be a non-empty string"}), 400
+
+    try:
+        user_id = request_user_id(data.get('user_id'))
+    except AuthError as e:
+        return jsonify({"error": str(e)}), e.status
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    def generate():
+        try:
+            recommendations = yield from stream_recommendations(get_model(), mood, client_hour)
+        except Exception as e:
+            yield sse_event('error', {"error": str(e)})
+            return
+
+        try:
+            record_history(user_id, mood, recommendations, client_hour)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.error(f"Database error: {str(e)}")
+            yield sse_event('error', {"error": "Database error occurred"})
+            return
+        yield sse_event('done', {})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def batch_item_error(item):
+    """Why a batch item is invalid, or None."""
+    if not isinstance(item, dict) or not item.get('mood') or item.get('hour') is None:
+        return "Mood and hour are required"
+    if not isinstance(item['mood'], str) or not item['mood'].strip():
+        return "Mood must be a non-empty string"
+    hour = item['hour']
+    if isinstance(hour, bool) or not isinstance(hour, int) or not 0 <= hour <= 23:
+        return "Hour must be an integer from 0 to 23"
+    return None
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+def recommendations_batch():
+    data = request.json or {}
+    items = data.get('items')
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > Config.RECOMMENDATION_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {Config.RECOMMENDATION_BATCH_MAX_ITEMS} items per batch"}), 400
+
+    results = [None] * len(items)
+    accepted = []
+    try:
+        for index, item in enumerate(items):
+            error = batch_item_error(item)
+            if error:
+                results[index] = {"error": error, "status": 400}
+                continue
+            try:
+                # An item may carry its own token, e.g. a digest job acting for several users
+                user_id = request_user_id(item.get('user_id') or data.get('user_id'), item.get('token'))
+            except AuthError as e:
+                results[index] = {"error": str(e), "status": e.status}
+                continue
+            accepted.append((index, user_id, item['mood'], item['hour']))
+
+        answers = recommend_batch([(mood, hour) for _, _, mood, hour in accepted])
+        history = []
+        for (index, user_id, mood, hour), answer in zip(accepted, answers):
+            if isinstance(answer, Exception):
+                results[index] = {"error": str(answer), "details": str(answer), "status": 502}
+            else:
+                results[index] = dict(answer, status=200)
+                history.append((user_id, mood, answer, hour))
+        record_history_batch(history)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    return jsonify({"results": results})
+
+@app.route('/api/history', methods=['GET'])
+def history():
+    limit = request.args.get('limit', Config.HISTORY_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor')
+    compact = request.args.get('format') == 'compact'
+    limit = max(1, min(limit, Config.HISTORY_MAX_PAGE_SIZE))
+
+    try:
+        user_id = request_user_id(None, require_token=True)
+        records, next_cursor = fetch_history_page(user_id, limit, cursor)
+    except AuthError as e:
+        return jsonify({"error": str(e)}), e.status
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    return jsonify({
+        "items": [serialize_record(record, compact) for record in records],
+        "nextCursor": next_cursor
+    })
+
+@app.route('/api/history/export', methods=['GET'])
+def history_export():
+    """Stream history as NDJSON, Parquet or Arrow.
+
+    With EXPORT_API_KEY in the X-Export-Key header any user, or everyone,
+    can be exported; otherwise a session token is required and callers get
+    their own history only.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    export_key = request.headers.get('X-Export-Key')
+    try:
+        if Config.EXPORT_API_KEY and export_key and hmac.compare_digest(export_key, Config.EXPORT_API_KEY):
+            user_id = request.args.get('user_id', type=int)
+        else:
+            user_id = request_user_id(None, require_token=True)
+        chunks = export_history(
+            db.engine, fmt, user_id,
+            parse_timestamp(request.args.get('since')), parse_timestamp(request.args.get('until'))
+        )
+    except AuthError as e:
+        return jsonify({"error": str(e)}), e.status
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    return Response(chunks, mimetype=MIMETYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename="history.{fmt}"'
+    })
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    weeks = request.args.get('weeks', 12, type=int)
+
+    try:
+        user_id = request_user_id(None, require_token=True)
+        return jsonify(user_stats(db.session.connection(), user_id, weeks))
+    except AuthError as e:
+        return jsonify({"error": str(e)}), e.status
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Database error: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = {"links": link_cache.stats()}
+    if recommendation_cache is not None:
+        stats["recommendations"] = recommendation_cache.stats()
+    if prompt_batcher is not None:
+        stats["prompt_batches"] = prompt_batcher.stats()
+    if isinstance(gemini_client.model, ResilientModel):
+        stats["gemini"] = gemini_client.model.stats()
+    if local_recommender is not None:
+        stats["local_engine"] = local_recommender.stats()
+    if warm_pool is not None:
+        stats["warm_pool"] = warm_pool.stats()
+    stats["auth_users"] = user_status_cache.stats()
+    stats["db_pool"] = pool_monitor.stats()
+    return jsonify(stats)
+
+def init_db():
+    with app.app_context():
+        db.create_all()
+        # create_all skips tables that already exist, so add indexes introduced since
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database tables."""
+    init_db()
+    print("Database tables created.")
+
+@app.cli.command('export-history')
+@click.option('--format', 'fmt', type=click.Choice(sorted(MIMETYPES)), default='ndjson', show_default=True)
+@click.option('--output', default='-', show_default=True, help="File to write; - for stdout.")
+@click.option('--user-id', type=int, help="Only this user's history.")
+@click.option('--since', help="ISO date or datetime, inclusive.")
+@click.option('--until', help="ISO date or datetime, exclusive.")
+@click.option('--chunk-size', type=int, help="Rows per fetch (default EXPORT_CHUNK_SIZE).")
+def export_history_command(fmt, output, user_id, since, until, chunk_size):
+    """Stream mood records and songs to a file in chunks."""
+    try:
+        with app.app_context():
+            chunks = export_history(
+                db.engine, fmt, user_id, parse_timestamp(since), parse_timestamp(until), chunk_size
+            )
+            out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+            try:
+                for chunk in chunks:
+                    out.write(chunk)
+            finally:
+                if out is not sys.stdout.buffer:
+                    out.close()
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+@app.cli.command('migrate-tracks')
+@click.option('--batch-size', default=10000, show_default=True, help="Songs per transaction.")
+@click.option('--drop-legacy-columns', is_flag=True, help="Drop song.title/youtube_link/spotify_link afterwards.")
+def migrate_tracks_command(batch_size, drop_legacy_columns):
+    """Move songs onto the deduplicated track catalog."""
+    try:
+        with app.app_context():
+            report = migrate_songs(db.engine, batch_size, drop_legacy_columns)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"{report['total_songs']} songs share {report['tracks']} tracks "
+          f"({report['songs']} migrated now, {report['unmigrated']} without a track, "
+          f"{report['unparsed_links']} links without a readable id).")
+
+@app.cli.command('backfill-rollups')
+@click.option('--chunk-size', default=10000, show_default=True, help="Records per transaction.")
+def backfill_rollups_command(chunk_size):
+    """Rebuild the mood_rollup table from existing history."""
+    with app.app_context():
+        processed = backfill_rollups(db.engine, chunk_size)
+    print(f"Rollups rebuilt from {processed} records.")
 
 
 if __name__ == '__main__':
+    init_db()
     app.run(debug=True, port=5000)
\ No newline at end of file
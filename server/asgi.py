@@ -0,0 +1,254 @@
+"""ASGI entry point serving the same API as app.py without blocking workers.
+
+Gemini, YouTube and Spotify are called through non-blocking clients and the
+database through an async SQLAlchemy engine, so one process can hold
+hundreds of recommendations in flight while they wait on upstreams.
+
+    uvicorn asgi:app --port 5000
+"""
+import asyncio
+import contextlib
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import insert, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import async_clients
+from auth import (
+    AuthError, bearer_token, check_status, generation_query, identify, issue_token, status_from_row,
+    user_status_cache, user_status_query
+)
+from config import Config
+from engine_config import engine_profile
+from enrichment import enrich_songs_async
+from gemini_client import get_model
+from link_cache import LinkCache
+from models import MoodRecord, Song, User
+from moods import prompt_mood
+from passwords import password_hasher
+from prompts import create_prompt, get_time_of_day
+from response_cache import recommendation_cache
+from response_parser import parse_recommendations
+from rollups import apply_rollups, rollup_buckets, rollup_rows
+from tracks import resolve_tracks, song_identities
+
+load_dotenv()
+
+users = User.__table__
+mood_records = MoodRecord.__table__
+songs_table = Song.__table__
+
+# Memory-only: the DB tier of the shared link cache is synchronous
+link_cache = LinkCache()
+
+
+def async_database_url(url):
+    """Map a sync DATABASE_URL onto the matching asyncio driver."""
+    url = make_url(url)
+    if url.drivername in ('postgres', 'postgresql', 'postgresql+psycopg2'):
+        query = dict(url.query)
+        # asyncpg spells libpq's sslmode as ssl
+        if 'sslmode' in query:
+            query['ssl'] = query.pop('sslmode')
+        return url.set(drivername='postgresql+asyncpg', query=query)
+    if url.drivername == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def create_engine_for(url):
+    profile = engine_profile(url)
+    if profile == 'serverless':
+        return create_async_engine(async_database_url(url), poolclass=NullPool)
+    options = {'pool_pre_ping': True}
+    if profile != 'sqlite':
+        options.update(
+            pool_size=Config.ASYNC_DB_POOL_SIZE,
+            max_overflow=Config.ASYNC_DB_MAX_OVERFLOW,
+            pool_recycle=300
+        )
+    return create_async_engine(async_database_url(url), **options)
+
+
+class Services:
+    # Filled in by the lifespan handler; tests and benchmarks may swap them
+    engine = None
+    model = None
+    youtube = None
+    spotify = None
+
+
+async def generate_recommendations(mood, hour):
+    response = await Services.model.generate_content_async(create_prompt(prompt_mood(mood), hour))
+    return parse_recommendations(response.text)
+
+
+async def get_recommendations(mood, hour):
+    try:
+        recommendations = None
+        time_of_day = get_time_of_day(hour)
+        if recommendation_cache is not None:
+            recommendations = recommendation_cache.lookup(mood, time_of_day)
+        if recommendations is None:
+            recommendations = await generate_recommendations(mood, hour)
+            if recommendation_cache is not None:
+                recommendation_cache.add(mood, time_of_day, recommendations)
+
+        recommendations['songs'] = await enrich_songs_async(
+            recommendations['songs'],
+            Services.youtube.get_video_link,
+            Services.spotify.get_spotify_link,
+            cache=link_cache
+        )
+        return recommendations
+    except Exception as e:
+        return {"error": str(e), "details": str(e)}
+
+
+async def save_recommendations(conn, user_id, mood, recommendations, hour=None):
+    created_at = datetime.utcnow()
+    result = await conn.execute(insert(mood_records).values(
+        user_id=user_id,
+        mood=mood,
+        cuisine=recommendations.get('cuisine', ''),
+        explanation=recommendations.get('explanation', ''),
+        created_at=created_at
+    ))
+    mood_record_id = result.inserted_primary_key[0]
+    identities = song_identities(recommendations.get('songs', []))
+    if identities:
+        track_ids = await conn.run_sync(resolve_tracks, identities)
+        await conn.execute(insert(songs_table), [
+            {'mood_record_id': mood_record_id, 'track_id': track_id} for track_id in track_ids
+        ])
+    rows = rollup_rows([(user_id, rollup_buckets(mood, hour, created_at))])
+    await conn.run_sync(apply_rollups, rows)
+    return mood_record_id
+
+
+async def register(request):
+    data = await request.json()
+    email = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return JSONResponse({"error": "Email and password are required"}, status_code=400)
+
+    async with Services.engine.connect() as conn:
+        existing_user = (await conn.execute(select(users.c.id).where(users.c.email == email))).first()
+    if existing_user:
+        return JSONResponse({"error": "Email already exists"}, status_code=400)
+
+    # Hashing is CPU-bound; keep it off the event loop
+    hashed_password = await asyncio.to_thread(password_hasher.hash, password)
+    try:
+        async with Services.engine.begin() as conn:
+            result = await conn.execute(insert(users).values(email=email, password=hashed_password))
+    except IntegrityError:
+        return JSONResponse({"error": "Email already exists"}, status_code=400)
+
+    user_id = result.inserted_primary_key[0]
+    user_status_cache.invalidate(user_id)
+    return JSONResponse(
+        {"message": "User registered successfully", "user_id": user_id, "token": issue_token(user_id)},
+        status_code=201
+    )
+
+
+async def login(request):
+    data = await request.json()
+    email = data.get('email')
+    password = data.get('password')
+
+    async with Services.engine.connect() as conn:
+        user = (await conn.execute(
+            select(users.c.id, users.c.password).where(users.c.email == email)
+        )).first()
+    if user and password:
+        matches, needs_rehash = await asyncio.to_thread(password_hasher.verify, user.password, password)
+        if matches:
+            if needs_rehash:
+                hashed_password = await asyncio.to_thread(password_hasher.hash, password)
+                async with Services.engine.begin() as conn:
+                    await conn.execute(update(users).where(users.c.id == user.id).values(password=hashed_password))
+            async with Services.engine.connect() as conn:
+                generation = (await conn.execute(generation_query(user.id))).scalar() or 0
+            return JSONResponse(
+                {"message": "Login successful", "user_id": user.id, "token": issue_token(user.id, generation)},
+                status_code=200
+            )
+
+    return JSONResponse({"error": "Invalid credentials"}, status_code=401)
+
+
+async def request_user_id(request, claimed_user_id):
+    """Same rules as auth.authenticate, with the cache-miss query on the async engine."""
+    user_id, generation = identify(bearer_token(request.headers.get('authorization')), claimed_user_id)
+    status = user_status_cache.get(user_id)
+    if status is None:
+        async with Services.engine.connect() as conn:
+            status = status_from_row((await conn.execute(user_status_query(user_id))).first())
+        user_status_cache.put(user_id, status)
+    check_status(status, generation)
+    return user_id
+
+
+async def recommendations(request):
+    data = await request.json()
+    mood = data.get('mood')
+    client_hour = data.get('hour')
+
+    if not mood or client_hour is None:
+        return JSONResponse({"error": "Mood and hour are required"}, status_code=400)
+    if not isinstance(mood, str) or not mood.strip():
+        return JSONResponse({"error": "Mood must be a non-empty string"}, status_code=400)
+
+    try:
+        user_id = await request_user_id(request, data.get('user_id'))
+
+        recommendations = await get_recommendations(mood, client_hour)
+
+        async with Services.engine.begin() as conn:
+            await save_recommendations(conn, user_id, mood, recommendations, client_hour)
+
+        return JSONResponse(recommendations)
+
+    except AuthError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status)
+    except SQLAlchemyError as e:
+        print(f"Database error: {str(e)}")
+        return JSONResponse({"error": "Database error occurred"}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    Services.engine = Services.engine or create_engine_for(Config.SQLALCHEMY_DATABASE_URI)
+    Services.model = Services.model or get_model()
+    Services.youtube = Services.youtube or async_clients.create_youtube_client()
+    Services.spotify = Services.spotify or async_clients.create_spotify_client()
+    try:
+        yield
+    finally:
+        await Services.youtube.aclose()
+        await Services.spotify.aclose()
+        await Services.engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/register', register, methods=['POST']),
+        Route('/api/login', login, methods=['POST']),
+        Route('/api/recommendations', recommendations, methods=['POST'])
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import os
+import random
+import time
+
+import aiohttp
+
+from config import Config
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+async def _get_json(session, url, max_retries, backoff_factor, **kwargs):
+    # Mirrors the urllib3 Retry policy used by the sync YouTube client
+    for attempt in range(max_retries + 1):
+        async with session.get(url, **kwargs) as response:
+            if response.status not in RETRY_STATUSES or attempt == max_retries:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+            retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = backoff_factor * (2 ** attempt) * (1 + random.random() / 2)
+        await asyncio.sleep(delay)
+
+
+def _http_session(connect_timeout, read_timeout):
+    # Created inside the running loop; one keep-alive pool per upstream
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+        connector=aiohttp.TCPConnector(limit=Config.ASYNC_HTTP_MAX_CONNECTIONS)
+    )
+
+
+class AsyncYouTubeClient:
+    """Non-blocking counterpart of youtube_utils.YouTubeClient."""
+
+    def __init__(self, api_key, search_url=None):
+        if not api_key:
+            raise ValueError("YouTube API key not found in environment variables.")
+        self.api_key = api_key
+        self.search_url = search_url or Config.YOUTUBE_SEARCH_URL
+        self.http = _http_session(Config.YOUTUBE_CONNECT_TIMEOUT, Config.YOUTUBE_READ_TIMEOUT)
+
+    async def get_video_link(self, song_title):
+        params = {
+            'part': 'snippet',
+            'q': f"{song_title} official music video",
+            'key': self.api_key,
+            'maxResults': '1',
+            'type': 'video',
+            'videoEmbeddable': 'true'
+        }
+        data = await _get_json(
+            self.http, self.search_url, Config.YOUTUBE_MAX_RETRIES, Config.YOUTUBE_BACKOFF_FACTOR,
+            params=params
+        )
+        if 'items' in data and len(data['items']) > 0:
+            return f"https://www.youtube.com/watch?v={data['items'][0]['id']['videoId']}"
+        return None
+
+    async def aclose(self):
+        await self.http.close()
+
+
+class AsyncSpotifyClient:
+    """Spotify Web API search using the client-credentials flow, without spotipy."""
+
+    def __init__(self, client_id, client_secret, api_url=None, token_url=None):
+        if not client_id or not client_secret:
+            raise ValueError("Spotify credentials not found in environment variables.")
+        self.credentials = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
+        self.api_url = (api_url or Config.SPOTIFY_API_URL).rstrip('/')
+        self.token_url = token_url or Config.SPOTIFY_TOKEN_URL
+        self.http = _http_session(Config.SPOTIFY_CONNECT_TIMEOUT, Config.LINK_LOOKUP_TIMEOUT)
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = asyncio.Lock()
+
+    async def _access_token(self):
+        async with self._token_lock:
+            # Refresh a minute early so in-flight searches never carry an expired token
+            if self._token is None or time.time() > self._token_expires_at - 60:
+                async with self.http.post(
+                    self.token_url,
+                    data={'grant_type': 'client_credentials'},
+                    headers={'Authorization': f"Basic {self.credentials}"}
+                ) as response:
+                    response.raise_for_status()
+                    payload = await response.json(content_type=None)
+                self._token = payload['access_token']
+                self._token_expires_at = time.time() + payload.get('expires_in', 3600)
+            return self._token
+
+    async def get_spotify_link(self, song_title, artist):
+        token = await self._access_token()
+        data = await _get_json(
+            self.http, f"{self.api_url}/search", Config.SPOTIFY_MAX_RETRIES, Config.SPOTIFY_BACKOFF_FACTOR,
+            params={'q': f'track:{song_title} artist:{artist}', 'type': 'track', 'limit': '1'},
+            headers={'Authorization': f"Bearer {token}"}
+        )
+        tracks = data.get('tracks', {}).get('items', [])
+        if tracks:
+            track = tracks[0]
+            return {
+                'spotifyLink': track['external_urls']['spotify'],
+                'previewUrl': track.get('preview_url'),
+                'fullTrackName': f"{track['name']} - {track['artists'][0]['name']}"
+            }
+        return None
+
+    async def aclose(self):
+        await self.http.close()
+
+
+def create_youtube_client():
+    return AsyncYouTubeClient(os.getenv('YOUTUBE_API_KEY'))
+
+
+def create_spotify_client():
+    return AsyncSpotifyClient(os.getenv('SPOTIFY_CLIENT_ID'), os.getenv('SPOTIFY_CLIENT_SECRET'))
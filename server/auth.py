@@ -0,0 +1,155 @@
+"""Signed session tokens and an in-process cache of user status.
+
+/api/login issues a token signed with SECRET_KEY (itsdangerous, which
+Flask already depends on), and requests are authenticated by checking the
+signature locally. Each token carries the user's token generation as of
+login, and /api/logout revokes every token issued so far by bumping that
+generation. Whether the user still exists, and their current generation,
+is cached per user for AUTH_USER_CACHE_TTL seconds. Repeat requests therefore never touch the
+users table. A revocation made on another instance takes effect there
+within the same TTL. SECRET_KEY is required and must be the same on
+every worker and instance.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from itsdangerous import BadData, URLSafeTimedSerializer
+from sqlalchemy import select
+
+from config import Config
+from models import TokenRevocation, User
+
+if not Config.SECRET_KEY:
+    # A per-process random key would make tokens fail on every other worker or instance
+    raise RuntimeError("SECRET_KEY must be set to sign session tokens")
+_serializer = URLSafeTimedSerializer(Config.SECRET_KEY, salt='session-token')
+
+
+class AuthError(Exception):
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.status = status
+
+
+def issue_token(user_id, generation=0):
+    return _serializer.dumps({'uid': user_id, 'gen': generation})
+
+
+def read_token(token):
+    """Return (user_id, generation) for a valid token, else raise AuthError."""
+    try:
+        payload = _serializer.loads(token, max_age=Config.AUTH_TOKEN_TTL)
+        return int(payload['uid']), int(payload.get('gen', 0))
+    except (BadData, KeyError, TypeError, ValueError, AttributeError):
+        raise AuthError("Invalid or expired token")
+
+
+def bearer_token(header):
+    scheme, _, token = (header or '').partition(' ')
+    token = token.strip()
+    # Clients that stringify a missing token send these; treat them as no token
+    if scheme.lower() != 'bearer' or token in ('', 'null', 'undefined'):
+        return None
+    return token
+
+
+def identify(token, claimed_user_id, require_token=False):
+    """Return (user_id, generation); generation is None for an unauthenticated user_id.
+
+    A bare ``claimed_user_id`` is accepted only while AUTH_REQUIRE_TOKEN is
+    off and ``require_token`` is not set.
+    """
+    if token:
+        return read_token(token)
+    if Config.AUTH_REQUIRE_TOKEN or require_token or not claimed_user_id:
+        raise AuthError("Authentication required")
+    try:
+        return int(claimed_user_id), None
+    except (TypeError, ValueError):
+        raise AuthError("Invalid user_id", 400)
+
+
+def user_status_query(user_id):
+    users, revocations = User.__table__, TokenRevocation.__table__
+    return select(users.c.id, revocations.c.generation).select_from(
+        users.outerjoin(revocations, revocations.c.user_id == users.c.id)
+    ).where(users.c.id == user_id)
+
+
+def status_from_row(row):
+    """(exists, generation) from a user_status_query row."""
+    if row is None:
+        return False, 0
+    return True, row.generation or 0
+
+
+def generation_query(user_id):
+    """Current token generation of ``user_id``; login reads it uncached so new tokens are never stale."""
+    revocations = TokenRevocation.__table__
+    return select(revocations.c.generation).where(revocations.c.user_id == user_id)
+
+
+def check_status(status, generation):
+    exists, current = status
+    if not exists:
+        raise AuthError("User not found", 404)
+    if generation is not None and generation < current:
+        raise AuthError("Token has been revoked")
+
+
+class UserStatusCache:
+    """LRU of user_id -> (exists, revoked_before), each entry kept for ``ttl`` seconds."""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or Config.AUTH_USER_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else Config.AUTH_USER_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def put(self, user_id, status):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, status)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._entries))
+
+
+user_status_cache = UserStatusCache()
+
+
+def authenticate(token, claimed_user_id, engine, require_token=False):
+    """Return the requesting user's id, or raise AuthError.
+
+    The token's user wins over ``claimed_user_id``, which is only honoured
+    while AUTH_REQUIRE_TOKEN is off and ``require_token`` is not set.
+    ``engine`` is queried only on a cache miss.
+    """
+    user_id, generation = identify(token, claimed_user_id, require_token)
+    status = user_status_cache.get(user_id)
+    if status is None:
+        with engine.connect() as conn:
+            status = status_from_row(conn.execute(user_status_query(user_id)).first())
+        user_status_cache.put(user_id, status)
+    check_status(status, generation)
+    return user_id
@@ -0,0 +1,123 @@
+"""Load-test the Flask app against the ASGI app with stubbed upstreams.
+
+Gemini is replaced by an in-process fake with fixed latency; YouTube and
+Spotify are served by a local HTTP stub, so both apps run their real
+HTTP clients. The Flask app is served by a fixed pool of worker threads,
+the way sync workers would serve it; the ASGI app runs in one uvicorn
+process.
+
+    python benchmarks/asgi_load_test.py --requests 400 --concurrency 200 --workers 8
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+from stubs import FakeModel, serve_flask, serve_stub, start  # noqa: E402
+
+
+def serve_asgi(model, ready):
+    import uvicorn
+    import asgi
+
+    asgi.Services.model = model
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(2048)
+    ready.put(sock.getsockname()[1])
+    config = uvicorn.Config(asgi.app, log_level='warning')
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+async def run_load(base_url, total, concurrency):
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(base_url, connector=connector) as client:
+        email = f"bench-{time.time_ns()}@example.com"
+        async with client.post('/api/register', json={'email': email, 'password': 'bench'}) as response:
+            user_id = (await response.json())['user_id']
+
+        latencies = []
+        errors = 0
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                async with client.post('/api/recommendations', json={
+                    'mood': 'happy', 'hour': 18, 'user_id': user_id
+                }) as response:
+                    body = await response.json(content_type=None)
+                latencies.append(time.perf_counter() - start)
+                if response.status != 200 or 'error' in body:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'throughput': total / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'errors': errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8, help='Flask worker threads')
+    parser.add_argument('--llm-latency', type=float, default=2.0)
+    parser.add_argument('--upstream-latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    stub, stub_port = start(serve_stub, args.upstream_latency)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+        'GOOGLE_API_KEY': 'bench',
+        'SECRET_KEY': 'bench',
+        'YOUTUBE_API_KEY': 'bench',
+        'SPOTIFY_CLIENT_ID': 'bench',
+        'SPOTIFY_CLIENT_SECRET': 'bench',
+        'YOUTUBE_SEARCH_URL': f"{stub_url}/youtube/v3/search",
+        'SPOTIFY_API_URL': f"{stub_url}/spotify/v1",
+        'SPOTIFY_TOKEN_URL': f"{stub_url}/spotify/token",
+        'LINK_CACHE_DB_ENABLED': 'false'
+    })
+    import app as flask_app
+    flask_app.init_db()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"LLM {args.llm_latency}s, upstream {args.upstream_latency}s")
+    targets = [
+        (f"flask ({args.workers} workers)", serve_flask, (args.workers,)),
+        ('asgi (1 process)', serve_asgi, ())
+    ]
+    for label, target, target_args in targets:
+        server, port = start(target, FakeModel(args.llm_latency), *target_args)
+        result = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency))
+        server.terminate()
+        print(f"{label:<20} {result['throughput']:8.1f} req/s  "
+              f"p50={result['p50']:.2f}s p95={result['p95']:.2f}s errors={result['errors']}")
+    stub.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Check that database pool limits hold under concurrent /api/recommendations load.
+
+The real app runs on ``--workers`` threads, many more than the pool has
+connections, with history written synchronously so every request checks
+out a connection to save its record. Gemini is a fake model and YouTube
+and Spotify are served by the local stub, as in suite.py. While the load
+runs, the checked-out gauge is scraped from /metrics. At the end, the
+pool's own counters from /api/cache/stats give the peak number of
+connections checked out, checkout waits and timeouts. The exit status is
+1 if the peak ever exceeded DB_POOL_SIZE + DB_MAX_OVERFLOW.
+
+    python benchmarks/db_pool_stress.py --workers 32 --pool-size 4 --max-overflow 2
+    python benchmarks/db_pool_stress.py --profile serverless
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import warnings
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+warnings.filterwarnings('ignore')
+
+from stubs import FakeModel, serve_flask, serve_stub, start  # noqa: E402
+from suite import MOODS, parse_env, percentile  # noqa: E402
+
+CHECKED_OUT_LINE = re.compile(r'^mood_harmony_db_pool_checked_out (\d+)$', re.M)
+
+
+async def run_load(base_url, args):
+    import aiohttp
+
+    latencies = []
+    statuses = {}
+    observed = []
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 1)
+    async with aiohttp.ClientSession(base_url, connector=connector) as client:
+        run_id = time.time_ns()
+        tokens = []
+        for i in range(args.users):
+            async with client.post('/api/register', json={
+                'email': f"pool-{run_id}-{i}@example.com", 'password': 'bench'
+            }) as response:
+                tokens.append((await response.json())['token'])
+
+        remaining = [args.requests]
+        done = asyncio.Event()
+
+        async def worker():
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                start = time.perf_counter()
+                async with client.post('/api/recommendations', json={
+                    'mood': random.choice(MOODS), 'hour': random.randrange(24)
+                }, headers={'Authorization': f"Bearer {random.choice(tokens)}"}) as response:
+                    await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - start)
+
+        async def scrape():
+            while not done.is_set():
+                async with client.get('/metrics') as response:
+                    match = CHECKED_OUT_LINE.search(await response.text())
+                if match:
+                    observed.append(int(match.group(1)))
+                await asyncio.sleep(args.scrape_interval)
+
+        scraper = asyncio.ensure_future(scrape())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await scraper
+
+        async with client.get('/api/cache/stats') as response:
+            pool = (await response.json())['db_pool']
+    return latencies, statuses, observed, elapsed, pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=32, help='Flask worker threads')
+    parser.add_argument('--profile', default='auto', help='DB_ENGINE_PROFILE')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--max-overflow', type=int, default=2)
+    parser.add_argument('--pool-timeout', type=float, default=10)
+    parser.add_argument('--llm-latency', type=float, default=0.05)
+    parser.add_argument('--upstream-latency', type=float, default=0.02)
+    parser.add_argument('--scrape-interval', type=float, default=0.05)
+    parser.add_argument('--database-url', help='defaults to a fresh SQLite file')
+    parser.add_argument('--env', type=parse_env, action='append', default=[], metavar='KEY=VALUE',
+                        help='extra app setting (repeatable)')
+    args = parser.parse_args()
+
+    stub, stub_port = start(serve_stub, args.upstream_latency)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    os.environ.update({
+        'DATABASE_URL': args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.db')}",
+        'GOOGLE_API_KEY': 'bench',
+        'SECRET_KEY': 'bench',
+        'YOUTUBE_API_KEY': 'bench',
+        'SPOTIFY_CLIENT_ID': 'bench',
+        'SPOTIFY_CLIENT_SECRET': 'bench',
+        'YOUTUBE_SEARCH_URL': f"{stub_url}/youtube/v3/search",
+        'SPOTIFY_API_URL': f"{stub_url}/spotify/v1",
+        'SPOTIFY_TOKEN_URL': f"{stub_url}/spotify/token",
+        'DB_ENGINE_PROFILE': args.profile,
+        'DB_POOL_SIZE': str(args.pool_size),
+        'DB_MAX_OVERFLOW': str(args.max_overflow),
+        'DB_POOL_TIMEOUT': str(args.pool_timeout),
+        # Every request saves on its own thread, so it needs a connection of its own
+        'HISTORY_WRITE_BEHIND': 'false',
+    })
+    os.environ.update(dict(args.env))
+    import app as flask_app
+    flask_app.init_db()
+
+    model = FakeModel(args.llm_latency, distinct_songs=200)
+    server, port = start(serve_flask, model, args.workers)
+    try:
+        latencies, statuses, observed, elapsed, pool = asyncio.run(run_load(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.terminate()
+        stub.terminate()
+
+    latencies.sort()
+    print(f"{args.requests} recommendations, {args.concurrency} clients, {args.workers} workers, "
+          f"{pool['pool']} limit {pool['limit']}")
+    print(f"throughput {len(latencies) / elapsed:.1f}/s  p50 {percentile(latencies, 50) * 1000:.0f} ms  "
+          f"p95 {percentile(latencies, 95) * 1000:.0f} ms  statuses {dict(sorted(statuses.items()))}")
+    print(f"checked out: peak {pool['peak_checked_out']}, max scraped {max(observed, default=0)} "
+          f"over {len(observed)} scrapes")
+    print(f"checkouts {pool['checkouts']}  avg wait {(pool['avg_wait_seconds'] or 0) * 1000:.2f} ms  "
+          f"max wait {pool['max_wait_seconds'] * 1000:.1f} ms  timeouts {pool['timeouts']}  "
+          f"idle {pool['idle']}  overflow {pool['overflow']}")
+    if pool['limit'] is not None and pool['peak_checked_out'] > pool['limit']:
+        print(f"FAIL: {pool['peak_checked_out']} connections checked out, limit is {pool['limit']}")
+        sys.exit(1)
+    print("pool limits held" if pool['limit'] is not None else "no pool limit (NullPool)")
+
+
+if __name__ == '__main__':
+    main()
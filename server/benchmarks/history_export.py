@@ -0,0 +1,97 @@
+"""Rows/sec and peak memory of the history export on a large SQLite fixture.
+
+Builds (or reuses) a database with ``--rows`` mood records and exports
+all of it in each format. Every format runs in a fresh subprocess, so its
+peak RSS is its own. "orm" loads the same history through
+MoodRecord.query with its lazy songs relationship, for contrast: its
+memory grows with the table, while the streamed exports stay flat.
+
+    python benchmarks/history_export.py --rows 200000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from history_pagination import build_fixture  # noqa: E402
+
+MODES = ('ndjson', 'parquet', 'arrow', 'orm')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode, chunk_size):
+    import app as flask_app
+    from export import export_history
+    from models import MoodRecord, db
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    size = 0
+    with flask_app.app.app_context():
+        if mode == 'orm':
+            for record in MoodRecord.query.order_by(MoodRecord.id).all():
+                size += len(json.dumps({
+                    'id': record.id, 'mood': record.mood,
+                    'songs': [{'title': song.title, 'youtube_link': song.youtube_link} for song in record.songs]
+                }))
+        else:
+            for chunk in export_history(db.engine, mode, chunk_size=chunk_size):
+                size += len(chunk)
+        rows = db.session.query(MoodRecord).count()
+    elapsed = time.perf_counter() - start
+    return {'records_per_sec': rows / elapsed, 'seconds': elapsed, 'mb': size / 1e6,
+            'peak_rss_mb': peak_rss_mb(), 'import_rss_mb': baseline}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--songs-per-record', type=int, default=5)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--db', help="fixture path; built if missing and reused otherwise")
+    parser.add_argument('--measure', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'history.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    for name in ('GOOGLE_API_KEY', 'YOUTUBE_API_KEY', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET', 'SECRET_KEY'):
+        os.environ.setdefault(name, 'bench')
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.chunk_size)))
+        return
+
+    if not os.path.exists(path):
+        import app as flask_app
+        flask_app.init_db()
+        t = time.perf_counter()
+        build_fixture(path, args.rows, args.users, args.songs_per_record)
+        print(f"built {args.rows} records in {time.perf_counter() - t:.1f}s at {path}")
+
+    print(f"{'mode':<10}{'records/s':>12}{'seconds':>10}{'output MB':>11}{'peak RSS MB':>13}{'over import':>13}")
+    for mode in args.modes.split(','):
+        output = subprocess.run(
+            [sys.executable, '-W', 'ignore', __file__, '--db', path, '--measure', mode,
+             '--chunk-size', str(args.chunk_size)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<10}{result['records_per_sec']:>12,.0f}{result['seconds']:>10.2f}{result['mb']:>11.1f}"
+              f"{result['peak_rss_mb']:>13.0f}{result['peak_rss_mb'] - result['import_rss_mb']:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Page-fetch latency of /api/history by page depth on a large SQLite fixture.
+
+Builds (or reuses) a database with ``--rows`` mood records spread over
+``--users`` users, walks one user's history through the API following
+``nextCursor``, and reports the median latency of pages at increasing
+depth. The same pages fetched with LIMIT/OFFSET are shown for contrast:
+keyset pages stay flat while OFFSET grows with depth.
+
+    python benchmarks/history_pagination.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+MOODS = ['happy', 'sad', 'tired', 'excited', 'calm', 'anxious', 'nostalgic', 'romantic']
+
+
+def build_fixture(path, rows, users, songs_per_record):
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO user (id, email, password) VALUES (?, ?, ?)",
+        [(i, f"user{i}@example.com", 'x') for i in range(1, users + 1)]
+    )
+    # Every record recommends the same few tracks, as popular songs do
+    conn.executemany(
+        "INSERT INTO track (id, title, youtube_id, spotify_id) VALUES (?, ?, ?, ?)",
+        [(j + 1, f"Song {j} - Artist", f"yt{j + 1:08d}", f"sp{j + 1:020d}") for j in range(songs_per_record)]
+    )
+    start = datetime(2024, 1, 1)
+    batch = 50_000
+    record_id = 0
+    for offset in range(0, rows, batch):
+        records, songs = [], []
+        for _ in range(min(batch, rows - offset)):
+            record_id += 1
+            created_at = start + timedelta(seconds=record_id)
+            records.append((
+                record_id, record_id % users + 1, random.choice(MOODS), 'Tacos', 'Because.',
+                created_at.strftime('%Y-%m-%d %H:%M:%S.%f')
+            ))
+            songs.extend((record_id, j + 1) for j in range(songs_per_record))
+        conn.executemany(
+            "INSERT INTO mood_record (id, user_id, mood, cuisine, explanation, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            records
+        )
+        conn.executemany("INSERT INTO song (mood_record_id, track_id) VALUES (?, ?)", songs)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t)
+    return result, statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--songs-per-record', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help="fixture path; built if missing and reused otherwise")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'history.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    os.environ['HISTORY_MAX_PAGE_SIZE'] = str(args.limit)
+    for name in ('GOOGLE_API_KEY', 'YOUTUBE_API_KEY', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET', 'SECRET_KEY'):
+        os.environ.setdefault(name, 'bench')
+
+    import app as flask_app
+    from auth import issue_token
+    from models import MoodRecord, db
+
+    if not os.path.exists(path):
+        flask_app.init_db()
+        t = time.perf_counter()
+        build_fixture(path, args.rows, args.users, args.songs_per_record)
+        print(f"built {args.rows} records in {time.perf_counter() - t:.1f}s at {path}")
+
+    client = flask_app.app.test_client()
+    user_id = 1
+    # History reads require a session token
+    headers = {'Authorization': f"Bearer {issue_token(user_id)}"}
+    checkpoints = {1, 10, 100, 1000}
+    pages = {}
+    cursor = None
+    page = 0
+    while True:
+        page += 1
+        url = f"/api/history?limit={args.limit}"
+        if cursor:
+            url += f"&cursor={cursor}"
+        body = client.get(url, headers=headers).get_json()
+        pages[page] = url
+        cursor = body['nextCursor']
+        if cursor is None:
+            break
+    checkpoints = sorted(p for p in checkpoints | {page} if p <= page)
+    print(f"user {user_id}: {page} pages of {args.limit}")
+
+    print(f"\n{'page':>8}{'keyset ms':>12}{'offset ms':>12}")
+    with flask_app.app.app_context():
+        for number in checkpoints:
+            _, keyset_ms = timed(lambda: client.get(pages[number], headers=headers).get_json(), args.repeat)
+            _, offset_ms = timed(lambda: [
+                len(record.songs) for record in MoodRecord.query
+                .filter(MoodRecord.user_id == user_id)
+                .options(db.selectinload(MoodRecord.songs))
+                .order_by(MoodRecord.created_at.desc(), MoodRecord.id.desc())
+                .offset((number - 1) * args.limit).limit(args.limit).all()
+            ], args.repeat)
+            print(f"{number:>8}{keyset_ms:>12.2f}{offset_ms:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Latency and fallback rate of the local recommendation engine.
+
+Fills a temporary SQLite database with synthetic history, builds the
+local index from it, then replays a mix of moods: ones seen in history,
+reworded variants, and moods that were never recorded (which should fall
+back to Gemini). Reports index build time, per-query latency and the
+fallback rate.
+
+    python benchmarks/local_engine.py --records 50000 --queries 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+BASE_MOODS = [
+    'happy', 'sad', 'tired', 'excited', 'calm', 'anxious', 'nostalgic', 'romantic',
+    'angry', 'bored', 'lonely', 'hopeful', 'stressed', 'energetic', 'relaxed', 'grateful'
+]
+MODIFIERS = ['', 'very', 'a bit', 'so', 'really', 'kind of', 'super']
+UNSEEN = ['melancholic', 'ecstatic', 'homesick', 'overwhelmed', 'serene', 'jittery']
+
+
+def build_fixture(path, records, songs_per_record, catalog_size):
+    from sqlalchemy import create_engine, insert
+    from models import MoodRecord, Song, Track, User, db
+
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    track_rows, tracks_by_mood = [], {}
+    for mood in BASE_MOODS:
+        for i in range(catalog_size):
+            track_id = len(track_rows) + 1
+            track_rows.append({
+                'id': track_id, 'title': f"{mood.title()} Song {i} - Artist {i % 50}",
+                'youtube_id': f"yt{track_id:08d}", 'spotify_id': f"sp{track_id:020d}"
+            })
+            tracks_by_mood.setdefault(mood, []).append(track_id)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{'id': 1, 'email': 'bench@example.com', 'password': 'x'}])
+        conn.execute(insert(Track.__table__), track_rows)
+        record_rows, song_rows = [], []
+        for record_id in range(1, records + 1):
+            mood = random.choice(BASE_MOODS)
+            record_rows.append({
+                'id': record_id, 'user_id': 1,
+                'mood': f"{random.choice(MODIFIERS)} {mood}".strip(),
+                'cuisine': 'Tacos', 'explanation': 'Because.'
+            })
+            song_rows.extend(
+                {'mood_record_id': record_id, 'track_id': track_id}
+                for track_id in random.sample(tracks_by_mood[mood], songs_per_record)
+            )
+        conn.execute(insert(MoodRecord.__table__), record_rows)
+        conn.execute(insert(Song.__table__), song_rows)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--songs-per-record', type=int, default=5)
+    parser.add_argument('--catalog', type=int, default=200, help="distinct songs per base mood")
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--unseen', type=float, default=0.1, help="share of queries for unrecorded moods")
+    args = parser.parse_args()
+
+    for name in ('GOOGLE_API_KEY', 'YOUTUBE_API_KEY', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET', 'SECRET_KEY'):
+        os.environ.setdefault(name, 'bench')
+    from local_engine import LocalRecommender
+
+    path = os.path.join(tempfile.mkdtemp(), 'local.db')
+    t = time.perf_counter()
+    engine = build_fixture(path, args.records, args.songs_per_record, args.catalog)
+    print(f"fixture: {args.records} records in {time.perf_counter() - t:.1f}s")
+
+    recommender = LocalRecommender(lambda: engine, max_records=args.records)
+    recommender.build()
+    stats = recommender.stats()
+    print(f"index: {stats['documents']} mood documents built in {stats['build_seconds'] * 1000:.0f}ms")
+
+    samples = []
+    for _ in range(args.queries):
+        if random.random() < args.unseen:
+            mood = random.choice(UNSEEN)
+        else:
+            mood = f"feeling {random.choice(MODIFIERS)} {random.choice(BASE_MOODS)} today"
+        t = time.perf_counter()
+        if recommender.recommend(mood) is None:
+            # Stands in for the Gemini call so fallbacks are counted
+            recommender.record_fallback(0.0)
+        samples.append(time.perf_counter() - t)
+
+    samples.sort()
+    stats = recommender.stats()
+    print(f"queries: {args.queries}, fallback rate {stats['fallback_rate']:.1%}")
+    print(f"latency ms: p50 {statistics.median(samples) * 1000:.3f}  "
+          f"p99 {samples[int(len(samples) * 0.99)] * 1000:.3f}  max {samples[-1] * 1000:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Throughput of mood canonicalization and how far it collapses the key space.
+
+Generates free-text moods the way users type them (synonyms, filler,
+punctuation, case and typos), then reports canonicalizations per second
+with the memo cache cold (every input new) and warm (inputs repeating),
+and how many distinct cache keys the inputs reduce to.
+
+    python benchmarks/mood_normalizer.py --inputs 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from moods import CANONICAL_MOODS, canonical_mood, normalize_mood  # noqa: E402
+
+PREFIXES = ['', 'feeling ', 'i am ', "I'm ", 'so ', 'really ', 'kind of ', 'a bit ']
+SUFFIXES = ['', '!', '!!', ' today', ' right now', '...', ' :)']
+OTHER = ['hungry', 'nervous about my exam', 'not happy', 'meh whatever', 'like a potato']
+
+
+def typo(word):
+    if len(word) < 5 or random.random() < 0.7:
+        return word
+    i = random.randrange(1, len(word) - 1)
+    return word[:i] + word[i] + word[i:]
+
+
+def generate_inputs(count):
+    words = [word.replace('_', ' ') for synonyms in CANONICAL_MOODS.values() for word in synonyms.split()]
+    inputs = []
+    for _ in range(count):
+        base = random.choice(OTHER) if random.random() < 0.05 else typo(random.choice(words))
+        text = f"{random.choice(PREFIXES)}{base}{random.choice(SUFFIXES)}"
+        inputs.append(text.upper() if random.random() < 0.1 else text)
+    return inputs
+
+
+def rate(inputs):
+    start = time.perf_counter()
+    for text in inputs:
+        canonical_mood(text)
+    return len(inputs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inputs', type=int, default=100000)
+    args = parser.parse_args()
+
+    inputs = generate_inputs(args.inputs)
+    distinct = set(inputs)
+
+    canonical_mood.cache_clear()
+    cold = rate(list(distinct))
+    warm = rate(inputs)
+
+    print(f"inputs: {len(inputs)} ({len(distinct)} distinct)")
+    print(f"cold (uncached): {cold:,.0f} moods/s")
+    print(f"warm (memoized): {warm:,.0f} moods/s")
+    print(f"distinct keys: raw {len(distinct)}, normalized {len({normalize_mood(m) for m in distinct})}, "
+          f"canonical {len({canonical_mood(m) for m in distinct})}")
+
+
+if __name__ == '__main__':
+    main()
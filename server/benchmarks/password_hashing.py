@@ -0,0 +1,93 @@
+"""Login throughput per core for each password hashing setting.
+
+A storm of ``--logins`` verifications is sent from ``--concurrency``
+request threads through a PasswordHasher, once per scheme and cost. While
+the storm runs, one more thread runs a pure-Python loop that stands in for
+recommendation traffic; its rate shows how much CPU the storm leaves free.
+"inline" hashes on the request threads, the way login worked before the
+dedicated pool.
+
+    python benchmarks/password_hashing.py --logins 64 --workers 1
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from passwords import PasswordHasher, hash_password  # noqa: E402
+
+SETTINGS = [
+    ('bcrypt', (10,)),
+    ('bcrypt', (12,)),
+    ('scrypt', (2 ** 14, 8, 1)),
+    ('scrypt', (2 ** 15, 8, 1)),
+]
+
+
+def co_tenant(stop, progress):
+    count = 0
+    while not stop.is_set():
+        for _ in range(1000):
+            count += 1
+        progress[0] = count
+
+
+def storm(hasher, stored, args):
+    stop = threading.Event()
+    progress = [0]
+    tenant = threading.Thread(target=co_tenant, args=(stop, progress))
+    tenant.start()
+    latencies = []
+
+    def login(_):
+        start = time.perf_counter()
+        assert hasher.verify(stored, 'correct horse')[0]
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    tenant.join()
+    latencies.sort()
+    return args.logins / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95) - 1], \
+        progress[0] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16, help='request threads logging in at once')
+    parser.add_argument('--workers', type=int, default=1, help='hashing pool threads')
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+
+    idle = [0]
+    stop = threading.Event()
+    tenant = threading.Thread(target=co_tenant, args=(stop, idle))
+    tenant.start()
+    time.sleep(1)
+    stop.set()
+    tenant.join()
+    print(f"{cores} cores; co-tenant loop alone: {idle[0] / 1e6:.1f}M/s")
+
+    print(f"{'setting':<24}{'mode':<12}{'logins/s':>10}{'per core':>10}{'p50 ms':>9}{'p95 ms':>9}{'co-tenant':>11}")
+    for scheme, params in SETTINGS:
+        stored = hash_password('correct horse', scheme, params)
+        label = f"{scheme} {'/'.join(str(p) for p in params)}"
+        for mode, workers in (('inline', 0), (f"pool x{args.workers}", args.workers)):
+            hasher = PasswordHasher(workers=workers, scheme=scheme, params=params)
+            throughput, p50, p95, tenant_rate = storm(hasher, stored, args)
+            busy_cores = min(cores, workers or args.concurrency)
+            print(f"{label:<24}{mode:<12}{throughput:>10.1f}{throughput / busy_cores:>10.1f}"
+                  f"{p50 * 1000:>9.0f}{p95 * 1000:>9.0f}{tenant_rate / idle[0]:>10.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Throughput of batched vs per-request Gemini prompting against a fake model.
+
+The fake model takes ``--llm-latency`` seconds per call and allows only
+``--llm-concurrency`` calls at once, like a quota-limited API. It answers
+single prompts and batched prompts, echoing each request's mood in the
+cuisine field so the run can check that every request got its own answer.
+``--drop-rate`` leaves entries out of batched answers to exercise the
+fallback to single prompts.
+
+    python benchmarks/prompt_batching.py --requests 200 --concurrency 50
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from moods import CANONICAL_MOODS, prompt_mood  # noqa: E402
+from prompt_batcher import PromptBatcher  # noqa: E402
+from prompts import create_prompt  # noqa: E402
+from response_parser import parse_recommendations  # noqa: E402
+
+
+def answer(mood):
+    return {
+        'cuisine': f"food for {mood}",
+        'songs': [{'title': f"Song {i} - Artist"} for i in range(5)],
+        'explanation': 'Because.'
+    }
+
+
+class FakeModel:
+    def __init__(self, latency, concurrency, drop_rate):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.slots = threading.Semaphore(concurrency)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self.slots:
+            with self._lock:
+                self.calls += 1
+            time.sleep(self.latency)
+
+        people = re.findall(r"^- (r\d+): feeling (.+?) during", prompt, re.M)
+        if people:
+            text = json.dumps({
+                request_id: answer(mood) for request_id, mood in people if random.random() >= self.drop_rate
+            })
+        else:
+            text = json.dumps(answer(re.search(r"someone feeling (.+?) during", prompt).group(1)))
+        return type('Response', (), {'text': f"```json\n{text}\n```"})()
+
+
+def run(label, generate, model, args):
+    moods = [random.choice(list(CANONICAL_MOODS)) for _ in range(args.requests)]
+    hours = [random.randrange(24) for _ in range(args.requests)]
+
+    def one(i):
+        result = generate(model, moods[i], hours[i])
+        assert result['cuisine'] == f"food for {prompt_mood(moods[i])}", (moods[i], result['cuisine'])
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12}{args.requests / elapsed:>10.1f} req/s{model.calls:>10} LLM calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--llm-concurrency', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--window', type=float, default=0.03)
+    parser.add_argument('--drop-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    def single(model, mood, hour):
+        return parse_recommendations(model.generate_content(create_prompt(prompt_mood(mood), hour)).text)
+
+    print(f"{'mode':<12}{'throughput':>14}{'':>10}")
+    run('single', single, FakeModel(args.llm_latency, args.llm_concurrency, 0), args)
+
+    batcher = PromptBatcher(batch_size=args.batch_size, window=args.window, fallback_single=True,
+                            workers=args.llm_concurrency)
+    run('batched', batcher.generate, FakeModel(args.llm_latency, args.llm_concurrency, args.drop_rate), args)
+    print(batcher.stats())
+
+
+if __name__ == '__main__':
+    main()
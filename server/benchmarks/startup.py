@@ -0,0 +1,82 @@
+"""Measure cold-start cost: import time per module and first-use init time.
+
+Every measurement runs in a fresh interpreter, the way a serverless cold
+start would, and the median of ``--repeat`` runs is reported.
+
+    python benchmarks/startup.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'config', 'models', 'prompts', 'response_parser', 'link_cache', 'enrichment',
+    'youtube_utils', 'spotify_utils', 'gemini_client', 'response_cache', 'app', 'asgi'
+]
+
+# name -> (setup statement, timed statement)
+INITIALIZERS = {
+    'gemini model': ('import gemini_client', 'gemini_client.get_model()'),
+    'youtube client': ('import youtube_utils', 'youtube_utils.get_youtube_client()'),
+    'spotify resolver': ('import spotify_utils', 'spotify_utils.get_spotify_resolver()'),
+    'schema (init-db)': ('import app', 'app.init_db()'),
+}
+
+
+def run_python(code, env):
+    result = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', code],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_import(module, env):
+    return run_python(
+        f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)", env
+    )
+
+
+def time_init(setup, statement, env):
+    return run_python(
+        f"{setup}\nimport time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)", env
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ)
+    # Dummy credentials: constructors must not need the network
+    env.setdefault('GOOGLE_API_KEY', 'bench')
+    env.setdefault('YOUTUBE_API_KEY', 'bench')
+    env.setdefault('SPOTIFY_CLIENT_ID', 'bench')
+    env.setdefault('SPOTIFY_CLIENT_SECRET', 'bench')
+    env.setdefault('SECRET_KEY', 'bench')
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+
+    print(f"{'import':<28}{'median ms':>10}")
+    for module in MODULES:
+        try:
+            samples = [time_import(module, env) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<28}{'failed':>10}  {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{module:<28}{statistics.median(samples) * 1000:>10.1f}")
+
+    print(f"\n{'first-use init':<28}{'median ms':>10}")
+    for name, (setup, statement) in INITIALIZERS.items():
+        samples = [time_init(setup, statement, env) for _ in range(args.repeat)]
+        print(f"{name:<28}{statistics.median(samples) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Local stand-ins for Gemini, YouTube search and Spotify search.
+
+``StubServer`` serves the YouTube search, Spotify search and Spotify token
+endpoints over HTTP, so the app exercises its real HTTP clients.
+``FakeModel`` replaces the GenerativeModel in-process. Both take a latency
+distribution and an error rate. ``serve_flask`` runs the real Flask app on
+a fixed pool of worker threads, and ``start`` runs any of these servers in
+its own process.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+
+class UpstreamError(Exception):
+    """Shaped like google.api_core errors, which carry an HTTP status as ``code``."""
+
+    def __init__(self, code):
+        super().__init__(f"stub upstream error {code}")
+        self.code = code
+
+
+def sample_latency(mean, spread=0.0, distribution='fixed'):
+    """Seconds to wait: ``mean`` itself, mean +/- spread, or lognormal with median ``mean``."""
+    if mean <= 0:
+        return 0.0
+    if distribution == 'uniform':
+        return max(0.0, random.uniform(mean - spread, mean + spread))
+    if distribution == 'lognormal':
+        return random.lognormvariate(0, spread) * mean
+    return mean
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.1
+    spread = 0.0
+    distribution = 'fixed'
+    error_rate = 0.0
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(sample_latency(self.latency, self.spread, self.distribution))
+        if random.random() < self.error_rate:
+            self._send({'error': 'stub failure'}, status=503)
+        elif self.path.startswith('/youtube/'):
+            self._send({'items': [{'id': {'videoId': 'stub'}}]})
+        else:
+            self._send({'tracks': {'items': [{
+                'name': 'Stub', 'artists': [{'name': 'Stub'}], 'preview_url': None,
+                'external_urls': {'spotify': 'https://open.spotify.com/track/stub'}
+            }]}})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send({'access_token': 'stub', 'token_type': 'Bearer', 'expires_in': 3600})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 2048
+
+
+def serve_stub(latency, ready, spread=0.0, distribution='fixed', error_rate=0.0):
+    StubUpstreamHandler.latency = latency
+    StubUpstreamHandler.spread = spread
+    StubUpstreamHandler.distribution = distribution
+    StubUpstreamHandler.error_rate = error_rate
+    stub = StubServer(('127.0.0.1', 0), StubUpstreamHandler)
+    ready.put(stub.server_address[1])
+    stub.serve_forever()
+
+
+class FakeModel:
+    """Stands in for GenerativeModel; every call returns distinct songs.
+
+    ``distinct_songs`` bounds how many different titles are handed out, so
+    link caches can warm up the way they would on real traffic.
+    """
+
+    def __init__(self, latency, spread=0.0, distribution='fixed', error_rate=0.0, distinct_songs=None):
+        self.latency = latency
+        self.spread = spread
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.distinct_songs = distinct_songs
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _response(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if random.random() < self.error_rate:
+            raise UpstreamError(503)
+        numbers = [call * 5 + i for i in range(5)]
+        if self.distinct_songs:
+            numbers = [n % self.distinct_songs for n in numbers]
+        text = json.dumps({
+            'cuisine': 'Ramen',
+            'songs': [{'title': f"Song {n} - Artist {n % 7}"} for n in numbers],
+            'explanation': 'Stubbed recommendation.'
+        })
+        return type('Response', (), {'text': f"```json\n{text}\n```"})()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        time.sleep(sample_latency(self.latency, self.spread, self.distribution))
+        response = self._response()
+        if stream:
+            return [response]
+        return response
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(sample_latency(self.latency, self.spread, self.distribution))
+        return self._response()
+
+
+def serve_flask(model, workers, ready, resilient=False):
+    """Serve app.app with ``model`` as the Gemini model.
+
+    With ``resilient`` the model is wrapped in ResilientModel, so retries,
+    the breaker and the upstream counters behave as in production.
+    """
+    from werkzeug.serving import BaseWSGIServer
+    import app as flask_app
+
+    import gemini_client
+
+    gemini_client.model = gemini_client.ResilientModel(model) if resilient else model
+
+    class PooledWSGIServer(BaseWSGIServer):
+        # One request per worker thread at a time, like a pool of sync workers
+        executor = ThreadPoolExecutor(max_workers=workers)
+        request_queue_size = 2048
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = PooledWSGIServer('127.0.0.1', 0, flask_app.app)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+
+def start(target, *args, **kwargs):
+    """Run ``target(*args, ready, **kwargs)`` in a new process; returns (process, port)."""
+    # Each server gets its own process so it does not share a GIL with the load generator
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=(*args, ready), kwargs=kwargs, daemon=True)
+    process.start()
+    return process, ready.get(timeout=60)
@@ -0,0 +1,315 @@
+"""Benchmark the Flask app end to end against local stand-ins for its upstreams.
+
+The real app is served by a fixed pool of worker threads. Gemini is a fake
+model wrapped in ResilientModel. YouTube search and the Spotify search and
+token endpoints are served by a local HTTP stub. Each stand-in takes a
+latency distribution (fixed, uniform or lognormal) and an error rate. The
+database is a fresh SQLite file unless ``--database-url`` points somewhere
+else, e.g. a local Postgres.
+
+Virtual users register, then send a weighted mix of logins, recommendation,
+history and stats requests. The report gives throughput and p50/p95/p99
+per endpoint, plus upstream calls per recommendation request (read from
+/metrics, so tracing must be on). ``--save`` writes the results as JSON,
+and ``--baseline`` compares this run against a saved one. Any metric that
+is worse by more than ``--tolerance`` is flagged, and the exit status is 1.
+
+    python benchmarks/suite.py --requests 500 --save baseline.json
+    python benchmarks/suite.py --requests 500 --baseline baseline.json --env GEMINI_BATCH_ENABLED=true
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+warnings.filterwarnings('ignore')
+
+from stubs import LATENCY_DISTRIBUTIONS, FakeModel, serve_flask, serve_stub, start  # noqa: E402
+
+ENDPOINTS = ('register', 'login', 'recommendations', 'history', 'stats')
+MOODS = ['happy', 'sad', 'stressed out', 'so tired', 'anxious', 'chill', 'in love', 'angry',
+         'bored', 'excited', 'lonely', 'nostalgic', 'feeling great', 'burnt out']
+# metric -> True when a higher value is better
+COMPARED = {'throughput': True, 'p50': False, 'p95': False, 'p99': False, 'error_rate': False}
+UPSTREAM_LINE = re.compile(r'^mood_harmony_upstream_requests_total\{.*upstream="(\w+)".*\} (\d+)$', re.M)
+
+
+def percentile(samples, q):
+    # Nearest-rank on sorted samples
+    return samples[max(0, min(len(samples) - 1, int(round(q / 100 * len(samples))) - 1))]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS[1:]:
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_env(text):
+    name, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {text}")
+    return name, value
+
+
+def upstream_calls(metrics_text):
+    totals = {}
+    for upstream, value in UPSTREAM_LINE.findall(metrics_text):
+        totals[upstream] = totals.get(upstream, 0) + int(value)
+    return totals
+
+
+async def run_load(base_url, args):
+    import aiohttp
+
+    samples = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = {endpoint: 0 for endpoint in ENDPOINTS}
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout) as client:
+        async def call(endpoint, method, path, **kwargs):
+            start = time.perf_counter()
+            try:
+                async with client.request(method, path, **kwargs) as response:
+                    body = await response.json(content_type=None)
+                    ok = response.status < 400 and 'error' not in body
+            except Exception:
+                body, ok = None, False
+            samples[endpoint].append(time.perf_counter() - start)
+            if not ok:
+                errors[endpoint] += 1
+            return body
+
+        async with client.get('/metrics') as response:
+            before = upstream_calls(await response.text())
+
+        run_id = time.time_ns()
+        users = []
+        for i in range(args.users):
+            email = f"bench-{run_id}-{i}@example.com"
+            body = await call('register', 'POST', '/api/register', json={'email': email, 'password': 'bench'})
+            if body and 'token' in body:
+                users.append((email, {'Authorization': f"Bearer {body['token']}"}))
+        if not users:
+            raise SystemExit("No users could be registered; is the database reachable?")
+
+        names, weights = zip(*args.mix.items())
+        plan = random.choices(names, weights=weights, k=args.requests)
+        queue = asyncio.Queue()
+        for endpoint in plan:
+            queue.put_nowait(endpoint)
+
+        async def worker():
+            while not queue.empty():
+                endpoint = queue.get_nowait()
+                email, headers = random.choice(users)
+                if endpoint == 'login':
+                    await call(endpoint, 'POST', '/api/login', json={'email': email, 'password': 'bench'})
+                elif endpoint == 'recommendations':
+                    await call(endpoint, 'POST', '/api/recommendations', json={
+                        'mood': random.choice(MOODS), 'hour': random.randrange(24)
+                    }, headers=headers)
+                elif endpoint == 'history':
+                    await call(endpoint, 'GET', '/api/history', headers=headers)
+                else:
+                    await call(endpoint, 'GET', '/api/stats', headers=headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        async with client.get('/metrics') as response:
+            after = upstream_calls(await response.text())
+
+    return samples, errors, elapsed, {name: after[name] - before.get(name, 0) for name in after}
+
+
+def summarize(samples, errors, elapsed, upstream, args):
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        latencies = sorted(samples[endpoint])
+        if not latencies:
+            continue
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'errors': errors[endpoint],
+            'error_rate': errors[endpoint] / len(latencies),
+            # Registration runs before the timed mix, so it has no throughput of its own
+            'throughput': len(latencies) / elapsed if endpoint != 'register' else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
+    recommendation_requests = len(samples['recommendations'])
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit,
+            'args': {key: value for key, value in vars(args).items() if key not in ('save', 'baseline')},
+        },
+        'overall': {
+            'requests': args.requests,
+            'seconds': elapsed,
+            'throughput': args.requests / elapsed,
+            'errors': sum(errors[endpoint] for endpoint in ENDPOINTS if endpoint != 'register'),
+        },
+        'endpoints': endpoints,
+        'upstream_calls': upstream,
+        'upstream_per_recommendation': {
+            name: calls / recommendation_requests for name, calls in upstream.items()
+        } if recommendation_requests else {},
+    }
+
+
+def report(results):
+    overall = results['overall']
+    print(f"{overall['requests']} requests in {overall['seconds']:.1f}s: "
+          f"{overall['throughput']:.1f} req/s, {overall['errors']} errors")
+    print(f"{'endpoint':<16}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, row in results['endpoints'].items():
+        throughput = f"{row['throughput']:.1f}" if row['throughput'] is not None else '-'
+        print(f"{endpoint:<16}{row['requests']:>9}{row['errors']:>8}{throughput:>9}"
+              f"{row['p50'] * 1000:>9.1f}{row['p95'] * 1000:>9.1f}{row['p99'] * 1000:>9.1f}")
+    if results['upstream_per_recommendation']:
+        per_request = ', '.join(f"{name} {value:.2f}" for name, value in
+                                sorted(results['upstream_per_recommendation'].items()))
+        print(f"upstream calls per recommendation: {per_request}")
+    else:
+        print("upstream calls per recommendation: unavailable (TRACING_ENABLED is off?)")
+
+
+def compare(results, baseline, tolerance):
+    """Print the change from ``baseline`` per metric; returns the number of regressions."""
+    rows = []
+    for endpoint, row in results['endpoints'].items():
+        base = baseline['endpoints'].get(endpoint)
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            rows.append((endpoint, metric, base.get(metric), row.get(metric), higher_is_better))
+    current_upstream = results['upstream_per_recommendation']
+    for name, value in baseline.get('upstream_per_recommendation', {}).items():
+        if name in current_upstream:
+            rows.append((f"upstream:{name}", 'calls/req', value, current_upstream[name], False))
+
+    regressions = 0
+    print(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'} "
+          f"({baseline['meta'].get('timestamp')}), tolerance {tolerance:.0%}")
+    print(f"{'endpoint':<26}{'metric':<12}{'baseline':>11}{'current':>11}{'change':>9}")
+    for endpoint, metric, old, new, higher_is_better in rows:
+        if old is None or new is None:
+            continue
+        scale = 1000 if metric.startswith('p') else 1
+        if old:
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+        elif not new:
+            change = worse = 0.0
+        else:
+            change = None
+            # Errors or calls appearing where the baseline had none count as worse
+            worse = 0.0 if higher_is_better else float('inf')
+        flag = ''
+        if worse > tolerance:
+            regressions += 1
+            flag = '  REGRESSION'
+        shown = f"{change:+.1%}" if change is not None else 'new'
+        print(f"{endpoint:<26}{metric:<12}{old * scale:>11.3f}{new * scale:>11.3f}{shown:>9}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help='requests in the timed mix')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--users', type=int, default=20, help='users registered before the mix')
+    parser.add_argument('--workers', type=int, default=8, help='Flask worker threads')
+    parser.add_argument('--mix', type=parse_mix, default='recommendations=6,history=2,stats=1,login=1',
+                        help='endpoint=weight pairs for the timed mix')
+    parser.add_argument('--request-timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='median seconds per Gemini call')
+    parser.add_argument('--llm-spread', type=float, default=0.3,
+                        help='+/- seconds for uniform, sigma for lognormal')
+    parser.add_argument('--llm-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--distinct-songs', type=int, default=500, help='song titles the fake model cycles through')
+    parser.add_argument('--upstream-latency', type=float, default=0.08, help='median seconds per YouTube/Spotify call')
+    parser.add_argument('--upstream-spread', type=float, default=0.3)
+    parser.add_argument('--upstream-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--upstream-error-rate', type=float, default=0.0)
+    parser.add_argument('--database-url', help='defaults to a fresh SQLite file; e.g. postgresql://localhost/bench')
+    parser.add_argument('--env', type=parse_env, action='append', default=[], metavar='KEY=VALUE',
+                        help='app setting for this run, e.g. GEMINI_BATCH_ENABLED=true (repeatable)')
+    parser.add_argument('--save', help='write results as JSON to this path')
+    parser.add_argument('--baseline', help='compare with results saved by an earlier --save')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change that counts as a regression')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    stub, stub_port = start(serve_stub, args.upstream_latency, spread=args.upstream_spread,
+                            distribution=args.upstream_distribution, error_rate=args.upstream_error_rate)
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.update({
+        'DATABASE_URL': database_url,
+        'GOOGLE_API_KEY': 'bench',
+        'SECRET_KEY': 'bench',
+        'YOUTUBE_API_KEY': 'bench',
+        'SPOTIFY_CLIENT_ID': 'bench',
+        'SPOTIFY_CLIENT_SECRET': 'bench',
+        'YOUTUBE_SEARCH_URL': f"{stub_url}/youtube/v3/search",
+        'SPOTIFY_API_URL': f"{stub_url}/spotify/v1",
+        'SPOTIFY_TOKEN_URL': f"{stub_url}/spotify/token",
+    })
+    os.environ.update(dict(args.env))
+    args.database = database_url.split(':', 1)[0]
+    import app as flask_app
+    flask_app.init_db()
+
+    model = FakeModel(args.llm_latency, spread=args.llm_spread, distribution=args.llm_distribution,
+                      error_rate=args.llm_error_rate, distinct_songs=args.distinct_songs)
+    server, port = start(serve_flask, model, args.workers, resilient=True)
+    try:
+        samples, errors, elapsed, upstream = asyncio.run(run_load(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.terminate()
+        stub.terminate()
+
+    args.env = [f"{name}={value}" for name, value in args.env]
+    args.mix = ','.join(f"{name}={weight:g}" for name, weight in args.mix.items())
+    results = summarize(samples, errors, elapsed, upstream, args)
+    report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Cost of stage tracing, with it switched off, on, and on with Server-Timing.
+
+Measures a bare ``span()`` enter/exit, then full /api/recommendations
+requests through the Flask test client with a zero-latency fake model and
+link lookups, so the instrumentation is a large share of the work.
+
+    python benchmarks/tracing_overhead.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+RESPONSE = '{"cuisine": "Soup", "songs": [%s], "explanation": "x"}' % ', '.join(
+    f'{{"title": "Song {i} - Artist"}}' for i in range(5)
+)
+
+
+class FakeModel:
+    def generate_content(self, prompt, stream=False):
+        return type('Response', (), {'text': RESPONSE})()
+
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter_ns() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--spans', type=int, default=200000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tracing.db')}"
+    os.environ['HISTORY_WRITE_BEHIND'] = 'true'
+    for name in ('GOOGLE_API_KEY', 'YOUTUBE_API_KEY', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET', 'SECRET_KEY'):
+        os.environ.setdefault(name, 'bench')
+
+    import app as flask_app
+    import gemini_client
+    import metrics
+    from config import Config
+
+    flask_app.init_db()
+    gemini_client.model = FakeModel()
+    flask_app.get_youtube_link = lambda title: 'https://youtu.be/x'
+    flask_app.get_spotify_link = lambda title, artist, deadline=None: None
+    client = flask_app.app.test_client()
+    user_id = client.post('/api/register', json={'email': 'bench@example.com', 'password': 'x'}).get_json()['user_id']
+    body = {'mood': 'happy', 'hour': 9, 'user_id': user_id}
+
+    def span_once():
+        with metrics.span('bench'):
+            pass
+
+    def request_once():
+        client.post('/api/recommendations', json=body)
+
+    modes = [('off', False, False), ('on', True, False), ('on + Server-Timing', True, True)]
+    per_call_ns(request_once, 100)  # warm up
+    best = {label: (float('inf'), float('inf')) for label, _, _ in modes}
+    # Interleave rounds and keep the best, so drift and noise hit every mode alike
+    for _ in range(args.rounds):
+        for label, enabled, server_timing in modes:
+            metrics.tracing_enabled = enabled
+            Config.SERVER_TIMING_ENABLED = server_timing
+            span_ns = per_call_ns(span_once, args.spans // args.rounds)
+            request_ns = per_call_ns(request_once, args.requests // args.rounds)
+            best[label] = (min(best[label][0], span_ns), min(best[label][1], request_ns))
+
+    print(f"{'tracing':<22}{'span ns':>10}{'request us':>12}")
+    for label, (span_ns, request_ns) in best.items():
+        print(f"{label:<22}{span_ns:>10.0f}{request_ns / 1000:>12.0f}")
+    flask_app.history_writer.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Storage and query cost of songs before and after the track catalog.
+
+Builds a SQLite database in the old layout, where every song row carries
+its title and full YouTube/Spotify URLs, with ``--rows`` mood records
+whose songs are drawn from ``--distinct`` tracks (popular tracks
+recur far more often than the rest). It then times a few song queries,
+runs the batched migration, drops the old columns, and times the same
+queries against the catalog. Table and index sizes come from SQLite's
+dbstat table.
+
+    python benchmarks/track_catalog.py --rows 200000 --distinct 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+LEGACY_SONG_TABLE = """
+CREATE TABLE song (
+    id INTEGER NOT NULL PRIMARY KEY,
+    mood_record_id INTEGER NOT NULL REFERENCES mood_record (id),
+    title VARCHAR(200),
+    youtube_link VARCHAR(300),
+    spotify_link VARCHAR(300)
+)
+"""
+
+# Every variant reads the same songs: one history page, one export scan, one top-tracks report
+QUERIES = {
+    'history page (20 records)': (
+        "SELECT mood_record_id, title, youtube_link, spotify_link FROM song "
+        "WHERE mood_record_id BETWEEN :low AND :low + 19",
+        "SELECT s.mood_record_id, t.title, t.youtube_id, t.spotify_id FROM song s JOIN track t ON t.id = s.track_id "
+        "WHERE s.mood_record_id BETWEEN :low AND :low + 19",
+    ),
+    'full song scan': (
+        "SELECT count(*), sum(length(title) + length(youtube_link) + length(spotify_link)) FROM song",
+        "SELECT count(*), sum(length(t.title) + length(t.youtube_id) + length(t.spotify_id)) "
+        "FROM song s JOIN track t ON t.id = s.track_id",
+    ),
+    'top 20 tracks': (
+        "SELECT title, youtube_link, spotify_link, count(*) AS n FROM song "
+        "GROUP BY title, youtube_link, spotify_link ORDER BY n DESC LIMIT 20",
+        "SELECT t.title, t.youtube_id, t.spotify_id, n FROM "
+        "(SELECT track_id, count(*) AS n FROM song GROUP BY track_id ORDER BY n DESC LIMIT 20) s "
+        "JOIN track t ON t.id = s.track_id",
+    ),
+}
+
+
+def random_id(length, alphabet=string.ascii_letters + string.digits):
+    return ''.join(random.choice(alphabet) for _ in range(length))
+
+
+def build_fixture(path, rows, distinct, songs_per_record):
+    import app as flask_app
+    flask_app.init_db()
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE song")
+    conn.execute(LEGACY_SONG_TABLE)
+    conn.execute("CREATE INDEX ix_song_mood_record_id ON song (mood_record_id)")
+    conn.execute("INSERT INTO user (id, email, password) VALUES (1, 'bench@example.com', 'x')")
+
+    catalog = [
+        (f"{random_id(random.randint(8, 24), string.ascii_letters + ' ')} - {random_id(10, string.ascii_letters)}",
+         f"https://www.youtube.com/watch?v={random_id(11)}",
+         # Some tracks are not on Spotify
+         f"https://open.spotify.com/track/{random_id(22)}" if random.random() < 0.9 else '')
+        for _ in range(distinct)
+    ]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    start = datetime(2024, 1, 1)
+    batch = 50_000
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        ids = range(offset + 1, offset + count + 1)
+        conn.executemany(
+            "INSERT INTO mood_record (id, user_id, mood, cuisine, explanation, created_at) VALUES (?, 1, 'happy', "
+            "'Tacos', 'Because.', ?)",
+            [(i, (start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S.%f')) for i in ids]
+        )
+        picks = random.choices(catalog, weights, k=count * songs_per_record)
+        conn.executemany(
+            "INSERT INTO song (mood_record_id, title, youtube_link, spotify_link) VALUES (?, ?, ?, ?)",
+            [(ids[n // songs_per_record],) + track for n, track in enumerate(picks)]
+        )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def sizes(path):
+    conn = sqlite3.connect(path)
+    tables = dict(conn.execute(
+        "SELECT name, sum(pgsize) FROM dbstat WHERE name LIKE '%song%' OR name LIKE '%track%' GROUP BY name"
+    ).fetchall())
+    total = os.path.getsize(path)
+    conn.close()
+    return tables, total
+
+
+def time_queries(path, variant, rows, repeat):
+    conn = sqlite3.connect(path)
+    results = {}
+    for name, statements in QUERIES.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(statements[variant], {'low': random.randint(1, max(1, rows - 20))}).fetchall()
+            samples.append(time.perf_counter() - start)
+        results[name] = sorted(samples)[len(samples) // 2]
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--distinct', type=int, default=5000, help='distinct tracks in the fixture')
+    parser.add_argument('--songs-per-record', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=10000, help='songs per migration transaction')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'tracks.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    for name in ('GOOGLE_API_KEY', 'YOUTUBE_API_KEY', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET', 'SECRET_KEY'):
+        os.environ.setdefault(name, 'bench')
+
+    t = time.perf_counter()
+    build_fixture(path, args.rows, args.distinct, args.songs_per_record)
+    print(f"built {args.rows} records x {args.songs_per_record} songs over {args.distinct} tracks "
+          f"in {time.perf_counter() - t:.1f}s")
+    before_tables, before_total = sizes(path)
+    before_times = time_queries(path, 0, args.rows, args.repeat)
+
+    import app as flask_app
+    from tracks import migrate_songs
+    t = time.perf_counter()
+    with flask_app.app.app_context():
+        report = migrate_songs(flask_app.db.engine, args.batch_size, drop_legacy=True)
+    print(f"migrated in {time.perf_counter() - t:.1f}s: {report['total_songs']} songs -> {report['tracks']} tracks")
+    after_tables, after_total = sizes(path)
+    after_times = time_queries(path, 1, args.rows, args.repeat)
+
+    print(f"\n{'table / index':<40}{'before KB':>12}{'after KB':>12}")
+    for name in sorted(set(before_tables) | set(after_tables)):
+        print(f"{name:<40}{before_tables.get(name, 0) / 1024:>12,.0f}{after_tables.get(name, 0) / 1024:>12,.0f}")
+    song_before = sum(before_tables.values())
+    song_after = sum(after_tables.values())
+    print(f"{'songs + tracks':<40}{song_before / 1024:>12,.0f}{song_after / 1024:>12,.0f}"
+          f"  ({1 - song_after / song_before:.0%} smaller)")
+    print(f"{'database file':<40}{before_total / 1024:>12,.0f}{after_total / 1024:>12,.0f}")
+
+    print(f"\n{'query':<40}{'before ms':>12}{'after ms':>12}")
+    for name in QUERIES:
+        print(f"{name:<40}{before_times[name] * 1000:>12.2f}{after_times[name] * 1000:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Compare bare ``requests.get`` with the pooled YouTubeClient.
+
+Runs a local stand-in for the YouTube search endpoint (over TLS when the
+``openssl`` CLI is available) and times N sequential lookups each way,
+reporting how many TCP/TLS connections the server had to accept.
+
+    python benchmarks/youtube_client.py --requests 200
+"""
+import argparse
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from youtube_utils import YouTubeClient  # noqa: E402
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({'items': [{'id': {'videoId': 'dQw4w9WgXcQ'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+
+def make_certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', key, '-out', cert, '-subj', '/CN=localhost',
+        '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1'
+    ], check=True, capture_output=True)
+    return cert, key
+
+
+def start_server(tls, directory):
+    server = CountingServer(('127.0.0.1', 0), StubSearchHandler)
+    cert = None
+    if tls:
+        cert, key = make_certificate(directory)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scheme = 'https' if tls else 'http'
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/youtube/v3/search", cert
+
+
+def run(label, server, lookup, count):
+    server.connections = 0
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        lookup(f"Song {i}")
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{label:<10} total={sum(timings):.3f}s "
+          f"p50={timings[len(timings) // 2] * 1000:.2f}ms "
+          f"p99={timings[int(len(timings) * 0.99) - 1] * 1000:.2f}ms "
+          f"connections={server.connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--no-tls', action='store_true', help='serve plain HTTP')
+    args = parser.parse_args()
+
+    tls = not args.no_tls and shutil.which('openssl') is not None
+    with tempfile.TemporaryDirectory() as directory:
+        server, url, cert = start_server(tls, directory)
+        verify = cert if tls else True
+        print(f"stub: {url} ({'TLS' if tls else 'plain HTTP'}), {args.requests} lookups each")
+
+        def bare_lookup(song_title):
+            params = {'q': f"{song_title} official music video", 'key': 'bench'}
+            response = requests.get(url, params=params, timeout=5, verify=verify)
+            response.raise_for_status()
+            return response.json()['items'][0]['id']['videoId']
+
+        client = YouTubeClient('bench', search_url=url)
+        client.session.verify = verify
+        # Keep REQUESTS_CA_BUNDLE from overriding the stub's self-signed certificate
+        client.session.trust_env = False
+
+        run('bare', server, bare_lookup, args.requests)
+        run('pooled', server, client.get_video_link, args.requests)
+        client.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
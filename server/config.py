@@ -6,7 +6,147 @@ load_dotenv()
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_POOL_SIZE = 10
-    SQLALCHEMY_MAX_OVERFLOW = 20
 
-    
\ No newline at end of file
+    # Link enrichment: per-lookup HTTP timeout and per-request deadline (seconds)
+    LINK_LOOKUP_TIMEOUT = float(os.getenv('LINK_LOOKUP_TIMEOUT', '5'))
+    ENRICHMENT_DEADLINE = float(os.getenv('ENRICHMENT_DEADLINE', '8'))
+    ENRICHMENT_MAX_WORKERS = int(os.getenv('ENRICHMENT_MAX_WORKERS', '32'))
+
+    # Song link cache: in-process LRU in front of the link_cache_entry table
+    LINK_CACHE_SIZE = int(os.getenv('LINK_CACHE_SIZE', '4096'))
+    LINK_CACHE_TTL = int(os.getenv('LINK_CACHE_TTL', str(7 * 24 * 3600)))
+    LINK_CACHE_NEGATIVE_TTL = int(os.getenv('LINK_CACHE_NEGATIVE_TTL', '3600'))
+    LINK_CACHE_DB_ENABLED = os.getenv('LINK_CACHE_DB_ENABLED', 'true').lower() == 'true'
+
+    # YouTube Data API client: pooled keep-alive session with retries on 429/5xx
+    YOUTUBE_SEARCH_URL = os.getenv('YOUTUBE_SEARCH_URL', 'https://www.googleapis.com/youtube/v3/search')
+    YOUTUBE_POOL_SIZE = int(os.getenv('YOUTUBE_POOL_SIZE', '32'))
+    YOUTUBE_CONNECT_TIMEOUT = float(os.getenv('YOUTUBE_CONNECT_TIMEOUT', '3'))
+    YOUTUBE_READ_TIMEOUT = float(os.getenv('YOUTUBE_READ_TIMEOUT', str(LINK_LOOKUP_TIMEOUT)))
+    YOUTUBE_MAX_RETRIES = int(os.getenv('YOUTUBE_MAX_RETRIES', '2'))
+    YOUTUBE_BACKOFF_FACTOR = float(os.getenv('YOUTUBE_BACKOFF_FACTOR', '0.3'))
+
+    # Optional cache of Gemini results keyed on (normalized mood, time of day)
+    RECOMMENDATION_CACHE_ENABLED = os.getenv('RECOMMENDATION_CACHE_ENABLED', 'false').lower() == 'true'
+    RECOMMENDATION_CACHE_VARIANTS = int(os.getenv('RECOMMENDATION_CACHE_VARIANTS', '3'))
+    RECOMMENDATION_CACHE_TTL = int(os.getenv('RECOMMENDATION_CACHE_TTL', '1800'))
+    RECOMMENDATION_CACHE_MAX_KEYS = int(os.getenv('RECOMMENDATION_CACHE_MAX_KEYS', '1024'))
+
+    SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
+    SPOTIFY_TOKEN_URL = os.getenv('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
+
+    # ASGI serving path (asgi.py)
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', '100'))
+    ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '10'))
+    ASYNC_DB_MAX_OVERFLOW = int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '20'))
+
+    # Spotify resolver: micro-batched searches under a shared rate-limit budget
+    SPOTIFY_BATCH_SIZE = int(os.getenv('SPOTIFY_BATCH_SIZE', '16'))
+    SPOTIFY_BATCH_WINDOW = float(os.getenv('SPOTIFY_BATCH_WINDOW', '0.01'))
+    # Searches per second per process. An uncached recommendation costs up to 5, so 100/s serves
+    # about 20 recommendations/s. Spotify enforces its own limit over a rolling 30 s window; a 429
+    # Retry-After pauses every caller, so this is a ceiling rather than the real limit.
+    SPOTIFY_RATE_LIMIT = float(os.getenv('SPOTIFY_RATE_LIMIT', '100'))
+    SPOTIFY_RATE_BURST = float(os.getenv('SPOTIFY_RATE_BURST', '200'))
+    # Lookups waiting for dispatch; beyond this new lookups fail at once
+    SPOTIFY_QUEUE_SIZE = int(os.getenv('SPOTIFY_QUEUE_SIZE', '256'))
+    SPOTIFY_MAX_RETRIES = int(os.getenv('SPOTIFY_MAX_RETRIES', '2'))
+    SPOTIFY_BACKOFF_FACTOR = float(os.getenv('SPOTIFY_BACKOFF_FACTOR', '0.3'))
+    SPOTIFY_CONNECT_TIMEOUT = float(os.getenv('SPOTIFY_CONNECT_TIMEOUT', '3'))
+
+    # Recommendation history: write-behind queue, or strict synchronous writes when disabled
+    HISTORY_WRITE_BEHIND = os.getenv('HISTORY_WRITE_BEHIND', 'true').lower() == 'true'
+    HISTORY_QUEUE_SIZE = int(os.getenv('HISTORY_QUEUE_SIZE', '1000'))
+    HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '100'))
+    HISTORY_BATCH_WINDOW = float(os.getenv('HISTORY_BATCH_WINDOW', '0.05'))
+    HISTORY_SHUTDOWN_TIMEOUT = float(os.getenv('HISTORY_SHUTDOWN_TIMEOUT', '10'))
+
+    # /api/history page sizes
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '20'))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '100'))
+
+    # 'local' answers from stored history when confident and falls back to Gemini otherwise
+    RECOMMENDATION_ENGINE = os.getenv('RECOMMENDATION_ENGINE', 'gemini').lower()
+    LOCAL_INDEX_MAX_RECORDS = int(os.getenv('LOCAL_INDEX_MAX_RECORDS', '50000'))
+    LOCAL_INDEX_REFRESH = int(os.getenv('LOCAL_INDEX_REFRESH', '600'))
+    LOCAL_MIN_CONFIDENCE = float(os.getenv('LOCAL_MIN_CONFIDENCE', '0.6'))
+    LOCAL_MIN_SUPPORT = int(os.getenv('LOCAL_MIN_SUPPORT', '3'))
+    LOCAL_SONG_COUNT = int(os.getenv('LOCAL_SONG_COUNT', '5'))
+
+    # Mood canonicalization (moods.py): fuzzy-match cutoff and memoized inputs
+    MOOD_MATCH_THRESHOLD = float(os.getenv('MOOD_MATCH_THRESHOLD', '0.6'))
+    MOOD_CACHE_SIZE = int(os.getenv('MOOD_CACHE_SIZE', '10000'))
+
+    # Batch concurrent Gemini requests into one prompt (prompt_batcher.py)
+    GEMINI_BATCH_ENABLED = os.getenv('GEMINI_BATCH_ENABLED', 'false').lower() == 'true'
+    GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', '8'))
+    GEMINI_BATCH_WINDOW = float(os.getenv('GEMINI_BATCH_WINDOW', '0.03'))
+    GEMINI_BATCH_FALLBACK = os.getenv('GEMINI_BATCH_FALLBACK', 'true').lower() == 'true'
+    GEMINI_BATCH_WORKERS = int(os.getenv('GEMINI_BATCH_WORKERS', '8'))
+
+    # Gemini client resilience (gemini_client.ResilientModel); times in seconds
+    GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '20'))
+    GEMINI_DEADLINE = float(os.getenv('GEMINI_DEADLINE', '45'))
+    GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+    GEMINI_RETRY_BACKOFF = float(os.getenv('GEMINI_RETRY_BACKOFF', '0.5'))
+    GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '32'))
+    GEMINI_HEDGE_ENABLED = os.getenv('GEMINI_HEDGE_ENABLED', 'false').lower() == 'true'
+    GEMINI_HEDGE_PERCENTILE = float(os.getenv('GEMINI_HEDGE_PERCENTILE', '95'))
+    GEMINI_HEDGE_MIN_DELAY = float(os.getenv('GEMINI_HEDGE_MIN_DELAY', '1'))
+    GEMINI_BREAKER_WINDOW = int(os.getenv('GEMINI_BREAKER_WINDOW', '20'))
+    GEMINI_BREAKER_MIN_CALLS = int(os.getenv('GEMINI_BREAKER_MIN_CALLS', '10'))
+    GEMINI_BREAKER_ERROR_RATE = float(os.getenv('GEMINI_BREAKER_ERROR_RATE', '0.5'))
+    GEMINI_BREAKER_COOLDOWN = float(os.getenv('GEMINI_BREAKER_COOLDOWN', '30'))
+
+    # Stage timing and /metrics; Server-Timing response headers are opt-in
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+
+    # Password hashing (passwords.py): 'bcrypt' or memory-hard 'scrypt'; stored
+    # hashes made with other settings are upgraded on the next login
+    PASSWORD_SCHEME = os.getenv('PASSWORD_SCHEME', 'bcrypt').lower()
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    SCRYPT_N = int(os.getenv('SCRYPT_N', '16384'))
+    SCRYPT_R = int(os.getenv('SCRYPT_R', '8'))
+    SCRYPT_P = int(os.getenv('SCRYPT_P', '1'))
+    # Threads that hash passwords, i.e. the most cores a login storm can take;
+    # 0 hashes on the request thread
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+
+    # Signed session tokens (auth.py); SECRET_KEY is required and must match on every instance
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    AUTH_TOKEN_TTL = int(os.getenv('AUTH_TOKEN_TTL', str(30 * 24 * 3600)))
+    # Until true, requests without a token may still name their user_id
+    AUTH_REQUIRE_TOKEN = os.getenv('AUTH_REQUIRE_TOKEN', 'false').lower() == 'true'
+    AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+    AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+
+    # /api/recommendations/batch: items per call, and threads generating distinct answers
+    RECOMMENDATION_BATCH_MAX_ITEMS = int(os.getenv('RECOMMENDATION_BATCH_MAX_ITEMS', '20'))
+    RECOMMENDATION_BATCH_WORKERS = int(os.getenv('RECOMMENDATION_BATCH_WORKERS', '8'))
+
+    # Warm pool of pre-generated answers (warm_pool.py); needs a long-running process
+    WARM_POOL_ENABLED = os.getenv('WARM_POOL_ENABLED', 'false').lower() == 'true'
+    WARM_POOL_TOP_K = int(os.getenv('WARM_POOL_TOP_K', '8'))
+    WARM_POOL_DEPTH = int(os.getenv('WARM_POOL_DEPTH', '2'))
+    WARM_POOL_MAX_ENTRIES = int(os.getenv('WARM_POOL_MAX_ENTRIES', '64'))
+    WARM_POOL_MAX_AGE = int(os.getenv('WARM_POOL_MAX_AGE', '1800'))
+    # Seconds between checks while the pool is full, and after a failed refill
+    WARM_POOL_INTERVAL = float(os.getenv('WARM_POOL_INTERVAL', '5'))
+    # Hours from UTC to most users' local time, which picks the current time of day
+    WARM_POOL_UTC_OFFSET = int(os.getenv('WARM_POOL_UTC_OFFSET', '0'))
+
+    # History export (export.py): rows per server-side cursor fetch, and the key
+    # that allows exporting every user's history (unset: own history only)
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '5000'))
+    EXPORT_API_KEY = os.getenv('EXPORT_API_KEY')
+
+    # Database engine (engine_config.py): profile is auto, sqlite, pooled or serverless
+    DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'auto').lower()
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    # Seconds a request waits for a free connection before failing
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '300'))
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+    DB_SQLITE_BUSY_TIMEOUT = float(os.getenv('DB_SQLITE_BUSY_TIMEOUT', '30'))
@@ -0,0 +1,177 @@
+"""SQLAlchemy engine options per database backend, and pool telemetry.
+
+Flask-SQLAlchemy builds its engine inside ``db.init_app`` from
+SQLALCHEMY_ENGINE_OPTIONS, so app.py sets them from ``engine_options``
+before calling it. DB_ENGINE_PROFILE picks the profile. ``auto`` picks
+``sqlite`` for SQLite URLs, ``serverless`` on Vercel, and ``pooled``
+otherwise.
+
+- ``sqlite``: a bounded pool and a busy timeout. In-memory databases keep
+  Flask-SQLAlchemy's single shared connection.
+- ``pooled``: up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections, with
+  pre-ping, recycling, and libpq keepalives on Postgres.
+- ``serverless``: NullPool opens a connection per checkout and closes it
+  on checkin, so idle function instances hold no connections. Point
+  DATABASE_URL at an external pooler (PgBouncer, or the Neon or Supabase
+  pooler) to keep connects cheap.
+
+Every checkout is timed (connect time under NullPool). ``pool_monitor``
+reports waits, timeouts, and checked-out, idle and overflow connections
+to /metrics and /api/cache/stats.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+from config import Config
+from metrics import (
+    DB_POOL_CHECKED_OUT, DB_POOL_IDLE, DB_POOL_OVERFLOW, DB_POOL_TIMEOUTS, DB_POOL_WAIT_SECONDS, registry
+)
+
+PROFILES = ('sqlite', 'pooled', 'serverless')
+# Drivers that pass connect_args through to libpq
+LIBPQ_DRIVERS = ('postgresql', 'postgresql+psycopg2', 'postgresql+psycopg')
+
+
+class PoolMonitor:
+    """Checkout counts and waits of the app's engine pool."""
+
+    def __init__(self):
+        self.pool = None
+        self.limit = None
+        self._lock = threading.Lock()
+        self._wait_seconds = registry.histogram(DB_POOL_WAIT_SECONDS)
+        self._timeouts = registry.counter(DB_POOL_TIMEOUTS)
+        self._counters = {'checkouts': 0, 'timeouts': 0, 'checked_out': 0, 'peak_checked_out': 0,
+                          'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+        registry.gauge(DB_POOL_CHECKED_OUT, lambda: self._counters['checked_out'])
+        registry.gauge(DB_POOL_IDLE, self.idle)
+        registry.gauge(DB_POOL_OVERFLOW, self.overflow)
+
+    def attach(self, pool, limit):
+        # Pools are recreated on dispose; the newest one is reported
+        self.pool = pool
+        self.limit = limit
+
+    def checked_out(self, seconds):
+        self._wait_seconds.observe(seconds)
+        with self._lock:
+            counters = self._counters
+            counters['checkouts'] += 1
+            counters['checked_out'] += 1
+            counters['peak_checked_out'] = max(counters['peak_checked_out'], counters['checked_out'])
+            counters['wait_seconds'] += seconds
+            counters['max_wait_seconds'] = max(counters['max_wait_seconds'], seconds)
+
+    def timed_out(self, seconds):
+        self._wait_seconds.observe(seconds)
+        self._timeouts.inc()
+        with self._lock:
+            self._counters['timeouts'] += 1
+
+    def checked_in(self):
+        with self._lock:
+            self._counters['checked_out'] -= 1
+
+    def idle(self):
+        pool = self.pool
+        return pool.checkedin() if isinstance(pool, QueuePool) else 0
+
+    def overflow(self):
+        pool = self.pool
+        # Negative while the pool has not yet opened pool_size connections
+        return max(0, pool.overflow()) if isinstance(pool, QueuePool) else 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['avg_wait_seconds'] = stats['wait_seconds'] / stats['checkouts'] if stats['checkouts'] else None
+        stats.update(pool=type(self.pool).__name__ if self.pool else None, limit=self.limit,
+                     idle=self.idle(), overflow=self.overflow())
+        return stats
+
+
+pool_monitor = PoolMonitor()
+
+
+class _TimedCheckout:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_monitor.timed_out(time.perf_counter() - start)
+            raise
+        pool_monitor.checked_out(time.perf_counter() - start)
+        return connection
+
+    def _do_return_conn(self, record):
+        pool_monitor.checked_in()
+        super()._do_return_conn(record)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        pool_monitor.attach(self, pool_size + max_overflow if max_overflow >= 0 else None)
+
+
+class TimedNullPool(_TimedCheckout, NullPool):
+    def __init__(self, creator, **kwargs):
+        super().__init__(creator, **kwargs)
+        pool_monitor.attach(self, None)
+
+
+def engine_profile(url):
+    profile = Config.DB_ENGINE_PROFILE
+    if profile != 'auto':
+        if profile not in PROFILES:
+            raise ValueError(f"DB_ENGINE_PROFILE must be auto or one of {', '.join(PROFILES)}, not {profile}")
+        return profile
+    if make_url(url).drivername.startswith('sqlite'):
+        return 'sqlite'
+    # Vercel sets VERCEL=1 in its functions
+    return 'serverless' if os.getenv('VERCEL') else 'pooled'
+
+
+def connect_args(url):
+    if url.drivername not in LIBPQ_DRIVERS:
+        return {}
+    return {
+        'connect_timeout': Config.DB_CONNECT_TIMEOUT,
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 5
+    }
+
+
+def pool_limits():
+    return {
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT
+    }
+
+
+def engine_options(url, profile=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``url`` under ``profile`` (default: DB_ENGINE_PROFILE)."""
+    if not url:
+        return {}
+    url = make_url(url)
+    profile = profile or engine_profile(url)
+    if profile == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return {}
+        return dict(pool_limits(), poolclass=TimedQueuePool,
+                    connect_args={'timeout': Config.DB_SQLITE_BUSY_TIMEOUT})
+    options = {'connect_args': connect_args(url)}
+    if profile == 'serverless':
+        options['poolclass'] = TimedNullPool
+        return options
+    options.update(pool_limits(), poolclass=TimedQueuePool, pool_pre_ping=True, pool_recycle=Config.DB_POOL_RECYCLE)
+    return options
@@ -0,0 +1,204 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import Config
+from link_cache import normalize_key
+import metrics
+
+# Shared across requests so lookups from concurrent requests reuse the same threads
+_executor = ThreadPoolExecutor(
+    max_workers=Config.ENRICHMENT_MAX_WORKERS,
+    thread_name_prefix='enrichment'
+)
+
+
+def split_title(title):
+    # Gemini returns "Song Title - Artist Name"
+    title_parts = title.split(' - ')
+    song_title = title_parts[0]
+    artist = title_parts[1] if len(title_parts) > 1 else ''
+    return song_title, artist
+
+
+def build_song_info(title, youtube_link, spotify_data):
+    return {
+        'title': title,
+        'youtubeLink': youtube_link or '',
+        'spotifyLink': spotify_data['spotifyLink'] if spotify_data else '',
+        'previewUrl': spotify_data.get('previewUrl', '') if spotify_data else ''
+    }
+
+
+def _time_lookup(future, provider):
+    # Lookups finish on worker threads, so report into the request's trace directly
+    if not metrics.tracing_enabled:
+        return future
+    trace = metrics.current_trace()
+    start = time.perf_counter()
+    future.add_done_callback(
+        lambda f: metrics.observe_stage(f"{provider}_lookup", time.perf_counter() - start, trace)
+    )
+    return future
+
+
+def _lookup_result(future, provider):
+    # Returns (resolved, value); failed or unfinished lookups are not resolved
+    if not future.done() or future.cancelled():
+        return False, None
+    error = future.exception()
+    if error is not None:
+        print(f"Error fetching {provider} link: {error!r}")
+        return False, None
+    return True, future.result()
+
+
+class PendingLinks:
+    """Link lookups for a group of songs, started as soon as it is created.
+
+    Cached results (including cached "not found" answers) skip the external
+    call. ``finish`` writes every lookup that completed back to the cache;
+    failed lookups are never cached. ``deadline`` (a ``time.monotonic()``
+    value) is passed to the Spotify lookup so its queued searches expire
+    with the request.
+    """
+
+    providers = ('youtube', 'spotify')
+
+    def __init__(self, songs, youtube_lookup, spotify_lookup, cache=None, deadline=None):
+        self.songs = songs
+        self.cache = cache
+        self.pairs = [split_title(song['title']) for song in songs]
+        lookups = {
+            'youtube': lambda song_title, artist: youtube_lookup(song_title),
+            'spotify': lambda song_title, artist: spotify_lookup(song_title, artist, deadline=deadline)
+        }
+        cached = {provider: {} for provider in self.providers}
+        if cache is not None:
+            for provider in self.providers:
+                cached[provider] = cache.get_many(provider, self.pairs)
+
+        # provider -> [(pending future, cached value)] in song order
+        self.work = {provider: [] for provider in self.providers}
+        for pair in self.pairs:
+            key = normalize_key(*pair)
+            for provider in self.providers:
+                if key in cached[provider]:
+                    self.work[provider].append((None, cached[provider][key]))
+                else:
+                    future = _executor.submit(lookups[provider], *pair)
+                    self.work[provider].append((_time_lookup(future, provider), None))
+
+    @property
+    def futures(self):
+        return [future for items in self.work.values() for future, _ in items if future is not None]
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def cancel(self):
+        for future in self.futures:
+            # Drop lookups that are still queued; running ones finish in the background
+            future.cancel()
+
+    def _value(self, provider, index):
+        future, value = self.work[provider][index]
+        if future is None:
+            return value
+        return _lookup_result(future, 'YouTube' if provider == 'youtube' else 'Spotify')[1]
+
+    def song_info(self, index):
+        return build_song_info(
+            self.songs[index]['title'],
+            self._value('youtube', index),
+            self._value('spotify', index)
+        )
+
+    def finish(self):
+        if self.cache is None:
+            return
+        for provider, items in self.work.items():
+            resolved = {}
+            for pair, (future, _) in zip(self.pairs, items):
+                if future is not None and future.done() and not future.cancelled() \
+                        and future.exception() is None:
+                    resolved[pair] = future.result()
+            self.cache.set_many(provider, resolved)
+
+
+def enrich_songs(songs, youtube_lookup, spotify_lookup, deadline=None, cache=None):
+    """Resolve YouTube and Spotify links for every song at the same time.
+
+    Each lookup is bounded by the timeout of its own HTTP client
+    (LINK_LOOKUP_TIMEOUT); the whole stage is bounded by ``deadline``
+    seconds. Lookups still running when the deadline passes leave their
+    song with empty links instead of holding up the response.
+    """
+    if deadline is None:
+        deadline = Config.ENRICHMENT_DEADLINE
+
+    pending = PendingLinks(songs, youtube_lookup, spotify_lookup, cache=cache,
+                           deadline=time.monotonic() + deadline)
+    if pending.futures:
+        wait(pending.futures, timeout=deadline)
+        pending.cancel()
+
+    songs_with_links = [pending.song_info(index) for index in range(len(songs))]
+    pending.finish()
+    return songs_with_links
+
+
+async def enrich_songs_async(songs, youtube_lookup, spotify_lookup, deadline=None, cache=None):
+    """Coroutine version of ``enrich_songs`` for the ASGI app.
+
+    The lookups are coroutine functions with the same signatures as the
+    sync ones. ``cache`` should not have a blocking store attached since
+    it is consulted on the event loop.
+    """
+    if deadline is None:
+        deadline = Config.ENRICHMENT_DEADLINE
+
+    pairs = [split_title(song['title']) for song in songs]
+    lookups = {
+        'youtube': lambda song_title, artist: youtube_lookup(song_title),
+        'spotify': spotify_lookup
+    }
+    cached = {provider: {} for provider in lookups}
+    if cache is not None:
+        for provider in lookups:
+            cached[provider] = cache.get_many(provider, pairs)
+
+    work = {provider: [] for provider in lookups}
+    for pair in pairs:
+        key = normalize_key(*pair)
+        for provider, lookup in lookups.items():
+            if key in cached[provider]:
+                work[provider].append((None, cached[provider][key]))
+            else:
+                task = asyncio.ensure_future(lookup(*pair))
+                work[provider].append((_time_lookup(task, provider), None))
+
+    tasks = [task for items in work.values() for task, _ in items if task is not None]
+    if tasks:
+        _, not_done = await asyncio.wait(tasks, timeout=deadline)
+        for task in not_done:
+            task.cancel()
+
+    values = {}
+    for provider, items in work.items():
+        label = 'YouTube' if provider == 'youtube' else 'Spotify'
+        values[provider] = []
+        resolved = {}
+        for pair, (task, value) in zip(pairs, items):
+            if task is not None:
+                ok, value = _lookup_result(task, label)
+                if ok:
+                    resolved[pair] = value
+            values[provider].append(value)
+        if cache is not None:
+            cache.set_many(provider, resolved)
+
+    return [
+        build_song_info(song['title'], youtube_link, spotify_data)
+        for song, youtube_link, spotify_data in zip(songs, values['youtube'], values['spotify'])
+    ]
@@ -0,0 +1,200 @@
+"""Streaming export of recommendation history for analytics.
+
+Rows come from one MoodRecord LEFT JOIN Song LEFT JOIN Track query run with a
+server-side cursor (``stream_results``) and fetched EXPORT_CHUNK_SIZE
+rows at a time. Each chunk is encoded and handed on before the next is
+read, so memory stays flat whatever the size of the tables.
+
+- ``ndjson``: one JSON object per mood record, with its songs nested.
+- ``parquet`` and ``arrow`` (Arrow IPC stream): one flat row per song,
+  with the record's columns repeated. A record without songs gets one row
+  with null song columns. Each chunk becomes one row group or record
+  batch. Both need the optional pyarrow package.
+"""
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from config import Config
+from models import MoodRecord, Song
+from tracks import spotify_link_column, tracks, youtube_link_column
+
+mood_records = MoodRecord.__table__
+songs_table = Song.__table__
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def parse_timestamp(value):
+    """Parse an ISO date or datetime filter; None passes through."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def export_query(user_id=None, since=None, until=None):
+    query = select(
+        mood_records.c.id.label('record_id'),
+        mood_records.c.user_id,
+        mood_records.c.mood,
+        mood_records.c.cuisine,
+        mood_records.c.explanation,
+        mood_records.c.created_at,
+        songs_table.c.id.label('song_id'),
+        tracks.c.title,
+        youtube_link_column(),
+        spotify_link_column(),
+    ).select_from(
+        mood_records.outerjoin(songs_table, songs_table.c.mood_record_id == mood_records.c.id)
+        .outerjoin(tracks, tracks.c.id == songs_table.c.track_id)
+    )
+    if since is not None:
+        query = query.where(mood_records.c.created_at >= since)
+    if until is not None:
+        query = query.where(mood_records.c.created_at < until)
+    if user_id is not None:
+        # Walks ix_mood_record_user_created in order instead of sorting
+        return query.where(mood_records.c.user_id == user_id).order_by(
+            mood_records.c.created_at, mood_records.c.id, songs_table.c.id
+        )
+    return query.order_by(mood_records.c.id, songs_table.c.id)
+
+
+def iter_chunks(engine, query, chunk_size=None):
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=chunk_size or Config.EXPORT_CHUNK_SIZE
+        ).execute(query)
+        yield from result.partitions()
+
+
+def _record(row):
+    return {
+        'id': row.record_id,
+        'user_id': row.user_id,
+        'mood': row.mood,
+        'cuisine': row.cuisine,
+        'explanation': row.explanation,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'songs': []
+    }
+
+
+def ndjson_stream(chunks):
+    current = None
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            # A record's songs are adjacent, but may straddle two chunks
+            if current is None or current['id'] != row.record_id:
+                if current is not None:
+                    lines.append(json.dumps(current))
+                current = _record(row)
+            if row.song_id is not None:
+                current['songs'].append({
+                    'id': row.song_id,
+                    'title': row.title,
+                    'youtube_link': row.youtube_link,
+                    'spotify_link': row.spotify_link
+                })
+        if lines:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+    if current is not None:
+        yield (json.dumps(current) + '\n').encode('utf-8')
+
+
+def arrow_module():
+    """Import pyarrow for the columnar formats; ValueError when it is not installed."""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError("Parquet and Arrow export need the pyarrow package")
+    return pyarrow
+
+
+def arrow_schema(pa):
+    return pa.schema([
+        ('record_id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('mood', pa.string()),
+        ('cuisine', pa.string()),
+        ('explanation', pa.string()),
+        ('created_at', pa.timestamp('us')),
+        ('song_id', pa.int64()),
+        ('title', pa.string()),
+        ('youtube_link', pa.string()),
+        ('spotify_link', pa.string()),
+    ])
+
+
+class _ChunkSink:
+    """Write-only file object that is drained after every chunk."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def columnar_stream(chunks, fmt):
+    pa = arrow_module()
+    schema = arrow_schema(pa)
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+
+        def write(batch):
+            writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    for rows in chunks:
+        columns = zip(*rows)
+        write(pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        ))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def export_history(engine, fmt='ndjson', user_id=None, since=None, until=None, chunk_size=None):
+    """Return a generator of encoded chunks; raises ValueError for bad arguments up front."""
+    if fmt not in MIMETYPES:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt != 'ndjson':
+        arrow_module()
+    chunks = iter_chunks(engine, export_query(user_id, since, until), chunk_size)
+    return ndjson_stream(chunks) if fmt == 'ndjson' else columnar_stream(chunks, fmt)
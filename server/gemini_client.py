@@ -0,0 +1,244 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+from config import Config
+from metrics import GEMINI_CALL_SECONDS, UPSTREAM_REQUESTS, count, registry
+
+load_dotenv()
+
+# HTTP statuses carried by google.api_core errors that are worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+
+def is_retryable(error):
+    if isinstance(error, TimeoutError):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_CODES
+
+
+class CircuitBreaker:
+    """Opens when the error rate over the last ``window`` calls spikes.
+
+    While open, calls fail fast for ``cooldown`` seconds; then a single
+    probe call is let through and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, window=None, min_calls=None, error_rate=None, cooldown=None):
+        self.min_calls = min_calls or Config.GEMINI_BREAKER_MIN_CALLS
+        self.error_rate = error_rate or Config.GEMINI_BREAKER_ERROR_RATE
+        self.cooldown = cooldown if cooldown is not None else Config.GEMINI_BREAKER_COOLDOWN
+        self.outcomes = deque(maxlen=window or Config.GEMINI_BREAKER_WINDOW)
+        self.state = 'closed'
+        self.opened_at = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self.state == 'half_open':
+                if success:
+                    self.state = 'closed'
+                    self.outcomes.clear()
+                else:
+                    self._open()
+                return
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if (self.state == 'closed' and len(self.outcomes) >= self.min_calls
+                    and failures / len(self.outcomes) >= self.error_rate):
+                self._open()
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+
+class ResilientModel:
+    """Wraps a GenerativeModel with deadlines, retries, hedging and a breaker.
+
+    Each attempt gets GEMINI_TIMEOUT seconds, and all attempts together get
+    GEMINI_DEADLINE seconds. Retryable failures (timeouts, 429 and 5xx) are
+    retried up to GEMINI_MAX_RETRIES times with full-jitter backoff. With
+    hedging on, a second identical request goes out if the first is still
+    running after the recent p95 latency, and the first to finish wins.
+    Latency is recorded per outcome.
+    """
+
+    OUTCOMES = ('success', 'hedge_won', 'retried_success', 'timeout', 'error', 'circuit_open')
+
+    def __init__(self, model, request_options=None, breaker=None, hedge=None):
+        self.model = model
+        self.request_options = request_options
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge if hedge is not None else Config.GEMINI_HEDGE_ENABLED
+        self.latencies = deque(maxlen=200)
+        self.histograms = {outcome: registry.histogram(GEMINI_CALL_SECONDS, outcome=outcome) for outcome in self.OUTCOMES}
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.GEMINI_MAX_CONCURRENCY, thread_name_prefix='gemini'
+        )
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _call(self, prompt, **kwargs):
+        if self.request_options:
+            kwargs['request_options'] = self.request_options
+        try:
+            response = self.model.generate_content(prompt, **kwargs)
+        except Exception as e:
+            count(UPSTREAM_REQUESTS, upstream='gemini', result=str(getattr(e, 'code', None) or 'error'))
+            raise
+        count(UPSTREAM_REQUESTS, upstream='gemini', result='ok')
+        return response
+
+    def hedge_delay(self):
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < 20:
+            return Config.GEMINI_HEDGE_MIN_DELAY * 2
+        p95 = samples[int(len(samples) * Config.GEMINI_HEDGE_PERCENTILE / 100) - 1]
+        return max(p95, Config.GEMINI_HEDGE_MIN_DELAY)
+
+    def _attempt(self, prompt, timeout):
+        """One attempt, possibly hedged; returns (response, hedge_won)."""
+        first = self._executor.submit(self._call, prompt)
+        futures = [first]
+        deadline = time.monotonic() + timeout
+        hedge_delay = self.hedge_delay() if self.hedge else None
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                futures.append(self._executor.submit(self._call, prompt))
+
+        error = None
+        while futures:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                try:
+                    return future.result(), future is not first
+                except Exception as e:
+                    error = e
+        for future in futures:
+            future.cancel()
+        if error is not None and not futures:
+            raise error
+        raise TimeoutError(f"Gemini call exceeded {timeout:.1f}s")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream or kwargs:
+            # Streams can't be hedged or retried mid-way; only the breaker applies
+            if not self.breaker.allow():
+                raise CircuitOpenError("Gemini circuit breaker is open")
+            try:
+                response = self._call(prompt, stream=stream, **kwargs)
+            except Exception:
+                self.breaker.record(False)
+                raise
+            self.breaker.record(True)
+            return response
+
+        start = time.monotonic()
+        if not self.breaker.allow():
+            self.histograms['circuit_open'].observe(0.0)
+            raise CircuitOpenError("Gemini circuit breaker is open")
+
+        deadline = start + Config.GEMINI_DEADLINE
+        for attempt in range(Config.GEMINI_MAX_RETRIES + 1):
+            attempt_start = time.monotonic()
+            timeout = min(Config.GEMINI_TIMEOUT, deadline - attempt_start)
+            try:
+                response, hedge_won = self._attempt(prompt, timeout)
+            except Exception as e:
+                self.breaker.record(False)
+                backoff = random.uniform(0, Config.GEMINI_RETRY_BACKOFF * 2 ** attempt)
+                if (attempt < Config.GEMINI_MAX_RETRIES and is_retryable(e)
+                        and time.monotonic() + backoff < deadline):
+                    time.sleep(backoff)
+                    continue
+                outcome = 'timeout' if isinstance(e, TimeoutError) else 'error'
+                self.histograms[outcome].observe(time.monotonic() - start)
+                raise
+
+            self.breaker.record(True)
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.latencies.append(time.monotonic() - attempt_start)
+            outcome = 'hedge_won' if hedge_won else 'retried_success' if attempt else 'success'
+            self.histograms[outcome].observe(elapsed)
+            return response
+
+    async def generate_content_async(self, prompt, **kwargs):
+        if not self.breaker.allow():
+            self.histograms['circuit_open'].observe(0.0)
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        if self.request_options:
+            kwargs['request_options'] = self.request_options
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(prompt, **kwargs), Config.GEMINI_TIMEOUT
+            )
+        except Exception as e:
+            self.breaker.record(False)
+            outcome = 'timeout' if isinstance(e, (TimeoutError, asyncio.TimeoutError)) else 'error'
+            self.histograms[outcome].observe(time.monotonic() - start)
+            raise
+        self.breaker.record(True)
+        self.histograms['success'].observe(time.monotonic() - start)
+        return response
+
+    def stats(self):
+        return {
+            'breaker': {'state': self.breaker.state, 'trips': self.breaker.trips},
+            'hedge_delay': self.hedge_delay() if self.hedge else None,
+            'latency': {outcome: histogram.snapshot() for outcome, histogram in self.histograms.items()}
+        }
+
+
+def setup_gemini():
+    # google.generativeai takes about a second to import, so only pay for it on first use
+    import google.generativeai as genai
+
+    GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+    if not GOOGLE_API_KEY:
+        raise ValueError("API key not found in environment variables.")
+    genai.configure(api_key=GOOGLE_API_KEY)
+    model = genai.GenerativeModel('gemini-1.5-pro')
+    return ResilientModel(model, request_options={'timeout': Config.GEMINI_TIMEOUT})
+
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                model = setup_gemini()
+    return model
@@ -0,0 +1,74 @@
+"""Keyset-paginated reads of a user's recommendation history.
+
+Pages are ordered newest first on (created_at, id) and continue from an
+opaque cursor holding the last row's sort key, so every page is one range
+scan of ix_mood_record_user_created no matter how deep it is, unlike
+OFFSET, which rescans every skipped row.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload
+
+from models import MoodRecord
+
+
+def encode_cursor(record):
+    key = [record.created_at.isoformat(), record.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor; raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def fetch_history_page(user_id, limit, cursor=None):
+    """Return (records, next_cursor) for one page of a user's history."""
+    query = MoodRecord.query.filter(MoodRecord.user_id == user_id)
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        query = query.filter(tuple_(MoodRecord.created_at, MoodRecord.id) < (created_at, record_id))
+
+    # One extra row tells us whether another page exists
+    records = (
+        query.options(selectinload(MoodRecord.songs))
+        .order_by(MoodRecord.created_at.desc(), MoodRecord.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = encode_cursor(records[limit - 1]) if len(records) > limit else None
+    return records[:limit], next_cursor
+
+
+def serialize_record(record, compact=False):
+    if compact:
+        # Titles only, no explanation: enough to render a history list
+        return {
+            'id': record.id,
+            'mood': record.mood,
+            'cuisine': record.cuisine,
+            'createdAt': record.created_at.isoformat(),
+            'songs': [song.title for song in record.songs]
+        }
+    return {
+        'id': record.id,
+        'mood': record.mood,
+        'cuisine': record.cuisine,
+        'explanation': record.explanation,
+        'createdAt': record.created_at.isoformat(),
+        'songs': [
+            {
+                'title': song.title,
+                'youtubeLink': song.youtube_link,
+                'spotifyLink': song.spotify_link
+            } for song in record.songs
+        ]
+    }
@@ -0,0 +1,183 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import Config
+from models import db, LinkCacheEntry
+
+
+def normalize_key(title, artist=''):
+    # "Blinding Lights (feat. X)" / "blinding lights" / "Blinding  Lights!" share one key
+    def clean(text):
+        text = re.sub(r'\s*[\(\[](feat|ft)\.?[^\)\]]*[\)\]]', '', (text or '').lower())
+        text = re.sub(r'[^\w\s]', ' ', text)
+        return ' '.join(text.split())
+    return f"{clean(title)}|{clean(artist)}"
+
+
+class DatabaseLinkStore:
+    """Second cache tier backed by the link_cache_entry table.
+
+    Reads run on the caller's thread. Writes are handed to a single
+    background thread, so a request never waits on the delete+insert.
+    """
+
+    def __init__(self):
+        # One thread keeps writes to the same key in the order they were made
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='link-cache-store')
+
+    def get_many(self, provider, keys):
+        now = datetime.utcnow()
+        table = LinkCacheEntry.__table__
+        query = select(table.c.cache_key, table.c.value, table.c.expires_at).where(
+            table.c.provider == provider,
+            table.c.cache_key.in_(keys),
+            table.c.expires_at > now
+        )
+        with db.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        return {
+            row.cache_key: (json.loads(row.value) if row.value is not None else None, row.expires_at)
+            for row in rows
+        }
+
+    def set_many(self, provider, entries):
+        """Queue a write of ``entries``; returns its Future."""
+        # db.engine needs the app context, which only the caller has
+        return self._writer.submit(self._write, db.engine, provider, entries)
+
+    def _write(self, engine, provider, entries):
+        table = LinkCacheEntry.__table__
+        rows = [
+            {
+                'provider': provider,
+                'cache_key': key,
+                'value': json.dumps(value) if value is not None else None,
+                'expires_at': expires_at
+            }
+            for key, (value, expires_at) in entries.items()
+        ]
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(
+                table.c.provider == provider,
+                table.c.cache_key.in_(list(entries))
+            ))
+            conn.execute(insert(table), rows)
+
+
+class LinkCache:
+    """Two-tier cache for resolved song links.
+
+    Entries are keyed on provider plus a normalized (title, artist) pair.
+    The first tier is an in-process LRU, the second an optional shared
+    store. A ``None`` value records that the provider found nothing and is
+    kept for the shorter negative TTL.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, negative_ttl=None, store=None):
+        self.max_entries = max_entries or Config.LINK_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else Config.LINK_CACHE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else Config.LINK_CACHE_NEGATIVE_TTL
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'store_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'store_errors': 0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _remember(self, entry_key, value, expires_at):
+        with self._lock:
+            self._entries[entry_key] = (value, expires_at)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def get_many(self, provider, pairs):
+        """Return {key: value} for every (title, artist) pair that is cached."""
+        keys = {normalize_key(title, artist) for title, artist in pairs}
+        found = {}
+        now = time.time()
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((provider, key))
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at <= now:
+                    del self._entries[(provider, key)]
+                    continue
+                self._entries.move_to_end((provider, key))
+                found[key] = value
+            self._counters['memory_hits'] += len(found)
+
+        missing = keys - found.keys()
+        if missing and self.store is not None:
+            try:
+                stored = self.store.get_many(provider, list(missing))
+            except SQLAlchemyError as e:
+                print(f"Error reading link cache: {e}")
+                self._count('store_errors')
+                stored = {}
+            for key, (value, expires_at) in stored.items():
+                self._remember((provider, key), value, expires_at.replace(tzinfo=timezone.utc).timestamp())
+                found[key] = value
+            self._count('store_hits', len(stored))
+
+        self._count('negative_hits', sum(1 for value in found.values() if value is None))
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def set_many(self, provider, results):
+        """Store {(title, artist): value} lookup results."""
+        if not results:
+            return
+        now = time.time()
+        entries = {}
+        for (title, artist), value in results.items():
+            ttl = self.ttl if value is not None else self.negative_ttl
+            entries[normalize_key(title, artist)] = (value, now + ttl)
+
+        for key, (value, expires_at) in entries.items():
+            self._remember((provider, key), value, expires_at)
+
+        if self.store is not None:
+            written = self.store.set_many(provider, {
+                key: (value, datetime.utcfromtimestamp(expires_at))
+                for key, (value, expires_at) in entries.items()
+            })
+            written.add_done_callback(self._store_written)
+
+    def _store_written(self, future):
+        error = future.exception()
+        if error is not None:
+            print(f"Error writing link cache: {error}")
+            self._count('store_errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['store_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+link_cache = LinkCache(store=DatabaseLinkStore() if Config.LINK_CACHE_DB_ENABLED else None)
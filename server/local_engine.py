@@ -0,0 +1,270 @@
+"""Local recommendations answered from stored history instead of Gemini.
+
+Past MoodRecords are grouped by normalized mood into documents, and an
+inverted TF-IDF index over mood words is kept in NumPy arrays. A request's
+mood is scored against every document with a few vectorized adds, and
+songs are ranked by how strongly the matching documents recommended
+them. Stored songs already carry their YouTube/Spotify links, so a local
+answer needs no network calls. When the best match is weak or has too
+little history behind it, ``recommend`` returns None and the caller falls
+back to Gemini.
+"""
+import math
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+from sqlalchemy import select
+
+from config import Config
+from models import MoodRecord, Song
+from moods import mood_terms
+from tracks import spotify_link_column, tracks, youtube_link_column
+
+mood_records = MoodRecord.__table__
+songs_table = Song.__table__
+
+
+def load_history(engine, max_records):
+    """Return the newest ``max_records`` records that have songs, newest first.
+
+    Songs are (title, youtube_link, spotify_link) tuples.
+    """
+    with engine.connect() as conn:
+        records = conn.execute(
+            select(mood_records.c.id, mood_records.c.mood, mood_records.c.cuisine, mood_records.c.explanation)
+            .order_by(mood_records.c.id.desc())
+            .limit(max_records)
+        ).all()
+        if not records:
+            return []
+        songs = conn.execute(
+            select(songs_table.c.mood_record_id, tracks.c.title, youtube_link_column(), spotify_link_column())
+            .join(tracks, tracks.c.id == songs_table.c.track_id)
+            .where(songs_table.c.mood_record_id >= records[-1].id)
+        ).all()
+
+    by_record = {}
+    for record_id, title, youtube_link, spotify_link in songs:
+        by_record.setdefault(record_id, []).append((title, youtube_link or '', spotify_link or ''))
+    return [
+        {
+            'mood': record.mood,
+            'cuisine': record.cuisine or '',
+            'explanation': record.explanation or '',
+            'songs': by_record[record.id]
+        } for record in records if by_record.get(record.id)
+    ]
+
+
+class LocalIndex:
+    """Immutable TF-IDF index over history records grouped by normalized mood."""
+
+    def __init__(self, records):
+        documents = {}
+        for record in records:
+            mood = ' '.join(mood_terms(record['mood']))
+            if not mood:
+                continue
+            doc = documents.setdefault(mood, {'records': 0, 'songs': Counter(), 'latest': None})
+            doc['records'] += 1
+            # Records arrive newest first; keep the newest cuisine/explanation pair
+            if doc['latest'] is None and record['cuisine']:
+                doc['latest'] = (record['cuisine'], record['explanation'])
+            doc['songs'].update(song[0] for song in record['songs'])
+
+        self.moods = list(documents)
+        self.record_counts = np.array([documents[m]['records'] for m in self.moods], dtype=np.int32)
+        self.latest = [documents[m]['latest'] for m in self.moods]
+
+        # Newest links seen for each title
+        self.songs = {}
+        for record in reversed(records):
+            for song in record['songs']:
+                self.songs[song[0]] = song
+        self.titles = list(self.songs)
+        title_ids = {title: i for i, title in enumerate(self.titles)}
+
+        # (document, song, count) incidence as parallel arrays
+        doc_idx, song_idx, counts = [], [], []
+        for d, mood in enumerate(self.moods):
+            for title, count in documents[mood]['songs'].items():
+                doc_idx.append(d)
+                song_idx.append(title_ids[title])
+                counts.append(count)
+        self.incidence_docs = np.array(doc_idx, dtype=np.int32)
+        self.incidence_songs = np.array(song_idx, dtype=np.int32)
+        self.incidence_counts = np.array(counts, dtype=np.float32)
+
+        # Inverted index: term -> (documents, L2-normalized tf-idf weights)
+        term_counts = [Counter(mood.split()) for mood in self.moods]
+        df = Counter(term for counts in term_counts for term in counts)
+        n = len(self.moods)
+        self.idf = {term: math.log((1 + n) / (1 + freq)) + 1 for term, freq in df.items()}
+        postings = {}
+        for d, counts in enumerate(term_counts):
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values()))
+            for term, weight in weights.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(d)
+                postings[term][1].append(weight / norm)
+        self.postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(weights, dtype=np.float32))
+            for term, (docs, weights) in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.moods)
+
+    def similarities(self, mood):
+        """Cosine similarity of ``mood`` to every document."""
+        scores = np.zeros(len(self.moods), dtype=np.float32)
+        counts = Counter(mood_terms(mood))
+        if not counts:
+            return scores
+        # Words never seen in history count as maximally rare, lowering the match
+        unseen_idf = math.log(1 + len(self.moods)) + 1
+        weights = {term: (1 + math.log(tf)) * self.idf.get(term, unseen_idf) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        for term, weight in weights.items():
+            if term in self.postings:
+                docs, doc_weights = self.postings[term]
+                scores[docs] += doc_weights * (weight / norm)
+        return scores
+
+    def recommend(self, mood, song_count, min_confidence, min_support, rng):
+        """Return (recommendations or None, confidence)."""
+        if not self.moods:
+            return None, 0.0
+        scores = self.similarities(mood)
+        best = int(scores.argmax())
+        confidence = float(scores[best])
+        matching = scores >= min_confidence
+        if confidence < min_confidence or int(self.record_counts[matching].sum()) < min_support:
+            return None, confidence
+
+        # Songs scored by the similarity-weighted number of times matching moods got them
+        doc_scores = np.where(matching, scores, 0)
+        song_scores = np.bincount(
+            self.incidence_songs,
+            weights=doc_scores[self.incidence_docs] * self.incidence_counts,
+            minlength=len(self.titles)
+        )
+        candidates = np.flatnonzero(song_scores)
+        if len(candidates) < song_count:
+            return None, confidence
+        # Sample from the strongest candidates so repeat moods don't always get the same list
+        candidates = candidates[np.argsort(song_scores[candidates])[::-1][:song_count * 4]]
+        weights = song_scores[candidates] / song_scores[candidates].sum()
+        picked = rng.choice(candidates, size=song_count, replace=False, p=weights)
+
+        cuisine, explanation = self.latest[best] or ('', '')
+        return {
+            'cuisine': cuisine,
+            'songs': [
+                dict(zip(('title', 'youtubeLink', 'spotifyLink'), self.songs[self.titles[i]]), previewUrl=None)
+                for i in picked
+            ],
+            'explanation': explanation
+        }, confidence
+
+
+class LocalRecommender:
+    """Serves local recommendations and tracks how often Gemini is still needed.
+
+    The index is built on first use and rebuilt in the background once it
+    is older than LOCAL_INDEX_REFRESH seconds; requests keep using the old
+    index until the new one is ready.
+    """
+
+    def __init__(self, get_engine, max_records=None, refresh=None, min_confidence=None,
+                 min_support=None, song_count=None):
+        self.get_engine = get_engine
+        self.max_records = max_records or Config.LOCAL_INDEX_MAX_RECORDS
+        self.refresh = refresh if refresh is not None else Config.LOCAL_INDEX_REFRESH
+        self.min_confidence = min_confidence if min_confidence is not None else Config.LOCAL_MIN_CONFIDENCE
+        self.min_support = min_support if min_support is not None else Config.LOCAL_MIN_SUPPORT
+        self.song_count = song_count or Config.LOCAL_SONG_COUNT
+        self.index = None
+        self.built_at = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        self.local_answers = 0
+        self.fallbacks = 0
+        self.build_seconds = 0.0
+        self.local_latency = deque(maxlen=1000)
+        self.fallback_latency = deque(maxlen=1000)
+
+    def build(self):
+        start = time.perf_counter()
+        index = LocalIndex(load_history(self.get_engine(), self.max_records))
+        with self._lock:
+            self.index = index
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - start
+        return index
+
+    def _rebuild_in_background(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Error rebuilding local recommendation index: {e!r}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _current_index(self):
+        if self.index is None:
+            with self._build_lock:
+                if self.index is None:
+                    return self.build()
+        with self._lock:
+            stale = time.monotonic() - self.built_at > self.refresh and not self._rebuilding
+            if stale:
+                self._rebuilding = True
+        if stale:
+            threading.Thread(target=self._rebuild_in_background, name='local-index', daemon=True).start()
+        return self.index
+
+    def recommend(self, mood, min_confidence=None, min_support=None):
+        """Return a recommendation from history, or None when Gemini is needed."""
+        start = time.perf_counter()
+        result, _ = self._current_index().recommend(
+            mood, self.song_count,
+            min_confidence if min_confidence is not None else self.min_confidence,
+            min_support if min_support is not None else self.min_support,
+            np.random.default_rng()
+        )
+        if result is not None:
+            with self._lock:
+                self.local_answers += 1
+                self.local_latency.append(time.perf_counter() - start)
+        return result
+
+    def record_fallback(self, seconds):
+        with self._lock:
+            self.fallbacks += 1
+            self.fallback_latency.append(seconds)
+
+    def stats(self):
+        def percentiles(samples):
+            if not samples:
+                return {'p50_ms': None, 'p99_ms': None}
+            values = np.array(samples) * 1000
+            return {'p50_ms': float(np.percentile(values, 50)), 'p99_ms': float(np.percentile(values, 99))}
+
+        with self._lock:
+            total = self.local_answers + self.fallbacks
+            return {
+                'documents': len(self.index) if self.index is not None else 0,
+                'build_seconds': self.build_seconds,
+                'local_answers': self.local_answers,
+                'fallbacks': self.fallbacks,
+                'fallback_rate': self.fallbacks / total if total else 0.0,
+                'local_latency': percentiles(self.local_latency),
+                'fallback_latency': percentiles(self.fallback_latency)
+            }
+
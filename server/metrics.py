@@ -0,0 +1,241 @@
+"""In-process metrics and per-request stage timing.
+
+``span(stage)`` times one stage of a request (prompt build, LLM call,
+parse, link lookups, DB flush/commit). Each duration goes into a
+Prometheus-style histogram and into the current request's trace, which
+can be returned as a ``Server-Timing`` header. ``count`` increments
+labelled counters such as upstream requests and quota units. Gauges
+such as database pool usage are read from callbacks at render time.
+``registry.render()`` produces the /metrics text.
+
+When TRACING_ENABLED is false, ``span`` returns a shared no-op context
+manager and ``count``/``observe_stage`` return immediately.
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+from config import Config
+
+# Upper bounds in seconds; the last bucket catches everything slower
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+STAGE_SECONDS = 'mood_harmony_stage_seconds'
+REQUEST_SECONDS = 'mood_harmony_request_seconds'
+UPSTREAM_REQUESTS = 'mood_harmony_upstream_requests_total'
+YOUTUBE_QUOTA_UNITS = 'mood_harmony_youtube_quota_units_total'
+GEMINI_CALL_SECONDS = 'mood_harmony_gemini_call_seconds'
+WARM_POOL_REQUESTS = 'mood_harmony_warm_pool_requests_total'
+WARM_POOL_REFILL_SECONDS = 'mood_harmony_warm_pool_refill_seconds'
+DB_POOL_WAIT_SECONDS = 'mood_harmony_db_pool_wait_seconds'
+DB_POOL_TIMEOUTS = 'mood_harmony_db_pool_timeouts_total'
+DB_POOL_CHECKED_OUT = 'mood_harmony_db_pool_checked_out'
+DB_POOL_IDLE = 'mood_harmony_db_pool_idle'
+DB_POOL_OVERFLOW = 'mood_harmony_db_pool_overflow'
+
+DESCRIPTIONS = {
+    STAGE_SECONDS: 'Time spent in one stage of handling a request.',
+    REQUEST_SECONDS: 'Time to produce a response, by endpoint and status.',
+    UPSTREAM_REQUESTS: 'Calls made to upstream APIs, by upstream and result.',
+    YOUTUBE_QUOTA_UNITS: 'YouTube Data API quota units spent (search costs 100).',
+    GEMINI_CALL_SECONDS: 'Gemini generate_content latency, by outcome.',
+    WARM_POOL_REQUESTS: 'Warm pool lookups, by hit or miss.',
+    WARM_POOL_REFILL_SECONDS: 'Time to generate and enrich one warm pool answer.',
+    DB_POOL_WAIT_SECONDS: 'Time to check a connection out of the database pool (connect time without a pool).',
+    DB_POOL_TIMEOUTS: 'Database pool checkouts that gave up after DB_POOL_TIMEOUT.',
+    DB_POOL_CHECKED_OUT: 'Database connections currently checked out.',
+    DB_POOL_IDLE: 'Open database connections waiting in the pool.',
+    DB_POOL_OVERFLOW: 'Connections open beyond DB_POOL_SIZE.',
+}
+
+tracing_enabled = Config.TRACING_ENABLED
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, safe to update from any thread."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"le_{bound}" for bound in self.buckets] + ['le_inf']
+            return {
+                'count': self.count,
+                'sum': self.total,
+                'buckets': dict(zip(labels, self.counts))
+            }
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Registry:
+    """Named, labelled histograms, counters and gauges, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def gauge(self, name, read, **labels):
+        """Report ``read()`` as the gauge's value at every render."""
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = read
+
+    def render(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in histograms:
+            header(name, 'histogram')
+            with histogram._lock:
+                counts, total, count = list(histogram.counts), histogram.total, histogram.count
+            cumulative = 0
+            for bound, bucket_count in zip(list(histogram.buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+
+        for (name, labels), counter in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_label_text(labels)} {counter.value}")
+
+        for (name, labels), read in gauges:
+            header(name, 'gauge')
+            lines.append(f"{name}{_label_text(labels)} {read()}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Trace:
+    """Stage timings collected for one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage, seconds):
+        # list.append is atomic, so lookup threads can report into the trace directly
+        self.spans.append((stage, seconds))
+
+    def server_timing(self):
+        totals = {}
+        for stage, seconds in self.spans:
+            total, calls = totals.get(stage, (0.0, 0))
+            totals[stage] = (total + seconds, calls + 1)
+        entries = [
+            f'{stage};dur={total * 1000:.1f}' + (f';desc="{calls} calls"' if calls > 1 else '')
+            for stage, (total, calls) in totals.items()
+        ]
+        entries.append(f'total;dur={(time.perf_counter() - self.start) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+def start_trace():
+    """Begin a trace for the current request; returns (trace, token for end_trace)."""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def observe_stage(stage, seconds, trace=None):
+    if not tracing_enabled:
+        return
+    registry.histogram(STAGE_SECONDS, stage=stage).observe(seconds)
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.stage, time.perf_counter() - self.start, _current_trace.get())
+        return False
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def span(stage):
+    return _Span(stage) if tracing_enabled else _NOOP
+
+
+def count(name, amount=1, **labels):
+    if tracing_enabled:
+        registry.counter(name, **labels).inc(amount)
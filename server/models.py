@@ -1,9 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from datetime import datetime
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -21,9 +19,71 @@ class MoodRecord(db.Model):
     
     songs = db.relationship('Song', backref='mood_record', lazy=True)
 
+    # Backs keyset pagination of a user's history, newest first
+    __table_args__ = (db.Index('ix_mood_record_user_created', 'user_id', 'created_at', 'id'),)
+
+# Track links are rebuilt from these and the stored provider ids
+YOUTUBE_WATCH_URL = 'https://www.youtube.com/watch?v='
+SPOTIFY_TRACK_URL = 'https://open.spotify.com/track/'
+
+class Track(db.Model):
+    # One row per resolved track; links are stored as provider ids, '' when not found. See tracks.py
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    youtube_id = db.Column(db.String(20), nullable=False, default='')
+    spotify_id = db.Column(db.String(30), nullable=False, default='')
+
+    __table_args__ = (db.UniqueConstraint('title', 'youtube_id', 'spotify_id'),)
+
+    @property
+    def youtube_link(self):
+        return YOUTUBE_WATCH_URL + self.youtube_id if self.youtube_id else ''
+
+    @property
+    def spotify_link(self):
+        return SPOTIFY_TRACK_URL + self.spotify_id if self.spotify_id else ''
+
 class Song(db.Model):
+    # A track as recommended in one mood record
     id = db.Column(db.Integer, primary_key=True)
-    mood_record_id = db.Column(db.Integer, db.ForeignKey('mood_record.id'), nullable=False)
-    title = db.Column(db.String(200))
-    youtube_link = db.Column(db.String(300))
-    spotify_link = db.Column(db.String(300))
\ No newline at end of file
+    mood_record_id = db.Column(db.Integer, db.ForeignKey('mood_record.id'), nullable=False, index=True)
+    track_id = db.Column(db.Integer, db.ForeignKey('track.id'), nullable=False)
+
+    track = db.relationship('Track', lazy='joined')
+
+    @property
+    def title(self):
+        return self.track.title
+
+    @property
+    def youtube_link(self):
+        return self.track.youtube_link
+
+    @property
+    def spotify_link(self):
+        return self.track.spotify_link
+
+class MoodRollup(db.Model):
+    # Incrementally maintained counts per user; see rollups.py
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)
+    bucket = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'dimension', 'bucket'),)
+
+class TokenRevocation(db.Model):
+    # Session tokens carrying an older generation than this are rejected; see auth.py
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+class LinkCacheEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(20), nullable=False)
+    cache_key = db.Column(db.String(400), nullable=False)
+    # JSON-encoded lookup result, NULL when the provider found nothing
+    value = db.Column(db.Text)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('provider', 'cache_key'),)
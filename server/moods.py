@@ -0,0 +1,164 @@
+"""Canonical moods for free-text mood input.
+
+"happy", "Happy!", "feeling happy" and "joyful" should all reach the
+recommendation cache and the analytics rollups as the same mood.
+``canonical_mood`` lowercases and strips the input, drops filler words,
+and maps what remains onto the fixed CANONICAL_MOODS vocabulary. Known
+synonyms match exactly, and misspellings match through a character
+trigram index. Input that matches nothing, or that is negated ("not
+happy"), keeps its normalized words as the key.
+"""
+import re
+from functools import lru_cache
+
+from config import Config
+
+CANONICAL_MOODS = {
+    'happy': 'happy joyful joy glad cheerful content delighted elated ecstatic upbeat good great happiness',
+    'sad': 'sad down unhappy blue depressed miserable heartbroken gloomy melancholy melancholic sorrow upset crying',
+    'angry': 'angry mad furious annoyed irritated frustrated pissed rage grumpy',
+    'anxious': 'anxious nervous worried uneasy scared afraid fearful panicky jittery tense',
+    'stressed': 'stressed overwhelmed pressured swamped frazzled burnt_out burned_out',
+    'tired': 'tired sleepy exhausted drained fatigued weary drowsy sluggish',
+    'calm': 'calm calm_down relaxed peaceful chill serene tranquil mellow zen',
+    'excited': 'excited thrilled hyped pumped eager stoked',
+    'energetic': 'energetic energized motivated active lively productive hyper',
+    'bored': 'bored boring meh restless dull',
+    'lonely': 'lonely alone isolated lonesome homesick',
+    'romantic': 'romantic in_love loving love affectionate flirty',
+    'nostalgic': 'nostalgic nostalgia sentimental wistful reminiscent',
+    'hopeful': 'hopeful optimistic inspired positive',
+    'grateful': 'grateful thankful blessed appreciative',
+    'confident': 'confident proud powerful strong empowered',
+    'confused': 'confused lost uncertain unsure conflicted',
+    'sick': 'sick ill unwell feverish hungover',
+    'focused': 'focused studying concentrating working determined',
+    'celebratory': 'celebratory celebrating festive partying party',
+}
+
+# Filler that carries no mood; dropped so "feeling so tired today" matches "tired"
+MOOD_STOPWORDS = frozenset('''
+    a about am an and are at bit but for feel feeling feels i im just kind kinda little me my
+    now of pretty quite really right rn so somewhat the this today very
+'''.split())
+
+NEGATIONS = frozenset('not no never dont cant isnt arent wasnt nothing'.split())
+
+# Moods kept per key, so "happy but tired" stays distinct from "happy"
+MAX_MOODS_PER_KEY = 2
+
+
+def normalize_mood(mood):
+    # Apostrophes are dropped rather than split on, keeping "don't" as one word
+    text = re.sub(r"['\u2019]", '', (mood or '').lower())
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def mood_terms(mood):
+    return [term for term in normalize_mood(mood).split() if term not in MOOD_STOPWORDS]
+
+
+def _trigrams(word):
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MoodCanonicalizer:
+    """Map mood text onto a bounded set of canonical moods."""
+
+    def __init__(self, moods=None, threshold=None):
+        moods = moods or CANONICAL_MOODS
+        self.threshold = threshold if threshold is not None else Config.MOOD_MATCH_THRESHOLD
+        self.moods = set(moods)
+        self.synonyms = {}
+        for canonical, synonyms in moods.items():
+            self.synonyms[canonical] = canonical
+            for synonym in synonyms.split():
+                self.synonyms[synonym.replace('_', ' ')] = canonical
+
+        # Inverted trigram index over single-word synonyms for fuzzy matches
+        self.words = [word for word in self.synonyms if ' ' not in word]
+        self.word_trigrams = [_trigrams(word) for word in self.words]
+        self.index = {}
+        for i, trigrams in enumerate(self.word_trigrams):
+            for trigram in trigrams:
+                self.index.setdefault(trigram, []).append(i)
+
+    def fuzzy_match(self, word):
+        """Return the canonical mood of the closest synonym, or None."""
+        if len(word) < 4:
+            return None
+        trigrams = _trigrams(word)
+        overlap = {}
+        for trigram in trigrams:
+            for i in self.index.get(trigram, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+        best, best_score = None, self.threshold
+        for i, shared in overlap.items():
+            # Dice coefficient of the two trigram sets
+            score = 2 * shared / (len(trigrams) + len(self.word_trigrams[i]))
+            if score >= best_score:
+                best, best_score = i, score
+        return self.synonyms[self.words[best]] if best is not None else None
+
+    def match(self, terms):
+        """Return (canonical moods in order, whether every term matched a synonym exactly)."""
+        found = []
+        exact = True
+        skip = False
+        for i, term in enumerate(terms):
+            if skip:
+                skip = False
+                continue
+            pair = ' '.join(terms[i:i + 2])
+            if pair in self.synonyms:
+                canonical, skip = self.synonyms[pair], True
+            elif term in self.synonyms:
+                canonical = self.synonyms[term]
+            else:
+                canonical, exact = self.fuzzy_match(term), False
+            if canonical and canonical not in found:
+                found.append(canonical)
+        return found, exact
+
+    def canonicalize(self, mood):
+        terms = mood_terms(mood)
+        if not terms or NEGATIONS.intersection(terms):
+            return ' '.join(terms)
+        found, _ = self.match(terms)
+        if not found:
+            return ' '.join(terms)
+        return ' and '.join(sorted(found[:MAX_MOODS_PER_KEY]))
+
+    def exact_canonicalize(self, mood):
+        """The canonical key only when it loses nothing of ``mood``, else None."""
+        terms = mood_terms(mood)
+        if not terms or NEGATIONS.intersection(terms):
+            return None
+        found, exact = self.match(terms)
+        if not found or not exact or len(found) > MAX_MOODS_PER_KEY:
+            return None
+        return ' and '.join(sorted(found))
+
+    def is_canonical(self, key):
+        return all(part in self.moods for part in key.split(' and '))
+
+
+canonicalizer = MoodCanonicalizer()
+
+
+@lru_cache(maxsize=Config.MOOD_CACHE_SIZE)
+def canonical_mood(mood):
+    """Cache/analytics key for ``mood``: canonical mood(s), or its normalized words."""
+    return canonicalizer.canonicalize(mood)
+
+
+def prompt_mood(mood):
+    """Mood text to put in the prompt.
+
+    Only input made entirely of known synonyms ("joyful", "feeling so
+    tired") is replaced by its canonical key, so requests sharing an answer
+    share a prompt. Anything fuzzy-matched or truncated keeps the user's
+    own words.
+    """
+    return canonicalizer.exact_canonicalize(mood) or normalize_mood(mood)
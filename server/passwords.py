@@ -0,0 +1,98 @@
+"""Password hashing off the request threads.
+
+Hashes are bcrypt with BCRYPT_ROUNDS or, with PASSWORD_SCHEME=scrypt,
+memory-hard scrypt from hashlib with SCRYPT_N/R/P. Both release the GIL
+while hashing, so the work runs on a dedicated pool of
+PASSWORD_HASH_WORKERS threads. A login storm queues there and uses at
+most that many cores, leaving the rest for recommendation traffic. With
+0 workers, hashing runs on the request thread. ``verify`` also reports
+when a stored hash was made with other settings than the current ones,
+so login can upgrade it.
+"""
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config import Config
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+# bcrypt only ever used the first 72 bytes; bcrypt>=5 raises instead of truncating
+BCRYPT_MAX_BYTES = 72
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode('ascii')
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode('utf-8'), salt=salt, n=n, r=r, p=p, dklen=SCRYPT_KEY_BYTES,
+        maxmem=129 * r * (n + p) + (1 << 20)
+    )
+
+
+def default_params(scheme):
+    if scheme == 'scrypt':
+        return (Config.SCRYPT_N, Config.SCRYPT_R, Config.SCRYPT_P)
+    return (Config.BCRYPT_ROUNDS,)
+
+
+def hash_password(password, scheme, params):
+    if scheme == 'scrypt':
+        n, r, p = params
+        salt = os.urandom(SCRYPT_SALT_BYTES)
+        digest = _scrypt(password, salt, n, r, p)
+        return f"scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+    return bcrypt.hashpw(
+        password.encode('utf-8')[:BCRYPT_MAX_BYTES], bcrypt.gensalt(params[0])
+    ).decode('ascii')
+
+
+def check_password(stored, password):
+    try:
+        if stored.startswith('scrypt$'):
+            _, n, r, p, salt, digest = stored.split('$')
+            candidate = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+            return hmac.compare_digest(candidate, base64.b64decode(digest))
+        if stored.startswith(BCRYPT_PREFIXES):
+            return bcrypt.checkpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], stored.encode('ascii'))
+    except ValueError:
+        pass
+    return False
+
+
+def needs_rehash(stored, scheme, params):
+    if scheme == 'scrypt':
+        n, r, p = params
+        return not stored.startswith(f"scrypt${n}${r}${p}$")
+    return not stored.startswith(BCRYPT_PREFIXES) or stored[4:6] != f"{params[0]:02d}"
+
+
+class PasswordHasher:
+    def __init__(self, workers=None, scheme=None, params=None):
+        workers = Config.PASSWORD_HASH_WORKERS if workers is None else workers
+        self.scheme = scheme or Config.PASSWORD_SCHEME
+        self.params = tuple(params or default_params(self.scheme))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash') if workers else None
+
+    def _run(self, function, *args):
+        if self._pool is None:
+            return function(*args)
+        return self._pool.submit(function, *args).result()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.scheme, self.params)
+
+    def verify(self, stored, password):
+        """Return (matches, needs_rehash) for a stored hash."""
+        matches = self._run(check_password, stored, password)
+        return matches, matches and needs_rehash(stored, self.scheme, self.params)
+
+
+password_hasher = PasswordHasher()
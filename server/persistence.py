@@ -0,0 +1,210 @@
+"""Write-behind persistence for recommendation history.
+
+``HistoryWriter`` takes MoodRecord/Song writes off the request path: routes
+enqueue the rows and return, and a background thread drains the queue in
+batches, inserting every MoodRecord of a batch with one multi-row INSERT
+... RETURNING and then all of their songs with one more. The queue is
+bounded; when it is full the write happens synchronously on the caller's
+thread instead of being dropped.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from config import Config
+from metrics import observe_stage
+from models import MoodRecord, Song
+from rollups import apply_rollups, rollup_buckets, rollup_rows
+from tracks import resolve_tracks, song_identities
+
+mood_records = MoodRecord.__table__
+songs_table = Song.__table__
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def history_rows(user_id, mood, recommendations, hour=None):
+    """Return (mood_record row, track identities, rollup buckets) for one recommendation."""
+    record = {
+        'user_id': user_id,
+        'mood': mood,
+        'cuisine': recommendations.get('cuisine', ''),
+        'explanation': recommendations.get('explanation', ''),
+        # Stamped at enqueue time so history order matches request order
+        'created_at': datetime.utcnow()
+    }
+    return record, song_identities(recommendations.get('songs', [])), rollup_buckets(mood, hour, record['created_at'])
+
+
+def insert_history(conn, items):
+    """Insert [(record, songs, buckets), ...] on ``conn``; returns the new record ids.
+
+    The users' mood rollups are updated in the same transaction.
+    """
+    if not items:
+        return []
+    result = conn.execute(
+        insert(mood_records).returning(mood_records.c.id, sort_by_parameter_order=True),
+        [record for record, _, _ in items]
+    )
+    ids = result.scalars().all()
+    # Tracks for the whole batch are resolved together
+    track_ids = iter(resolve_tracks(conn, [identity for _, songs, _ in items for identity in songs]))
+    song_rows = [
+        {'mood_record_id': record_id, 'track_id': next(track_ids)}
+        for record_id, (_, songs, _) in zip(ids, items)
+        for _ in songs
+    ]
+    if song_rows:
+        conn.execute(insert(songs_table), song_rows)
+    apply_rollups(conn, rollup_rows((record['user_id'], buckets) for record, _, buckets in items))
+    return ids
+
+
+class HistoryWriter:
+    """Bounded queue plus one background thread that batches history inserts.
+
+    ``get_engine`` is called on the writer thread and must return the
+    SQLAlchemy engine to write through.
+    """
+
+    def __init__(self, get_engine, max_queue=None, batch_size=None, batch_window=None):
+        self.get_engine = get_engine
+        self.batch_size = batch_size or Config.HISTORY_BATCH_SIZE
+        self.batch_window = batch_window if batch_window is not None else Config.HISTORY_BATCH_WINDOW
+        self._queue = queue.Queue(maxsize=max_queue or Config.HISTORY_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.written = 0
+        self.failed = 0
+        self.overflowed = 0
+        self.batches = 0
+
+    def submit(self, user_id, mood, recommendations, hour=None):
+        self.submit_many([(user_id, mood, recommendations, hour)])
+
+    def submit_many(self, entries):
+        """Queue [(user_id, mood, recommendations, hour), ...] to be written in one transaction."""
+        group = [history_rows(*entry) for entry in entries]
+        self._ensure_started()
+        try:
+            if self._closed:
+                raise queue.Full
+            self._queue.put_nowait(group)
+        except queue.Full:
+            # Backpressure: write on the caller's thread rather than lose the rows
+            with self._lock:
+                self.overflowed += 1
+            self._write([group])
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        # Queue items are groups of rows that must be written together
+        while True:
+            group = self._queue.get()
+            if group is _STOP:
+                return
+            batch = [group]
+            rows = len(group)
+            # Let rows from concurrent requests join this batch
+            deadline = time.monotonic() + self.batch_window
+            stop = False
+            while rows < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    group = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if group is _STOP:
+                    stop = True
+                    break
+                batch.append(group)
+                rows += len(group)
+            try:
+                self._write(batch)
+            except Exception:
+                # The writer must outlive any one batch, or every later write is lost
+                logger.exception("History writer failed on a batch; dropping it")
+                with self._lock:
+                    self.failed += rows
+            if stop:
+                return
+
+    def _write(self, batch):
+        """Insert a list of groups in one transaction."""
+        start = time.perf_counter()
+        items = [item for group in batch for item in group]
+        try:
+            with self.get_engine().begin() as conn:
+                insert_history(conn, items)
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Error saving recommendation history")
+                with self._lock:
+                    self.failed += len(items)
+                return
+            # Retry one group at a time so a single bad row doesn't sink the others
+            for group in batch:
+                self._write([group])
+            return
+        observe_stage('history_batch_write', time.perf_counter() - start)
+        with self._lock:
+            self.written += len(items)
+            self.batches += 1
+
+    def flush(self, timeout=None):
+        """Stop accepting queued writes and wait for the writer to drain."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout if timeout is not None else Config.HISTORY_SHUTDOWN_TIMEOUT)
+        if thread.is_alive():
+            print(f"History writer still busy at shutdown; {self._queue.qsize()} writes pending")
+            return
+        # Rows enqueued while the writer was stopping
+        leftover = []
+        while True:
+            try:
+                group = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if group is not _STOP:
+                leftover.append(group)
+        if leftover:
+            self._write(leftover)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'written': self.written,
+                'failed': self.failed,
+                'overflowed': self.overflowed,
+                'batches': self.batches
+            }
+
+
+def create_history_writer(get_engine):
+    """Return a HistoryWriter flushed at exit, or None in strict sync mode."""
+    if not Config.HISTORY_WRITE_BEHIND:
+        return None
+    writer = HistoryWriter(get_engine)
+    atexit.register(writer.flush)
+    return writer
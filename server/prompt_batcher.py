@@ -0,0 +1,125 @@
+"""Batch Gemini prompts across concurrent requests.
+
+During a spike every request used to make its own ``generate_content``
+call, so the LLM quota and concurrency limits set the throughput.
+``PromptBatcher`` holds requests for up to GEMINI_BATCH_WINDOW seconds,
+merges requests with the same (canonical mood, time of day), and asks for
+up to GEMINI_BATCH_SIZE of them in one prompt that returns a JSON object
+keyed per request. Entries missing from the response, or a failed batch
+call, are retried as ordinary single prompts when GEMINI_BATCH_FALLBACK
+is on.
+"""
+import copy
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import Config
+from moods import canonical_mood, prompt_mood
+from prompts import create_batch_prompt, create_prompt, get_time_of_day
+from response_parser import parse_batch_recommendations, parse_recommendations
+
+
+class PromptBatcher:
+    def __init__(self, batch_size=None, window=None, fallback_single=None, workers=None):
+        self.batch_size = batch_size or Config.GEMINI_BATCH_SIZE
+        self.window = window if window is not None else Config.GEMINI_BATCH_WINDOW
+        self.fallback_single = fallback_single if fallback_single is not None else Config.GEMINI_BATCH_FALLBACK
+        self._pending = {}
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._workers = ThreadPoolExecutor(
+            max_workers=workers or Config.GEMINI_BATCH_WORKERS,
+            thread_name_prefix='gemini-batch'
+        )
+        self._dispatcher = None
+        self._counters = {'requests': 0, 'merged': 0, 'batches': 0, 'batched_requests': 0,
+                          'single_prompts': 0, 'fallbacks': 0}
+
+    def generate(self, model, mood, hour):
+        """Return parsed recommendations for one request, sharing a prompt where possible."""
+        key = (canonical_mood(mood), get_time_of_day(hour))
+        with self._lock:
+            self._counters['requests'] += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+                self._queue.append((key, model, mood, hour, future))
+                self._ensure_dispatcher()
+                self._wakeup.notify()
+            else:
+                self._counters['merged'] += 1
+        # Merged requests share a result; each caller gets its own copy to enrich
+        return copy.deepcopy(future.result())
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, name='gemini-batch-dispatch', daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._wakeup.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch = self._queue[:self.batch_size]
+                del self._queue[:self.batch_size]
+                # Later requests for these keys start a new batch rather than join a sent one
+                for key, *_ in batch:
+                    self._pending.pop(key, None)
+
+            if len(batch) == 1:
+                self._workers.submit(self._run_single, *batch[0][1:])
+            else:
+                self._workers.submit(self._run_batch, batch)
+
+    def _run_single(self, model, mood, hour, future):
+        with self._lock:
+            self._counters['single_prompts'] += 1
+        try:
+            response = model.generate_content(create_prompt(prompt_mood(mood), hour))
+            future.set_result(parse_recommendations(response.text))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run_batch(self, batch):
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['batched_requests'] += len(batch)
+        ids = [f"r{i + 1}" for i in range(len(batch))]
+        model = batch[0][1]
+        try:
+            response = model.generate_content(create_batch_prompt([
+                (request_id, prompt_mood(mood), hour)
+                for request_id, (_, _, mood, hour, _) in zip(ids, batch)
+            ]))
+            results = parse_batch_recommendations(response.text, ids)
+        except Exception as e:
+            results = {request_id: e for request_id in ids}
+
+        for request_id, (_, model, mood, hour, future) in zip(ids, batch):
+            result = results[request_id]
+            if not isinstance(result, Exception):
+                future.set_result(result)
+            elif self.fallback_single:
+                with self._lock:
+                    self._counters['fallbacks'] += 1
+                self._workers.submit(self._run_single, model, mood, hour, future)
+            else:
+                future.set_exception(result)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+def create_prompt_batcher():
+    """Return a PromptBatcher when GEMINI_BATCH_ENABLED, else None."""
+    return PromptBatcher() if Config.GEMINI_BATCH_ENABLED else None
@@ -0,0 +1,61 @@
+def get_time_of_day(hour):
+    hour = int(hour)
+    if 5 <= hour < 12:
+        return "morning"
+    elif 12 <= hour < 17:
+        return "afternoon"
+    elif 17 <= hour < 22:
+        return "evening"
+    else:
+        return "night"
+
+def create_prompt(mood, hour):
+    time_of_day = get_time_of_day(hour)
+    return f"""As an expert in viral songs, provide personalized recommendations for someone feeling {mood} during the {time_of_day} (current hour: {hour}:00).
+Please suggest:
+1. A specific type of cuisine or dish that complements their emotional state.
+2. 5 specific songs with their full titles including artist names that match the mood.
+3. A brief explanation in about 150 to 200 characters of why these recommendations are beneficial.
+
+Format the response as a JSON object with the following structure:
+{{
+  "cuisine": "Recommended cuisine or dish",
+  "songs": [
+    {{"title": "Song Title 1 - Artist Name"}},
+    {{"title": "Song Title 2 - Artist Name"}},
+    {{"title": "Song Title 3 - Artist Name"}},
+    {{"title": "Song Title 4 - Artist Name"}},
+    {{"title": "Song Title 5 - Artist Name"}}
+  ],
+  "explanation": "Brief explanation of why these recommendations are beneficial"
+}}"""
+
+
+def create_batch_prompt(requests):
+    """One prompt covering several requests, given as [(key, mood, hour), ...]."""
+    people = "\n".join(
+        f"- {key}: feeling {mood} during the {get_time_of_day(hour)} (current hour: {hour}:00)"
+        for key, mood, hour in requests
+    )
+    return f"""As an expert in viral songs, provide personalized recommendations for each of the following people:
+{people}
+
+For each person, suggest:
+1. A specific type of cuisine or dish that complements their emotional state.
+2. 5 specific songs with their full titles including artist names that match the mood.
+3. A brief explanation in about 150 to 200 characters of why these recommendations are beneficial.
+
+Format the response as a single JSON object with one entry per person, keyed by the id before the colon:
+{{
+  "{requests[0][0]}": {{
+    "cuisine": "Recommended cuisine or dish",
+    "songs": [
+      {{"title": "Song Title 1 - Artist Name"}},
+      {{"title": "Song Title 2 - Artist Name"}},
+      {{"title": "Song Title 3 - Artist Name"}},
+      {{"title": "Song Title 4 - Artist Name"}},
+      {{"title": "Song Title 5 - Artist Name"}}
+    ],
+    "explanation": "Brief explanation of why these recommendations are beneficial"
+  }}
+}}"""
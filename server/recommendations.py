@@ -5,11 +5,15 @@ from datetime import datetime
 import requests
 from spotify_utils import get_spotify_link
 from youtube_utils import get_youtube_link
+from enrichment import enrich_songs
+from link_cache import LinkCache
+from response_parser import parse_recommendations
 from dotenv import load_dotenv
-import json
-import re
 load_dotenv()
 
+# Memory-only: this module runs without a Flask app context, so no database tier
+link_cache = LinkCache()
+
 def setup_gemini():
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
     if not GOOGLE_API_KEY:
@@ -60,32 +64,14 @@ def get_recommendations(model, mood, hour):
     try:
         content = response.result.candidates[0].content.parts[0].text
         
-        # Remove the code block markdown and extract the JSON
-        content_cleaned = re.sub(r'```json\n|\n```', '', content).strip()
-        
-        print(f"Cleaned response: {content_cleaned}")
-        
-        # Parse the cleaned content as JSON
-        recommendations = json.loads(content_cleaned)
+        # Extract the JSON object, tolerating fences, prose and truncation
+        recommendations = parse_recommendations(content)
         print(f"Recommendations: {recommendations}")
         
         # Add YouTube and Spotify links to songs
-        songs_with_links = []
-        for song in recommendations['songs']:
-            title_parts = song['title'].split(' - ')
-            song_title = title_parts[0]
-            artist = title_parts[1] if len(title_parts) > 1 else ''
-            
-            youtube_link = get_youtube_link(song_title)
-            spotify_data = get_spotify_link(song_title, artist)
-            
-            song_info = {
-                'title': song['title'],
-                'youtubeLink': youtube_link or '',
-                'spotifyLink': spotify_data['spotifyLink'] if spotify_data else '',
-                'previewUrl': spotify_data.get('previewUrl', '')
-            }
-            songs_with_links.append(song_info)
+        songs_with_links = enrich_songs(
+            recommendations['songs'], get_youtube_link, get_spotify_link, cache=link_cache
+        )
         
         recommendations['songs'] = songs_with_links
         return recommendations
@@ -0,0 +1,127 @@
+import copy
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from moods import canonical_mood
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run ``fn`` once per key; returns (result, shared).
+
+        Callers that arrive while a call for ``key`` is in flight wait for it
+        and receive the same result (or exception) with ``shared=True``.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            call['done'].wait()
+        else:
+            try:
+                call['result'] = fn()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+
+        if call['error'] is not None:
+            raise call['error']
+        return call['result'], not leader
+
+
+class RecommendationCache:
+    """Cache of generated recommendations keyed on (canonical mood, time of day).
+
+    Each key holds up to ``variants`` distinct results so repeat visitors
+    still see different answers: until a key is full every request
+    generates a new variant, after that requests are served a random one.
+    Concurrent misses for the same key share a single in-flight call.
+    """
+
+    def __init__(self, variants=None, ttl=None, max_keys=None):
+        self.variants = variants or Config.RECOMMENDATION_CACHE_VARIANTS
+        self.ttl = ttl if ttl is not None else Config.RECOMMENDATION_CACHE_TTL
+        self.max_keys = max_keys or Config.RECOMMENDATION_CACHE_MAX_KEYS
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._counters = {'hits': 0, 'misses': 0, 'shared': 0, 'evictions': 0}
+
+    def _fresh_variants(self, key, now):
+        variants = [entry for entry in self._entries.get(key, []) if entry[1] > now]
+        if variants:
+            self._entries[key] = variants
+            self._entries.move_to_end(key)
+        else:
+            self._entries.pop(key, None)
+        return variants
+
+    def _add_variant(self, key, value):
+        with self._lock:
+            variants = self._fresh_variants(key, time.time())
+            if len(variants) < self.variants:
+                variants.append((value, time.time() + self.ttl))
+                self._entries[key] = variants
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def lookup(self, mood, time_of_day):
+        """Return a cached variant once the key is full, otherwise None."""
+        key = (canonical_mood(mood), time_of_day)
+        with self._lock:
+            variants = self._fresh_variants(key, time.time())
+            if len(variants) >= self.variants:
+                self._counters['hits'] += 1
+                return copy.deepcopy(random.choice(variants)[0])
+            self._counters['misses'] += 1
+        return None
+
+    def peek(self, mood, time_of_day):
+        """Return any fresh variant, even before the key is full; None if empty."""
+        key = (canonical_mood(mood), time_of_day)
+        with self._lock:
+            variants = self._fresh_variants(key, time.time())
+            return copy.deepcopy(random.choice(variants)[0]) if variants else None
+
+    def add(self, mood, time_of_day, value):
+        self._add_variant((canonical_mood(mood), time_of_day), copy.deepcopy(value))
+
+    def get_or_generate(self, mood, time_of_day, generate):
+        cached = self.lookup(mood, time_of_day)
+        if cached is not None:
+            return cached
+
+        key = (canonical_mood(mood), time_of_day)
+        value, shared = self._flights.do(key, generate)
+        if shared:
+            with self._lock:
+                self._counters['shared'] += 1
+        else:
+            self._add_variant(key, value)
+        return copy.deepcopy(value)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['keys'] = len(self._entries)
+        return stats
+
+
+recommendation_cache = RecommendationCache() if Config.RECOMMENDATION_CACHE_ENABLED else None
@@ -0,0 +1,264 @@
+"""Parsing for the JSON recommendation object Gemini returns.
+
+Model output is not always clean JSON: it may be wrapped in a ```json
+fence, surrounded by prose, contain trailing commas, or stop mid-object
+when generation is cut short. ``extract_json`` recovers the object in all
+of these cases, and ``RecommendationStreamParser`` does the same work
+incrementally so fields can be used while the model is still generating.
+"""
+import json
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class _Scanner:
+    """Character-level JSON structure tracker that can be fed in pieces.
+
+    Keeps a cleaned copy of the object seen so far (trailing commas
+    dropped) along with the open containers, so the text can be closed
+    off at any point.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.out = []
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        # (length of out before the comma, open containers) at the last comma
+        self.last_comma = None
+
+    def feed(self, text, on_event=None):
+        """Scan ``text``; returns how many characters were used before the object closed."""
+        for i, ch in enumerate(text):
+            if self.finished:
+                return i
+            if not self.started:
+                if ch == '{':
+                    self.started = True
+                    self.stack.append('{')
+                    self.out.append(ch)
+                    if on_event:
+                        on_event('open', ch)
+                continue
+
+            if self.in_string:
+                self.out.append(ch)
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if on_event:
+                        on_event('string_end', ch)
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                if on_event:
+                    on_event('string_start', ch)
+                self.out.append(ch)
+            elif ch in '{[':
+                self.stack.append(ch)
+                self.out.append(ch)
+                if on_event:
+                    on_event('open', ch)
+            elif ch in '}]':
+                self._drop_trailing_comma()
+                if self.stack:
+                    self.stack.pop()
+                self.out.append(ch)
+                if on_event:
+                    on_event('close', ch)
+                if not self.stack:
+                    self.finished = True
+            elif ch == ',':
+                self.last_comma = (len(self.out), list(self.stack))
+                self.out.append(ch)
+                if on_event:
+                    on_event('comma', ch)
+            elif ch == ':':
+                self.out.append(ch)
+                if on_event:
+                    on_event('colon', ch)
+            elif not ch.isspace():
+                self.out.append(ch)
+        return len(text)
+
+    def _drop_trailing_comma(self):
+        if self.out and self.out[-1] == ',':
+            self.out.pop()
+
+    def candidates(self):
+        """Yield JSON texts for the object, closing it off if truncated."""
+        text = ''.join(self.out)
+        if self.finished:
+            yield text
+            return
+
+        # Keep a cut-off final string value and close what is open
+        closed = text + ('"' if self.in_string else '')
+        closed = closed.rstrip(',')
+        if closed.endswith(':'):
+            closed += 'null'
+        yield closed + ''.join(_CLOSERS[c] for c in reversed(self.stack))
+
+        # Otherwise fall back to the last complete element
+        if self.last_comma is not None:
+            length, stack = self.last_comma
+            yield text[:length] + ''.join(_CLOSERS[c] for c in reversed(stack))
+
+
+def extract_json(content, accept=None):
+    """Return the first JSON object in ``content``.
+
+    Braces in surrounding prose ("Here is {my} answer: {...}") can start an
+    object that isn't the payload, so when ``accept`` rejects a parsed
+    object, or nothing parses, scanning restarts at each later ``{``. If no
+    object is accepted, the first one that parsed is returned for the
+    caller to report on. Raises ValueError when no object can be recovered.
+    """
+    start = content.find('{')
+    if start < 0:
+        raise ValueError("No JSON object found in model output")
+
+    first = None
+    error = None
+    while start >= 0:
+        scanner = _Scanner()
+        scanner.feed(content[start:])
+        for candidate in scanner.candidates():
+            try:
+                value = json.loads(candidate)
+            except json.JSONDecodeError as e:
+                error = e
+                continue
+            if accept is None or accept(value):
+                return value
+            if first is None:
+                first = value
+            break
+        start = content.find('{', start + 1)
+    if first is not None:
+        return first
+    raise ValueError(f"Could not parse model output: {error}")
+
+
+def _has_songs(value):
+    return isinstance(value, dict) and isinstance(value.get('songs'), list)
+
+
+def validate_recommendations(recommendations):
+    if not isinstance(recommendations, dict):
+        raise ValueError("Model output is not a JSON object")
+    songs = recommendations.get('songs')
+    if not isinstance(songs, list):
+        raise ValueError("Model output has no songs list")
+    recommendations['songs'] = [
+        song for song in songs if isinstance(song, dict) and song.get('title')
+    ]
+    return recommendations
+
+
+def parse_recommendations(content):
+    return validate_recommendations(extract_json(content, _has_songs))
+
+
+def parse_batch_recommendations(content, keys):
+    """Split a batched response into {key: recommendations or ValueError}."""
+    batch = extract_json(content, lambda value: isinstance(value, dict) and any(key in value for key in keys))
+    if not isinstance(batch, dict):
+        raise ValueError("Model output is not a JSON object")
+    results = {}
+    for key in keys:
+        if key not in batch:
+            results[key] = ValueError(f"{key}: missing from batched model output")
+            continue
+        try:
+            results[key] = validate_recommendations(batch.get(key))
+        except ValueError as e:
+            results[key] = ValueError(f"{key}: {e}")
+    return results
+
+
+class RecommendationStreamParser:
+    """Pull recommendation fields out of model output as it streams in.
+
+    ``feed`` takes the next text chunk and returns the fields completed by
+    it, in order, as (kind, value) pairs: ``('cuisine', str)``,
+    ``('explanation', str)`` and ``('song', {'title': str, ...})``. Each
+    song is reported as soon as its object closes, so link lookups can
+    start before generation finishes.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.fields = {}
+        self.songs = []
+        self._events = []
+        self._restart()
+
+    def _restart(self):
+        self._scanner = _Scanner()
+        self._expect_key = True
+        self._key = None
+        self._string_start = None
+        self._song_start = None
+
+    def _on_event(self, kind, ch):
+        scanner = self._scanner
+        depth = len(scanner.stack)
+        position = len(scanner.out)
+
+        if kind == 'string_start':
+            self._string_start = position
+        elif kind == 'string_end' and depth == 1:
+            try:
+                text = json.loads(''.join(scanner.out[self._string_start:]))
+            except json.JSONDecodeError:
+                return
+            if self._expect_key:
+                self._key = text
+            elif self._key in ('cuisine', 'explanation') and self._key not in self.fields:
+                self.fields[self._key] = text
+                self._events.append((self._key, text))
+        elif kind == 'colon' and depth == 1:
+            self._expect_key = False
+        elif kind == 'comma' and depth == 1:
+            self._expect_key = True
+        elif kind == 'open' and ch == '{' and depth == 3 and scanner.stack[1] == '[' and self._key == 'songs':
+            self._song_start = position - 1
+        elif kind == 'close' and ch == '}' and depth == 2 and self._song_start is not None:
+            try:
+                song = json.loads(''.join(scanner.out[self._song_start:]))
+            except json.JSONDecodeError:
+                song = None
+            self._song_start = None
+            if isinstance(song, dict) and song.get('title'):
+                self.songs.append(song)
+                self._events.append(('song', song))
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        self._events = []
+        while chunk:
+            if self._scanner.finished and not self.fields and not self.songs:
+                # That object was an aside in the prose; look for the next one
+                self._restart()
+            used = self._scanner.feed(chunk, self._on_event)
+            if not used:
+                break
+            chunk = chunk[used:]
+        return self._events
+
+    def result(self):
+        try:
+            return parse_recommendations(self.buffer)
+        except ValueError:
+            return {
+                'cuisine': self.fields.get('cuisine', ''),
+                'songs': list(self.songs),
+                'explanation': self.fields.get('explanation', '')
+            }
@@ -0,0 +1,137 @@
+"""Per-user mood counts, maintained incrementally in the mood_rollup table.
+
+Every history write adds one to three counters for its user, in the same
+transaction as the MoodRecord itself: the canonical mood, the time-of-day
+bucket from ``get_time_of_day`` and the week (its Monday). /api/stats then
+reads a handful of rollup rows instead of grouping the user's whole
+history. ``backfill_rollups`` rebuilds the table from existing records.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy import insert as generic_insert
+
+from models import MoodRecord, MoodRollup
+from moods import canonical_mood
+from prompts import get_time_of_day
+
+mood_records = MoodRecord.__table__
+rollups = MoodRollup.__table__
+
+
+def week_bucket(created_at):
+    return (created_at - timedelta(days=created_at.weekday())).date().isoformat()
+
+
+def rollup_buckets(mood, hour, created_at):
+    """Return {dimension: bucket} for one record.
+
+    ``hour`` is the client's local hour sent with the request; records
+    without one fall back to the (UTC) hour they were created at.
+    """
+    try:
+        time_of_day = get_time_of_day(int(hour))
+    except (TypeError, ValueError):
+        time_of_day = get_time_of_day(created_at.hour)
+    return {
+        'mood': canonical_mood(mood),
+        'time_of_day': time_of_day,
+        'week': week_bucket(created_at)
+    }
+
+
+def rollup_rows(entries):
+    """Sum [(user_id, buckets), ...] into mood_rollup rows."""
+    counts = Counter()
+    for user_id, buckets in entries:
+        for dimension, bucket in buckets.items():
+            counts[(user_id, dimension, bucket)] += 1
+    return [
+        {'user_id': user_id, 'dimension': dimension, 'bucket': bucket, 'count': count}
+        for (user_id, dimension, bucket), count in counts.items()
+    ]
+
+
+def upsert_statement(dialect_name):
+    """INSERT ... ON CONFLICT that adds to existing counters, or None."""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    statement = insert(rollups)
+    return statement.on_conflict_do_update(
+        index_elements=[rollups.c.user_id, rollups.c.dimension, rollups.c.bucket],
+        set_={'count': rollups.c.count + statement.excluded['count']}
+    )
+
+
+def apply_rollups(conn, rows):
+    if not rows:
+        return
+    statement = upsert_statement(conn.dialect.name)
+    if statement is not None:
+        conn.execute(statement, rows)
+        return
+    for row in rows:
+        result = conn.execute(
+            update(rollups)
+            .where(rollups.c.user_id == row['user_id'],
+                   rollups.c.dimension == row['dimension'],
+                   rollups.c.bucket == row['bucket'])
+            .values(count=rollups.c.count + row['count'])
+        )
+        if result.rowcount == 0:
+            conn.execute(generic_insert(rollups), row)
+
+
+def backfill_rollups(engine, chunk_size=10000):
+    """Rebuild mood_rollup from mood_record, one committed chunk at a time.
+
+    Records created after the rebuild starts are counted by the live write
+    path, so only ids up to the starting maximum are scanned. Returns the
+    number of records processed.
+    """
+    with engine.begin() as conn:
+        max_id = conn.execute(select(func.max(mood_records.c.id))).scalar()
+        conn.execute(delete(rollups))
+    if max_id is None:
+        return 0
+
+    last_id = 0
+    processed = 0
+    while last_id < max_id:
+        with engine.begin() as conn:
+            chunk = conn.execute(
+                select(mood_records.c.id, mood_records.c.user_id, mood_records.c.mood, mood_records.c.created_at)
+                .where(mood_records.c.id > last_id, mood_records.c.id <= max_id)
+                .order_by(mood_records.c.id)
+                .limit(chunk_size)
+            ).all()
+            if not chunk:
+                break
+            # History rows don't keep the client's hour, so use the creation hour
+            apply_rollups(conn, rollup_rows(
+                (row.user_id, rollup_buckets(row.mood, None, row.created_at)) for row in chunk
+            ))
+        last_id = chunk[-1].id
+        processed += len(chunk)
+        print(f"Backfilled {processed} records (through id {last_id})")
+    return processed
+
+
+def user_stats(conn, user_id, weeks=12):
+    """Return a user's counts by mood, time of day and week from the rollups."""
+    rows = conn.execute(
+        select(rollups.c.dimension, rollups.c.bucket, rollups.c.count)
+        .where(rollups.c.user_id == user_id)
+    ).all()
+    stats = {'moods': {}, 'timeOfDay': {}, 'weeks': {}}
+    keys = {'mood': 'moods', 'time_of_day': 'timeOfDay', 'week': 'weeks'}
+    for dimension, bucket, count in rows:
+        stats[keys[dimension]][bucket] = count
+    recent = sorted(stats['weeks'])[-weeks:] if weeks > 0 else []
+    stats['weeks'] = {week: stats['weeks'][week] for week in recent}
+    return stats
@@ -1,30 +1,236 @@
+import base64
 import os
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as LookupTimeout
+
 from dotenv import load_dotenv
+from config import Config
+from link_cache import LinkCache, normalize_key
+from metrics import UPSTREAM_REQUESTS, count
 
 load_dotenv()
 
-def setup_spotify_client():
-    client_id = os.getenv('SPOTIFY_CLIENT_ID')
-    client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
-    
-    if not client_id or not client_secret:
-        raise ValueError("Spotify credentials not found in environment variables.")
-    
-    client_credentials_manager = SpotifyClientCredentials(
-        client_id=client_id, 
-        client_secret=client_secret
-    )
-    return spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-
-spotify_client = setup_spotify_client()
-
-def get_spotify_link(song_title, artist):
-    try:
-        results = spotify_client.search(q=f'track:{song_title} artist:{artist}', type='track', limit=1)
-        tracks = results.get('tracks', {}).get('items', [])
-        
+class SpotifyTokenManager:
+    """Client-credentials token kept in memory and shared by all threads.
+
+    Unlike spotipy's default cache handler this never touches the
+    filesystem, which is read-only on serverless deployments.
+    """
+
+    def __init__(self, client_id, client_secret, session, token_url=None):
+        if not client_id or not client_secret:
+            raise ValueError("Spotify credentials not found in environment variables.")
+        self.credentials = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
+        self.session = session
+        self.token_url = token_url or Config.SPOTIFY_TOKEN_URL
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get_token(self):
+        with self._lock:
+            # Refresh a minute early so in-flight searches never carry an expired token
+            if self._token is None or time.time() > self._expires_at - 60:
+                response = self.session.post(
+                    self.token_url,
+                    data={'grant_type': 'client_credentials'},
+                    headers={'Authorization': f"Basic {self.credentials}"},
+                    timeout=Config.LINK_LOOKUP_TIMEOUT
+                )
+                count(UPSTREAM_REQUESTS, upstream='spotify_token', result=str(response.status_code))
+                response.raise_for_status()
+                payload = response.json()
+                self._token = payload['access_token']
+                self._expires_at = time.time() + payload.get('expires_in', 3600)
+            return self._token
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+
+
+class RateLimitBudget:
+    """Request budget shared by every thread talking to Spotify.
+
+    A token bucket caps the steady request rate, and a 429 ``Retry-After``
+    pauses all callers, not just the one that received it.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def block_for(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class SpotifyResolver:
+    """Resolves (title, artist) pairs to Spotify tracks for all requests.
+
+    Lookups from concurrent requests are coalesced: identical pairs share
+    one in-flight search, recently resolved pairs are answered from
+    memory, and pending lookups are collected for up to
+    SPOTIFY_BATCH_WINDOW seconds and dispatched together under one rate
+    limit budget. The search API has no multi-track query, so a batch runs
+    as parallel searches over one keep-alive session.
+
+    A lookup may carry a deadline (a ``time.monotonic()`` value). Callers
+    stop waiting when it passes, and lookups whose every caller has given
+    up are dropped before they spend a search. At most SPOTIFY_QUEUE_SIZE
+    lookups wait for dispatch; beyond that new lookups fail at once.
+    """
+
+    def __init__(self, client_id, client_secret, api_url=None, token_url=None):
+        # Deferred so routes that never search Spotify don't pay for importing requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_url = (api_url or Config.SPOTIFY_API_URL).rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=Config.SPOTIFY_BATCH_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.tokens = SpotifyTokenManager(client_id, client_secret, self.session, token_url)
+        self.budget = RateLimitBudget(Config.SPOTIFY_RATE_LIMIT, Config.SPOTIFY_RATE_BURST)
+        self.resolved = LinkCache(max_entries=Config.LINK_CACHE_SIZE)
+        self._pending = {}
+        # key -> latest deadline of the callers waiting on it, None for no deadline
+        self._deadlines = {}
+        self._queue = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._workers = ThreadPoolExecutor(
+            max_workers=Config.SPOTIFY_BATCH_SIZE,
+            thread_name_prefix='spotify'
+        )
+        self._dispatcher = threading.Thread(target=self._dispatch, name='spotify-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    def resolve(self, song_title, artist, deadline=None):
+        key = normalize_key(song_title, artist)
+        cached = self.resolved.get_many('spotify', [(song_title, artist)])
+        if key in cached:
+            return cached[key]
+        if deadline is not None and deadline <= time.monotonic():
+            raise LookupTimeout("Spotify lookup deadline already passed")
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                if len(self._queue) >= Config.SPOTIFY_QUEUE_SIZE:
+                    raise RuntimeError("Spotify lookup queue is full")
+                future = self._pending[key] = Future()
+                self._deadlines[key] = deadline
+                self._queue.append((key, song_title, artist, future))
+                self._wakeup.notify()
+            elif key in self._deadlines:
+                # A shared lookup lives as long as its most patient caller
+                current = self._deadlines[key]
+                self._deadlines[key] = None if current is None or deadline is None else max(current, deadline)
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        return future.result(timeout)
+
+    def _expired(self, key):
+        # Called with the lock held
+        deadline = self._deadlines.get(key)
+        return deadline is not None and deadline <= time.monotonic()
+
+    def _drop(self, key, future):
+        # Called with the lock held
+        self._pending.pop(key, None)
+        self._deadlines.pop(key, None)
+        future.set_exception(LookupTimeout("Spotify lookup expired before it was sent"))
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    self._wakeup.wait()
+                # Give concurrent requests a moment to add their lookups to this batch
+                deadline = time.monotonic() + Config.SPOTIFY_BATCH_WINDOW
+                while len(self._queue) < Config.SPOTIFY_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch = []
+                while self._queue and len(batch) < Config.SPOTIFY_BATCH_SIZE:
+                    item = self._queue.pop(0)
+                    if self._expired(item[0]):
+                        self._drop(item[0], item[3])
+                    else:
+                        batch.append(item)
+
+            for item in batch:
+                self._workers.submit(self._run, *item)
+
+    def _run(self, key, song_title, artist, future):
+        with self._lock:
+            # It may have waited for a worker past its deadline
+            if self._expired(key):
+                self._drop(key, future)
+                return
+        try:
+            result = self.search(song_title, artist)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            self.resolved.set_many('spotify', {(song_title, artist): result})
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+                self._deadlines.pop(key, None)
+
+    def search(self, song_title, artist):
+        for attempt in range(Config.SPOTIFY_MAX_RETRIES + 1):
+            self.budget.acquire()
+            response = self.session.get(
+                f"{self.api_url}/search",
+                params={'q': f'track:{song_title} artist:{artist}', 'type': 'track', 'limit': 1},
+                headers={'Authorization': f"Bearer {self.tokens.get_token()}"},
+                timeout=Config.LINK_LOOKUP_TIMEOUT
+            )
+            count(UPSTREAM_REQUESTS, upstream='spotify', result=str(response.status_code))
+            if response.status_code == 429 and attempt < Config.SPOTIFY_MAX_RETRIES:
+                retry_after = response.headers.get('Retry-After', '1')
+                self.budget.block_for(float(retry_after) if retry_after.isdigit() else 1.0)
+                continue
+            if response.status_code == 401 and attempt < Config.SPOTIFY_MAX_RETRIES:
+                self.tokens.invalidate()
+                continue
+            # Same policy as async_clients._get_json, so both serving paths retry alike
+            if response.status_code in (500, 502, 503, 504) and attempt < Config.SPOTIFY_MAX_RETRIES:
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    time.sleep(float(retry_after))
+                else:
+                    time.sleep(Config.SPOTIFY_BACKOFF_FACTOR * (2 ** attempt) * (1 + random.random() / 2))
+                continue
+            response.raise_for_status()
+            break
+
+        tracks = response.json().get('tracks', {}).get('items', [])
         if tracks:
             track = tracks[0]
             return {
@@ -33,6 +239,19 @@ def get_spotify_link(song_title, artist):
                 'fullTrackName': f"{track['name']} - {track['artists'][0]['name']}"
             }
         return None
-    except Exception as e:
-        print(f"Error fetching Spotify link: {e}")
-        return None
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_spotify_resolver():
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = SpotifyResolver(os.getenv('SPOTIFY_CLIENT_ID'), os.getenv('SPOTIFY_CLIENT_SECRET'))
+    return _resolver
+
+def get_spotify_link(song_title, artist, deadline=None):
+    # Errors propagate so callers can tell a failed lookup from "not found"
+    return get_spotify_resolver().resolve(song_title, artist, deadline)
@@ -0,0 +1,31 @@
+from sqlalchemy import create_engine, func, insert, select
+
+from models import MoodRecord, User, db
+from persistence import HistoryWriter
+
+
+def answer(mood):
+    return {
+        'cuisine': f"food for {mood}",
+        'songs': [{'title': f"Song {i} - Artist", 'youtubeLink': '', 'spotifyLink': ''} for i in range(3)],
+        'explanation': 'Because.'
+    }
+
+
+def test_bad_row_does_not_stop_the_writer(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{'id': 1, 'email': 'a@example.com', 'password': 'x'}])
+    writer = HistoryWriter(lambda: engine, batch_window=0.05)
+
+    # A malformed group fails outside SQLAlchemy; the good one behind it must still land
+    writer._queue.put([('not', 'a', 'row', 'tuple')])
+    writer.submit(1, 'happy', answer('happy'), 9)
+    writer.flush(timeout=5)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(MoodRecord.__table__)).scalar() == 1
+    assert writer.stats()['written'] == 1
+    assert writer.stats()['failed'] == 1
+
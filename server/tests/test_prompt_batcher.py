@@ -0,0 +1,116 @@
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from prompt_batcher import PromptBatcher
+
+
+def answer(mood):
+    return {
+        'cuisine': f"food for {mood}",
+        'songs': [{'title': f"Song {i} - Artist"} for i in range(5)],
+        'explanation': 'Because.'
+    }
+
+
+class FakeModel:
+    """Answers single and batched prompts, echoing each mood in the cuisine."""
+
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+        people = re.findall(r"^- (r\d+): feeling (.+?) during", prompt, re.M)
+        if people:
+            text = json.dumps({request_id: answer(mood) for request_id, mood in people if mood not in self.drop})
+        else:
+            text = json.dumps(answer(re.search(r"someone feeling (.+?) during", prompt).group(1)))
+        return type('Response', (), {'text': f"```json\n{text}\n```"})()
+
+    @property
+    def batch_calls(self):
+        return [prompt for prompt in self.prompts if re.search(r"^- r\d+:", prompt, re.M)]
+
+
+def generate_all(batcher, model, requests):
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(lambda request: batcher.generate(model, *request), requests))
+
+
+def test_concurrent_prompts_share_one_call():
+    model = FakeModel()
+    # The batch is sent as soon as it is full, so the long window never runs out
+    batcher = PromptBatcher(batch_size=3, window=5, fallback_single=True, workers=2)
+
+    results = generate_all(batcher, model, [('happy', 9), ('sad', 9), ('angry', 21)])
+
+    assert len(model.prompts) == 1
+    assert len(model.batch_calls) == 1
+    assert batcher.stats()['batches'] == 1
+    assert batcher.stats()['batched_requests'] == 3
+    assert [result['cuisine'] for result in results] == ['food for happy', 'food for sad', 'food for angry']
+
+
+def test_same_mood_and_time_of_day_merge():
+    model = FakeModel()
+    # Two distinct keys never fill a batch of three, so all requests arrive within the window
+    batcher = PromptBatcher(batch_size=3, window=0.5, fallback_single=True, workers=2)
+
+    results = generate_all(batcher, model, [('happy', 9), ('joyful', 10), ('sad', 9)])
+
+    # "joyful" at 10:00 is the same (canonical mood, time of day) as "happy" at 9:00
+    assert batcher.stats()['merged'] == 1
+    assert len(model.prompts) == 1
+    assert [result['cuisine'] for result in results] == ['food for happy', 'food for happy', 'food for sad']
+    # Merged callers get their own copies to enrich
+    results[0]['songs'].append({'title': 'Extra'})
+    assert len(results[1]['songs']) == 5
+
+
+def test_response_is_split_per_key():
+    model = FakeModel()
+    batcher = PromptBatcher(batch_size=4, window=5, fallback_single=True, workers=2)
+    moods = ['happy', 'sad', 'tired', 'calm']
+
+    results = generate_all(batcher, model, [(mood, 14) for mood in moods])
+
+    for mood, result in zip(moods, results):
+        assert result['cuisine'] == f"food for {mood}"
+        assert len(result['songs']) == 5
+        assert result['explanation'] == 'Because.'
+
+
+def test_missing_key_falls_back_to_single_prompt():
+    model = FakeModel(drop={'sad'})
+    batcher = PromptBatcher(batch_size=2, window=5, fallback_single=True, workers=2)
+
+    results = generate_all(batcher, model, [('happy', 9), ('sad', 9)])
+
+    assert [result['cuisine'] for result in results] == ['food for happy', 'food for sad']
+    assert len(model.batch_calls) == 1
+    assert len(model.prompts) == 2
+    stats = batcher.stats()
+    assert stats['fallbacks'] == 1
+    assert stats['single_prompts'] == 1
+
+
+def test_missing_key_raises_without_fallback():
+    model = FakeModel(drop={'sad'})
+    batcher = PromptBatcher(batch_size=2, window=5, fallback_single=False, workers=2)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        happy = pool.submit(batcher.generate, model, 'happy', 9)
+        sad = pool.submit(batcher.generate, model, 'sad', 9)
+        assert happy.result()['cuisine'] == 'food for happy'
+        with pytest.raises(ValueError, match='missing from batched model output'):
+            sad.result()
+
+    assert len(model.prompts) == 1
+    assert batcher.stats()['fallbacks'] == 0
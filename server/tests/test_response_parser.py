@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from response_parser import RecommendationStreamParser, parse_batch_recommendations, parse_recommendations
+
+PAYLOAD = {
+    'cuisine': 'Tacos',
+    'songs': [{'title': 'Song A - Artist'}, {'title': 'Song B - Artist'}],
+    'explanation': 'Because.'
+}
+
+
+def test_fenced_output():
+    assert parse_recommendations(f"```json\n{json.dumps(PAYLOAD)}\n```") == PAYLOAD
+
+
+def test_trailing_commas():
+    text = '{"cuisine": "Tacos", "songs": [{"title": "Song A - Artist"},], "explanation": "Because.",}'
+    assert parse_recommendations(text)['songs'] == [{'title': 'Song A - Artist'}]
+
+
+def test_truncated_output_is_closed_off():
+    # Cut inside the second title, which is kept as far as it got
+    text = json.dumps(PAYLOAD)[:-40]
+    result = parse_recommendations(text)
+    assert result['cuisine'] == 'Tacos'
+    assert result['songs'] == [{'title': 'Song A - Artist'}, {'title': 'Song B'}]
+
+
+def test_braces_in_preamble():
+    result = parse_recommendations(f"Here is {{my}} answer: {json.dumps(PAYLOAD)}")
+    assert result == PAYLOAD
+
+
+def test_json_object_in_preamble():
+    text = f'Settings {{"temperature": 0.7}} applied. {json.dumps(PAYLOAD)}'
+    assert parse_recommendations(text) == PAYLOAD
+
+
+def test_object_without_songs_is_reported():
+    with pytest.raises(ValueError, match="no songs list"):
+        parse_recommendations('{"cuisine": "Tacos"}')
+
+
+def test_no_object():
+    with pytest.raises(ValueError, match="No JSON object"):
+        parse_recommendations("Sorry, I can't help with that.")
+
+
+def test_batch_with_braces_in_preamble():
+    text = f'Answers for {{2}} people: {json.dumps({"r1": PAYLOAD, "r2": PAYLOAD})}'
+    results = parse_batch_recommendations(text, ['r1', 'r2'])
+    assert results == {'r1': PAYLOAD, 'r2': PAYLOAD}
+
+
+def test_stream_parser_reports_fields_in_order():
+    parser = RecommendationStreamParser()
+    text = json.dumps(PAYLOAD)
+    events = []
+    for i in range(0, len(text), 7):
+        events.extend(parser.feed(text[i:i + 7]))
+    assert events == [
+        ('cuisine', 'Tacos'),
+        ('song', {'title': 'Song A - Artist'}),
+        ('song', {'title': 'Song B - Artist'}),
+        ('explanation', 'Because.')
+    ]
+    assert parser.result() == PAYLOAD
+
+
+def test_stream_parser_skips_braces_in_preamble():
+    parser = RecommendationStreamParser()
+    text = f"Here is {{my}} answer: {json.dumps(PAYLOAD)}"
+    events = []
+    for i in range(0, len(text), 5):
+        events.extend(parser.feed(text[i:i + 5]))
+    assert [kind for kind, _ in events] == ['cuisine', 'song', 'song', 'explanation']
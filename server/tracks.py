@@ -0,0 +1,176 @@
+"""Deduplicated catalog of recommended tracks.
+
+A recommended song used to be stored with its full title, YouTube URL and
+Spotify URL in every record that recommended it. Each resolved track is
+now stored once in ``track``, keyed by (title, YouTube video id, Spotify
+track id), and a Song row only links a mood record to a track. Links are
+rebuilt from the ids when read.
+
+``resolve_tracks`` maps a batch of songs to track ids with one SELECT and
+at most one INSERT. ``migrate_songs`` moves a database that still has the
+old song columns over to the catalog in batches.
+"""
+import re
+
+from sqlalchemy import bindparam, case, column, func, inspect, literal, select, table, text, tuple_, update
+from sqlalchemy import insert as generic_insert
+
+from models import SPOTIFY_TRACK_URL, YOUTUBE_WATCH_URL, Song, Track
+
+tracks = Track.__table__
+songs_table = Song.__table__
+
+LEGACY_COLUMNS = ('title', 'youtube_link', 'spotify_link')
+# The song table as it was before the catalog, for the migration
+legacy_songs = table('song', column('id'), column('track_id'), *(column(name) for name in LEGACY_COLUMNS))
+
+_YOUTUBE_ID = re.compile(r'(?:[?&]v=|youtu\.be/|/embed/|/shorts/)([A-Za-z0-9_-]{6,20})')
+_SPOTIFY_ID = re.compile(r'(?:open\.spotify\.com/(?:intl-[a-z]+/)?track/|spotify:track:)([A-Za-z0-9]{10,30})')
+# Bound parameters per lookup query, well under SQLite's limit
+LOOKUP_BATCH = 300
+
+
+def youtube_id(link):
+    """Video id from a YouTube URL; '' when there is none."""
+    match = _YOUTUBE_ID.search(link or '')
+    return match.group(1) if match else ''
+
+
+def spotify_id(link):
+    """Track id from a Spotify URL or URI; '' when there is none."""
+    match = _SPOTIFY_ID.search(link or '')
+    return match.group(1) if match else ''
+
+
+def track_identity(title, youtube_link, spotify_link):
+    return title or '', youtube_id(youtube_link), spotify_id(spotify_link)
+
+
+def song_identities(songs):
+    """(title, youtube_id, spotify_id) for each enriched song dict."""
+    return [
+        track_identity(song.get('title', ''), song.get('youtubeLink', ''), song.get('spotifyLink', ''))
+        for song in songs
+    ]
+
+
+def youtube_link_column():
+    return case(
+        (tracks.c.youtube_id != '', literal(YOUTUBE_WATCH_URL) + tracks.c.youtube_id), else_=''
+    ).label('youtube_link')
+
+
+def spotify_link_column():
+    return case(
+        (tracks.c.spotify_id != '', literal(SPOTIFY_TRACK_URL) + tracks.c.spotify_id), else_=''
+    ).label('spotify_link')
+
+
+def insert_ignore_statement(dialect_name):
+    """INSERT ... ON CONFLICT DO NOTHING for tracks, or None."""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(tracks).on_conflict_do_nothing()
+
+
+def _lookup(conn, identities):
+    identities = list(identities)
+    found = {}
+    for start in range(0, len(identities), LOOKUP_BATCH):
+        rows = conn.execute(
+            select(tracks.c.id, tracks.c.title, tracks.c.youtube_id, tracks.c.spotify_id)
+            .where(tuple_(tracks.c.title, tracks.c.youtube_id, tracks.c.spotify_id)
+                   .in_(identities[start:start + LOOKUP_BATCH]))
+        )
+        found.update(((row.title, row.youtube_id, row.spotify_id), row.id) for row in rows)
+    return found
+
+
+def resolve_tracks(conn, identities):
+    """Return the track id of each identity on ``conn``, creating missing tracks."""
+    if not identities:
+        return []
+    ids = _lookup(conn, set(identities))
+    missing = set(identities) - ids.keys()
+    if missing:
+        rows = [
+            {'title': title, 'youtube_id': video_id, 'spotify_id': track_id}
+            for title, video_id, track_id in missing
+        ]
+        # Another writer may add the same track first; its row is picked up below
+        statement = insert_ignore_statement(conn.dialect.name)
+        conn.execute(statement if statement is not None else generic_insert(tracks), rows)
+        ids.update(_lookup(conn, missing))
+    return [ids[identity] for identity in identities]
+
+
+def song_columns(engine):
+    return {column['name'] for column in inspect(engine).get_columns('song')}
+
+
+def migrate_songs(engine, batch_size=10000, drop_legacy=False):
+    """Point every song at a track, one committed batch at a time.
+
+    Adds ``song.track_id`` if it is missing, fills it from the old title and
+    link columns, and with ``drop_legacy`` drops those columns once every
+    song has a track. Safe to rerun; songs that already have a track are
+    skipped. Returns counts for the report.
+    """
+    tracks.create(engine, checkfirst=True)
+    columns = song_columns(engine)
+    if 'track_id' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE song ADD COLUMN track_id INTEGER REFERENCES track (id)"))
+
+    report = {'songs': 0, 'unparsed_links': 0}
+    if set(LEGACY_COLUMNS) <= columns:
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                batch = conn.execute(
+                    select(legacy_songs)
+                    .where(legacy_songs.c.track_id.is_(None), legacy_songs.c.id > last_id)
+                    .order_by(legacy_songs.c.id)
+                    .limit(batch_size)
+                ).all()
+                if not batch:
+                    break
+                identities = [track_identity(row.title, row.youtube_link, row.spotify_link) for row in batch]
+                track_ids = resolve_tracks(conn, identities)
+                conn.execute(
+                    update(legacy_songs)
+                    .where(legacy_songs.c.id == bindparam('song_id'))
+                    .values(track_id=bindparam('new_track_id')),
+                    [{'song_id': row.id, 'new_track_id': track_id} for row, track_id in zip(batch, track_ids)]
+                )
+            last_id = batch[-1].id
+            report['songs'] += len(batch)
+            # Links the catalog cannot keep because no id could be read from them
+            for row, (_, video_id, track_id) in zip(batch, identities):
+                report['unparsed_links'] += bool(row.youtube_link and not video_id)
+                report['unparsed_links'] += bool(row.spotify_link and not track_id)
+            print(f"Migrated {report['songs']} songs (through id {last_id})")
+
+    with engine.connect() as conn:
+        report['tracks'] = conn.execute(select(func.count()).select_from(tracks)).scalar()
+        report['total_songs'] = conn.execute(select(func.count()).select_from(songs_table)).scalar()
+        report['unmigrated'] = conn.execute(
+            select(func.count()).select_from(songs_table).where(songs_table.c.track_id.is_(None))
+        ).scalar()
+
+    if drop_legacy:
+        if report['unmigrated']:
+            raise ValueError(f"{report['unmigrated']} songs have no track yet; not dropping the old columns")
+        with engine.begin() as conn:
+            for name in LEGACY_COLUMNS:
+                if name in columns:
+                    conn.execute(text(f"ALTER TABLE song DROP COLUMN {name}"))
+        if engine.dialect.name == 'sqlite':
+            # SQLite only gives the freed pages back on VACUUM
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text("VACUUM"))
+    return report
@@ -0,0 +1,170 @@
+"""Pre-generated, link-enriched recommendations for the most requested moods.
+
+A background thread keeps up to WARM_POOL_DEPTH ready answers for each
+of the WARM_POOL_TOP_K most requested canonical moods, in the current
+and the next time of day. Demand is counted from requests and halves
+every WARM_POOL_MAX_AGE seconds. The current time of day comes from the
+server clock shifted by WARM_POOL_UTC_OFFSET hours.
+
+``take`` hands out a pooled answer in O(1) and wakes the thread to refill
+the slot. Each answer is served once. Entries older than WARM_POOL_MAX_AGE
+are evicted, and the pool never holds more than WARM_POOL_MAX_ENTRIES
+answers. When it is full, answers for moods or times of day that have
+dropped out of the targets are evicted first.
+"""
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from config import Config
+from metrics import WARM_POOL_REFILL_SECONDS, WARM_POOL_REQUESTS, count, registry
+from moods import CANONICAL_MOODS, canonical_mood
+from prompts import get_time_of_day
+
+TIMES_OF_DAY = ('morning', 'afternoon', 'evening', 'night')
+# An hour inside each bucket, for prompting
+TIME_OF_DAY_HOURS = {'morning': 9, 'afternoon': 14, 'evening': 19, 'night': 23}
+
+
+class WarmPool:
+    def __init__(self, build, top_k=None, depth=None, max_entries=None, max_age=None, interval=None,
+                 utc_offset=None):
+        """``build(mood, hour)`` returns a fully enriched answer or raises."""
+        self.build = build
+        self.top_k = top_k or Config.WARM_POOL_TOP_K
+        self.depth = depth or Config.WARM_POOL_DEPTH
+        self.max_entries = max_entries or Config.WARM_POOL_MAX_ENTRIES
+        self.max_age = max_age or Config.WARM_POOL_MAX_AGE
+        self.interval = interval or Config.WARM_POOL_INTERVAL
+        self.utc_offset = utc_offset if utc_offset is not None else Config.WARM_POOL_UTC_OFFSET
+        # (canonical mood, time of day) -> deque of (created, answer), oldest first
+        self._pools = {}
+        self._demand = Counter()
+        self._decayed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._refill_seconds = registry.histogram(WARM_POOL_REFILL_SECONDS)
+        self._counters = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stale': 0, 'evicted': 0,
+                          'refills': 0, 'refill_failures': 0, 'refill_seconds': 0.0}
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='warm-pool', daemon=True)
+                    self._thread.start()
+
+    def take(self, mood, hour):
+        """Return a pooled answer for this mood and hour, or None."""
+        self.start()
+        key = (canonical_mood(mood), get_time_of_day(hour))
+        if key[0] not in CANONICAL_MOODS:
+            # Free-text moods with no canonical match are never pooled
+            with self._lock:
+                self._counters['bypassed'] += 1
+            return None
+
+        now = time.monotonic()
+        answer = None
+        with self._lock:
+            self._demand[key[0]] += 1
+            entries = self._pools.get(key)
+            if entries:
+                self._drop_stale(entries, now)
+                if entries:
+                    answer = entries.popleft()[1]
+            self._counters['hits' if answer is not None else 'misses'] += 1
+        count(WARM_POOL_REQUESTS, result='hit' if answer is not None else 'miss')
+        self._wakeup.set()
+        return answer
+
+    def _drop_stale(self, entries, now):
+        while entries and now - entries[0][0] > self.max_age:
+            entries.popleft()
+            self._counters['stale'] += 1
+
+    def targets(self):
+        """Keys to keep warm, most important first."""
+        hour = (datetime.utcnow().hour + self.utc_offset) % 24
+        current = TIMES_OF_DAY.index(get_time_of_day(hour))
+        buckets = (TIMES_OF_DAY[current], TIMES_OF_DAY[(current + 1) % len(TIMES_OF_DAY)])
+        with self._lock:
+            moods = [mood for mood, _ in self._demand.most_common(self.top_k)]
+        # Until there is enough traffic, fill up with moods in their canonical order
+        for mood in CANONICAL_MOODS:
+            if len(moods) >= self.top_k:
+                break
+            if mood not in moods:
+                moods.append(mood)
+        return [(mood, bucket) for bucket in buckets for mood in moods]
+
+    def _next_key(self, targets):
+        """Evict stale and surplus entries; return the target most in need of an answer, or None."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._decayed_at > self.max_age:
+                self._demand = Counter({mood: n // 2 for mood, n in self._demand.items() if n > 1})
+                self._decayed_at = now
+            for key in list(self._pools):
+                self._drop_stale(self._pools[key], now)
+                if not self._pools[key]:
+                    del self._pools[key]
+
+            size = sum(len(entries) for entries in self._pools.values())
+            wanted = set(targets)
+            for key in [key for key in self._pools if key not in wanted]:
+                if size < self.max_entries:
+                    break
+                evicted = len(self._pools.pop(key))
+                size -= evicted
+                self._counters['evicted'] += evicted
+            if size >= self.max_entries:
+                return None
+
+            # min() keeps the first of equally empty keys, i.e. the more important one
+            key = min(targets, key=lambda key: len(self._pools.get(key, ())))
+            return key if len(self._pools.get(key, ())) < self.depth else None
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            key = self._next_key(self.targets())
+            if key is None:
+                self._wakeup.wait(self.interval)
+                continue
+
+            mood, time_of_day = key
+            start = time.perf_counter()
+            try:
+                answer = self.build(mood, TIME_OF_DAY_HOURS[time_of_day])
+            except Exception as e:
+                print(f"Warm pool refill for {mood}/{time_of_day} failed: {e!r}")
+                with self._lock:
+                    self._counters['refill_failures'] += 1
+                # Back off instead of hammering a failing upstream
+                time.sleep(self.interval)
+                continue
+            seconds = time.perf_counter() - start
+            self._refill_seconds.observe(seconds)
+            with self._lock:
+                self._pools.setdefault(key, deque()).append((time.monotonic(), answer))
+                self._counters['refills'] += 1
+                self._counters['refill_seconds'] += seconds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            served = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / served if served else None
+            stats['avg_refill_seconds'] = stats['refill_seconds'] / stats['refills'] if stats['refills'] else None
+            stats['entries'] = sum(len(entries) for entries in self._pools.values())
+            stats['keys'] = {f"{mood}/{time_of_day}": len(entries)
+                             for (mood, time_of_day), entries in self._pools.items()}
+        return stats
+
+
+def create_warm_pool(build):
+    """Return a WarmPool when WARM_POOL_ENABLED, else None."""
+    return WarmPool(build) if Config.WARM_POOL_ENABLED else None
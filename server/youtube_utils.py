@@ -1,36 +1,95 @@
 import os
-import requests
+import threading
+from config import Config
+from metrics import UPSTREAM_REQUESTS, YOUTUBE_QUOTA_UNITS, count
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_youtube_link(song_title):
-    YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
-    
-    if not YOUTUBE_API_KEY:
-        raise ValueError("YouTube API key not found in environment variables.")
-    
-    base_url = "https://www.googleapis.com/youtube/v3/search"
-    search_query = f"{song_title} official music video"
-    
-    params = {
-        'part': 'snippet',
-        'q': search_query,
-        'key': YOUTUBE_API_KEY,
-        'maxResults': 1,
-        'type': 'video',
-        'videoEmbeddable': 'true'
-    }
-    
-    try:
-        response = requests.get(base_url, params=params)
+class YouTubeClient:
+    """Long-lived YouTube search client.
+
+    Requests go through one ``requests.Session`` whose connection pool keeps
+    TLS connections alive between lookups, so only the first request per
+    pooled connection pays for the handshake. 429 and 5xx responses are
+    retried with exponential backoff, honouring ``Retry-After``.
+    """
+
+    def __init__(self, api_key, search_url=None, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None):
+        if not api_key:
+            raise ValueError("YouTube API key not found in environment variables.")
+
+        # Deferred so routes that never search YouTube don't pay for importing requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.api_key = api_key
+        self.search_url = search_url or Config.YOUTUBE_SEARCH_URL
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else Config.YOUTUBE_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else Config.YOUTUBE_READ_TIMEOUT
+        )
+        pool_size = pool_size or Config.YOUTUBE_POOL_SIZE
+
+        retry = Retry(
+            total=max_retries if max_retries is not None else Config.YOUTUBE_MAX_RETRIES,
+            backoff_factor=backoff_factor if backoff_factor is not None else Config.YOUTUBE_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def search_video_id(self, query):
+        params = {
+            'part': 'snippet',
+            'q': query,
+            'key': self.api_key,
+            'maxResults': 1,
+            'type': 'video',
+            'videoEmbeddable': 'true'
+        }
+        try:
+            response = self.session.get(self.search_url, params=params, timeout=self.timeout)
+        except Exception:
+            count(UPSTREAM_REQUESTS, upstream='youtube', result='error')
+            raise
+        count(UPSTREAM_REQUESTS, upstream='youtube', result=str(response.status_code))
+        # Every search.list call is billed, whatever its outcome
+        count(YOUTUBE_QUOTA_UNITS, 100)
         response.raise_for_status()
         data = response.json()
         if 'items' in data and len(data['items']) > 0:
-            video_id = data['items'][0]['id']['videoId']
+            return data['items'][0]['id']['videoId']
+        return None
+
+    def get_video_link(self, song_title):
+        video_id = self.search_video_id(f"{song_title} official music video")
+        if video_id:
             return f"https://www.youtube.com/watch?v={video_id}"
-        else:
-            return None
-    except Exception as e:
-        print(f"Error fetching YouTube link: {e}")
         return None
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_youtube_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = YouTubeClient(os.getenv('YOUTUBE_API_KEY'))
+    return _client
+
+def get_youtube_link(song_title):
+    # Errors propagate so callers can tell a failed lookup from "not found"
+    return get_youtube_client().get_video_link(song_title)